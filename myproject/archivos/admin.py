@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import UploadedFile   
+from .models import UploadedFile, ExtractionJob, CachedExtraction
 
 
-admin.site.register(UploadedFile)  
\ No newline at end of file
+admin.site.register(UploadedFile)
+admin.site.register(ExtractionJob)
+admin.site.register(CachedExtraction)
@@ -0,0 +1,55 @@
+import hashlib
+from .models import UploadedFile, CachedExtraction
+
+
+def compute_content_hash(django_file):
+    """SHA-256 del contenido de un archivo de Django, leído por bloques."""
+    sha256 = hashlib.sha256()
+    for chunk in django_file.chunks():
+        sha256.update(chunk)
+    django_file.seek(0)
+    return sha256.hexdigest()
+
+
+def ensure_content_hash(file_obj):
+    """Calcula y guarda el hash de archivos subidos antes de que existiera el campo."""
+    if not file_obj.content_hash:
+        with file_obj.file.open('rb') as f:
+            file_obj.content_hash = compute_content_hash(f)
+        file_obj.save(update_fields=['content_hash'])
+    return file_obj.content_hash
+
+
+def find_extracted_text_file(file_obj):
+    """
+    Devuelve el .txt ya extraído de otro archivo con el mismo contenido, o None.
+    Quien lo use debe copiarlo: cada archivo borra su propio .txt al eliminarse.
+    """
+    content_hash = ensure_content_hash(file_obj)
+    twins = (
+        UploadedFile.objects.filter(content_hash=content_hash)
+        .exclude(id=file_obj.id)
+        .exclude(text_file__isnull=True)
+        .exclude(text_file='')
+    )
+    for twin in twins:
+        if twin.text_file.storage.exists(twin.text_file.name):
+            return twin.text_file
+    return None
+
+
+def get_cached_data(content_hash, variant):
+    if not content_hash:
+        return None
+    cached = CachedExtraction.objects.filter(content_hash=content_hash, variant=variant).first()
+    return cached.data if cached else None
+
+
+def store_cached_data(content_hash, variant, data):
+    if not content_hash:
+        return
+    CachedExtraction.objects.update_or_create(
+        content_hash=content_hash,
+        variant=variant,
+        defaults={'data': data}
+    )
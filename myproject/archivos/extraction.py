@@ -0,0 +1,143 @@
+from concurrent.futures import ProcessPoolExecutor
+import pdfplumber
+from .pptx_stream import iter_slide_texts
+
+# Extensiones que sabemos convertir a texto
+SUPPORTED_EXTENSIONS = ['.pdf', '.pptx']
+
+# Por debajo de este número de páginas por proceso no compensa arrancar el pool
+MIN_PAGES_PER_WORKER = 8
+
+
+class ExtractionError(Exception):
+    """Error de extracción con el mensaje y el código HTTP que verá el cliente."""
+
+    def __init__(self, message, status_code=500):
+        # Pasamos ambos argumentos a Exception para que el error se pueda serializar
+        # (pickle) al volver de un proceso del pool de extracción
+        super().__init__(message, status_code)
+        self.message = message
+        self.status_code = status_code
+
+    def __str__(self):
+        return self.message
+
+
+def split_page_ranges(page_count, workers):
+    """Reparte las páginas [0, page_count) en como mucho `workers` rangos contiguos."""
+    workers = max(1, min(workers, page_count))
+    size, extra = divmod(page_count, workers)
+    ranges = []
+    start = 0
+    for i in range(workers):
+        stop = start + size + (1 if i < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def extract_pdf_page_range(file_path, start, stop):
+    """Extrae el texto de las páginas [start, stop). Cada proceso abre el PDF por su cuenta."""
+    # pdfplumber numera las páginas desde 1
+    with pdfplumber.open(file_path, pages=list(range(start + 1, stop + 1))) as pdf:
+        texts = []
+        for page in pdf.pages:
+            texts.append(page.extract_text())
+            page.close()
+        return texts
+
+
+def iter_pdf_pages(file_path, workers=1):
+    """
+    Genera el texto de cada página en orden. Cada página libera su caché
+    (page.close) en cuanto se ha extraído, así la memoria no crece con el documento.
+    """
+    with pdfplumber.open(file_path) as pdf:
+        workers = min(workers, len(pdf.pages) // MIN_PAGES_PER_WORKER)
+        if workers <= 1:
+            for page in pdf.pages:
+                yield page.extract_text()
+                page.close()
+            return
+        page_count = len(pdf.pages)
+
+    # Modo paralelo: cada proceso extrae un rango de páginas y se reensambla en orden
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(extract_pdf_page_range, file_path, start, stop)
+            for start, stop in split_page_ranges(page_count, workers)
+        ]
+        for future in futures:
+            yield from future.result()
+
+
+def iter_pptx_slides(file_path):
+    """Genera el texto de cada diapositiva (sus formas unidas con doble salto)."""
+    for shape_texts in iter_slide_texts(file_path):
+        yield '\n\n'.join(shape_texts)
+
+
+def write_text_parts(parts, dest, separator):
+    """
+    Escribe cada página según llega, separadas por `separator` y omitiendo las
+    vacías. Devuelve (hay_texto, offsets), donde offsets[i] es la posición en bytes
+    UTF-8 donde empieza la página i (las vacías ocupan cero bytes).
+    """
+    has_text = False
+    first = True
+    position = 0
+    separator_size = len(separator.encode('utf-8'))
+    page_offsets = []
+    for part in parts:
+        if not part: # Añadir solo si hay texto en la página
+            page_offsets.append(position)
+            continue
+        if not first:
+            dest.write(separator)
+            position += separator_size
+        page_offsets.append(position)
+        dest.write(part)
+        position += len(part.encode('utf-8'))
+        first = False
+        has_text = has_text or bool(part.strip())
+    return has_text, page_offsets
+
+
+def extract_text_to_file(file_path, file_extension, dest_path, pdf_workers=1):
+    """
+    Extrae el texto de un PDF o PPTX y lo escribe en `dest_path` en streaming.
+    Devuelve el índice de offsets de cada página (o diapositiva) del texto.
+    No toca la base de datos, por lo que puede ejecutarse en un proceso del pool
+    de extracción. Lanza ExtractionError.
+    Con `pdf_workers` > 1 las páginas de los PDF largos se reparten entre varios procesos.
+    """
+    with open(dest_path, 'w', encoding='utf-8') as dest:
+        if file_extension == '.pdf':
+            try:
+                # Unir páginas con salto de línea
+                has_text, page_offsets = write_text_parts(iter_pdf_pages(file_path, workers=pdf_workers), dest, '\n')
+            except MemoryError:
+                raise # Lo convierte en un error de límite el sandbox
+            except Exception as e:
+                raise ExtractionError(f"Error al procesar el archivo PDF: {e}")
+        elif file_extension == '.pptx':
+            try:
+                # Unir texto de formas/diapositivas con doble salto
+                has_text, page_offsets = write_text_parts(iter_pptx_slides(file_path), dest, '\n\n')
+            except MemoryError:
+                raise # Lo convierte en un error de límite el sandbox
+            except Exception as e:
+                raise ExtractionError(f"Error al procesar el archivo PowerPoint: {e}")
+        else:
+            raise ExtractionError(
+                f"Tipo de archivo no soportado: '{file_extension}'. Solo se admiten PDF y PPTX.",
+                status_code=400
+            )
+
+    # Verificar si se extrajo algo de texto útil
+    if not has_text:
+        raise ExtractionError(
+            f"No se pudo extraer contenido de texto del archivo ({file_extension}) o el archivo está vacío.",
+            status_code=400
+        )
+    return page_offsets
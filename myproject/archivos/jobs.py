@@ -0,0 +1,176 @@
+import io
+import os
+import tempfile
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+from .models import ExtractionJob
+from .extraction import ExtractionError, extract_text_to_file
+from .content_cache import find_extracted_text_file
+from .sandbox import run_sandboxed
+from .textstore import compressed_copy, configured_codec, open_text, stored_name
+
+
+def get_file_extension(file_obj):
+    return os.path.splitext(file_obj.file.name)[1].lower()
+
+
+def enqueue_extraction(file_obj):
+    """
+    Encola la extracción de texto de un archivo. Si ya hay un trabajo pendiente o
+    en proceso para ese archivo, se devuelve ese mismo en lugar de duplicarlo.
+    """
+    active_job = file_obj.extraction_jobs.filter(status__in=ExtractionJob.ACTIVE_STATUSES).first()
+    if active_job:
+        return active_job
+    return ExtractionJob.objects.create(file=file_obj)
+
+
+def enqueue_extractions(file_objs):
+    """
+    Versión por lotes de enqueue_extraction: una consulta para los trabajos activos
+    y un único INSERT para el resto. Devuelve {file_id: job}.
+    """
+    file_ids = [file_obj.id for file_obj in file_objs]
+    jobs = {}
+    for job in ExtractionJob.objects.filter(file_id__in=file_ids, status__in=ExtractionJob.ACTIVE_STATUSES):
+        jobs.setdefault(job.file_id, job)
+    new_jobs = [ExtractionJob(file=file_obj) for file_obj in file_objs if file_obj.id not in jobs]
+    for job in ExtractionJob.objects.bulk_create(new_jobs):
+        jobs[job.file_id] = job
+    return jobs
+
+
+def requeue_stale_jobs():
+    """
+    Devuelve a la cola los trabajos 'running' que superan EXTRACTION_JOB_LEASE_SECONDS:
+    su worker murió o se reinició sin cerrarlos. Devuelve cuántos se reencolaron.
+    """
+    deadline = timezone.now() - timedelta(seconds=settings.EXTRACTION_JOB_LEASE_SECONDS)
+    return ExtractionJob.objects.filter(
+        status=ExtractionJob.STATUS_RUNNING, started_at__lt=deadline
+    ).update(status=ExtractionJob.STATUS_PENDING, started_at=None)
+
+
+def claim_pending_jobs(limit):
+    """
+    Marca como 'running' hasta `limit` trabajos pendientes y los devuelve.
+    El UPDATE condicionado al estado evita que dos workers cojan el mismo trabajo.
+    Antes se recuperan los trabajos huérfanos de workers caídos.
+    """
+    claimed = []
+    if limit <= 0:
+        return claimed
+    requeue_stale_jobs()
+    candidate_ids = ExtractionJob.objects.filter(
+        status=ExtractionJob.STATUS_PENDING
+    ).values_list('id', flat=True)[:limit]
+    for job_id in candidate_ids:
+        updated = ExtractionJob.objects.filter(id=job_id, status=ExtractionJob.STATUS_PENDING).update(
+            status=ExtractionJob.STATUS_RUNNING,
+            started_at=timezone.now()
+        )
+        if updated:
+            claimed.append(ExtractionJob.objects.select_related('file', 'file__user').get(id=job_id))
+    return claimed
+
+
+def complete_job(job, text_source=None, page_offsets=None, error=None):
+    """
+    Guarda el resultado de la extracción (o el error) y cierra el trabajo.
+    `text_source` es un archivo binario abierto con el texto sin comprimir; se
+    copia por bloques al storage, comprimido si TEXT_COMPRESSION lo indica.
+    """
+    if error is None:
+        file_obj = job.file
+        filename_base = os.path.splitext(os.path.basename(file_obj.file.name))[0]
+        codec = configured_codec()
+        text_filename = stored_name(f"{filename_base}.txt", codec)
+        try:
+            file_obj.text_page_offsets = page_offsets or []
+            if codec:
+                with compressed_copy(text_source, codec, size=text_source_size(text_source)) as compressed:
+                    file_obj.text_file.save(text_filename, File(compressed), save=True)
+            else:
+                file_obj.text_file.save(text_filename, File(text_source), save=True)
+        except Exception as e:
+            error = f"Error al guardar el archivo de texto extraído: {e}"
+
+    job.status = ExtractionJob.STATUS_FAILED if error else ExtractionJob.STATUS_DONE
+    job.error_message = str(error) if error else None
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error_message', 'finished_at'])
+    return job
+
+
+def text_source_size(text_source):
+    try:
+        return os.fstat(text_source.fileno()).st_size
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+
+def complete_job_from_path(job, text_path, page_offsets):
+    """Guarda el texto que el worker dejó en `text_path` y borra el temporal."""
+    try:
+        with open(text_path, 'rb') as text_source:
+            return complete_job(job, text_source=text_source, page_offsets=page_offsets)
+    finally:
+        os.remove(text_path)
+
+
+def complete_extraction(job, text_path, get_page_offsets):
+    """
+    Cierra el trabajo con el resultado de la extracción: get_page_offsets()
+    devuelve los offsets de las páginas escritas en `text_path` o lanza su error.
+    """
+    try:
+        page_offsets = get_page_offsets()
+    except Exception as e:
+        os.remove(text_path)
+        if isinstance(e, ExtractionError):
+            return complete_job(job, error=e.message)
+        return complete_job(job, error=f"Error inesperado durante la extracción: {e}")
+    return complete_job_from_path(job, text_path, page_offsets)
+
+
+def complete_from_cache(job):
+    """
+    Si otro usuario ya subió el mismo archivo y se extrajo su texto, se reutiliza
+    sin volver a procesar el documento. Devuelve True si el trabajo quedó completado.
+    """
+    try:
+        cached_text_file = find_extracted_text_file(job.file)
+    except OSError:
+        return False # Sin el archivo original no hay hash; la extracción dará el error
+    if cached_text_file is None:
+        return False
+    with open_text(cached_text_file) as text_source:
+        complete_job(job, text_source=text_source, page_offsets=cached_text_file.instance.text_page_offsets)
+    return True
+
+
+def new_text_path():
+    """Ruta temporal donde el proceso de extracción escribe el texto."""
+    fd, text_path = tempfile.mkstemp(suffix='.txt', prefix='extraccion_')
+    os.close(fd)
+    return text_path
+
+
+def run_extraction(file_path, file_extension, text_path):
+    """
+    Extrae el texto en un proceso hijo aislado con límites de CPU, memoria y
+    tiempo real, sin acceso a la BD. Devuelve el índice de offsets de las páginas.
+    Los límites son del documento entero: con PDF_EXTRACTION_WORKERS > 1 se
+    reparten entre el proceso hijo y sus procesos de páginas.
+    """
+    workers = settings.PDF_EXTRACTION_WORKERS
+    return run_sandboxed(
+        extract_text_to_file, file_path, file_extension, text_path, workers,
+        cpu_seconds=settings.EXTRACTION_CPU_SECONDS,
+        memory_mb=settings.EXTRACTION_MEMORY_MB,
+        wall_seconds=settings.EXTRACTION_WALL_SECONDS,
+        processes=workers + 1 if workers > 1 else 1,
+    )
+
@@ -0,0 +1,64 @@
+import os
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from archivos.models import UploadedFile
+from archivos.textstore import (
+    CODEC_GZIP, compressed_copy, configured_codec, detect_codec, resolve_codec, stored_name
+)
+
+
+class Command(BaseCommand):
+    help = 'Comprime los archivos de texto extraídos que todavía están sin comprimir'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--codec', default=None,
+                            help="Códec a usar: 'gzip' o 'zstd' (por defecto TEXT_COMPRESSION o gzip)")
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Muestra qué archivos se comprimirían sin modificarlos')
+
+    def handle(self, *args, **options):
+        try:
+            codec = resolve_codec(options['codec']) if options['codec'] else configured_codec() or CODEC_GZIP
+        except ValueError as e:
+            raise CommandError(str(e))
+        if codec is None:
+            raise CommandError("Indica un códec con --codec")
+
+        files = UploadedFile.objects.exclude(text_file__isnull=True).exclude(text_file='').select_related('user')
+        converted = skipped = failed = 0
+        bytes_before = bytes_after = 0
+        for file_obj in files.iterator():
+            text_file = file_obj.text_file
+            storage = text_file.storage
+            old_name = text_file.name
+            try:
+                with storage.open(old_name, 'rb') as raw:
+                    if detect_codec(raw) is not None:
+                        skipped += 1
+                        continue
+                    original_size = storage.size(old_name)
+                    if options['dry_run']:
+                        self.stdout.write(f"Se comprimiría {old_name} ({original_size} bytes)")
+                        converted += 1
+                        continue
+                    with compressed_copy(raw, codec, size=original_size) as compressed:
+                        new_filename = stored_name(os.path.basename(old_name), codec)
+                        text_file.save(new_filename, File(compressed), save=False)
+                file_obj.save(update_fields=['text_file'])
+                storage.delete(old_name)
+            except OSError as e:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f"No se pudo comprimir {old_name}: {e}"))
+                continue
+
+            converted += 1
+            bytes_before += original_size
+            bytes_after += storage.size(text_file.name)
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"Archivos a comprimir: {converted}, ya comprimidos: {skipped}"))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Archivos comprimidos con {codec}: {converted}, ya comprimidos: {skipped}, con error: {failed}. "
+            f"Tamaño: {bytes_before} -> {bytes_after} bytes"
+        ))
@@ -0,0 +1,71 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from archivos.jobs import (
+    claim_pending_jobs, complete_extraction, complete_from_cache, complete_job, get_file_extension, new_text_path,
+    run_extraction
+)
+
+
+class Command(BaseCommand):
+    help = 'Procesa la cola de extracción de texto en procesos aislados con límites de recursos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.EXTRACTION_WORKERS,
+                            help='Número de procesos de extracción')
+        parser.add_argument('--poll-interval', type=float, default=settings.EXTRACTION_POLL_INTERVAL,
+                            help='Segundos entre consultas a la cola cuando no hay trabajo')
+        parser.add_argument('--once', action='store_true',
+                            help='Procesa los trabajos pendientes y termina')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        poll_interval = options['poll_interval']
+
+        self.stdout.write(self.style.SUCCESS(f"Worker de extracción iniciado con {workers} procesos"))
+
+        in_flight = {}
+        # Cada hilo solo vigila un proceso hijo con límites de CPU, memoria y tiempo
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                claimed = claim_pending_jobs(workers - len(in_flight))
+                for job in claimed:
+                    if self._complete_from_cache(job):
+                        continue
+                    text_path = new_text_path()
+                    future = pool.submit(run_extraction, job.file.file.path, get_file_extension(job.file), text_path)
+                    in_flight[future] = (job, text_path)
+
+                if not in_flight:
+                    if claimed:
+                        continue # Todos venían de la caché; puede haber más en la cola
+                    if options['once']:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                done, _ = wait(in_flight, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job, text_path = in_flight.pop(future)
+                    self._finish(job, text_path, future)
+
+    def _complete_from_cache(self, job):
+        """True si el trabajo quedó cerrado reutilizando el texto ya extraído o con el error al reutilizarlo."""
+        try:
+            if not complete_from_cache(job):
+                return False
+        except Exception as e:
+            # Texto en caché corrupto o perdido: falla el trabajo, no el worker
+            complete_job(job, error=f"Error al reutilizar el texto ya extraído: {e}")
+            self.stdout.write(self.style.ERROR(f"Trabajo {job.id} fallido: {job.error_message}"))
+            return True
+        self.stdout.write(self.style.SUCCESS(f"Trabajo {job.id} completado con texto ya extraído"))
+        return True
+
+    def _finish(self, job, text_path, future):
+        complete_extraction(job, text_path, future.result)
+        if job.error_message:
+            self.stdout.write(self.style.ERROR(f"Trabajo {job.id} fallido: {job.error_message}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Trabajo {job.id} completado"))
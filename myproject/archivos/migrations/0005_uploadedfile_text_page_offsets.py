@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archivos', '0004_uploadedfile_content_hash_cachedextraction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='text_page_offsets',
+            field=models.JSONField(blank=True, default=list, null=True),
+        ),
+    ]
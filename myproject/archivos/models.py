@@ -14,7 +14,10 @@ class UploadedFile(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     file = models.FileField(upload_to=user_pdf_path)
     text_file = models.FileField(upload_to=user_txt_path, null=True, blank=True)
+    # Offset en bytes donde empieza cada página (o diapositiva) dentro de text_file
+    text_page_offsets = models.JSONField(default=list, null=True, blank=True)
     extracted_data = models.JSONField(default=dict, null=True, blank=True)
+    content_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -22,4 +25,45 @@ class UploadedFile(models.Model):
 
 
     def __str__(self):
-        return f"{self.user.username} - {self.file.name}"
\ No newline at end of file
+        return f"{self.user.username} - {self.file.name}"
+
+class CachedExtraction(models.Model):
+    # Resultado de la IA compartido entre todos los archivos con el mismo contenido.
+    # `variant` identifica modo, modelos y versión del prompt con los que se generó.
+    content_hash = models.CharField(max_length=64)
+    variant = models.CharField(max_length=200)
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('content_hash', 'variant')
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} - {self.variant}"
+
+
+class ExtractionJob(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pendiente'),
+        (STATUS_RUNNING, 'En proceso'),
+        (STATUS_DONE, 'Completado'),
+        (STATUS_FAILED, 'Fallido'),
+    ]
+    ACTIVE_STATUSES = [STATUS_PENDING, STATUS_RUNNING]
+
+    file = models.ForeignKey(UploadedFile, on_delete=models.CASCADE, related_name='extraction_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    error_message = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+
+    def __str__(self):
+        return f"{self.file} - {self.status}"
@@ -0,0 +1,97 @@
+import posixpath
+import zipfile
+from lxml import etree
+
+# Lectura de texto de un .pptx directamente desde el XML de cada diapositiva, sin
+# construir el modelo de objetos de python-pptx ni cargar imágenes o vídeos.
+# El resultado es el mismo que recorrer slide.shapes y leer shape.text_frame.text.
+
+NS_P = 'http://schemas.openxmlformats.org/presentationml/2006/main'
+NS_A = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+NS_R = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+NS_RELS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+P_SLD_ID = f'{{{NS_P}}}sldId'
+P_SP_TREE = f'{{{NS_P}}}spTree'
+P_SP = f'{{{NS_P}}}sp'
+P_TX_BODY = f'{{{NS_P}}}txBody'
+A_P = f'{{{NS_A}}}p'
+A_R = f'{{{NS_A}}}r'
+A_FLD = f'{{{NS_A}}}fld'
+A_BR = f'{{{NS_A}}}br'
+A_T = f'{{{NS_A}}}t'
+R_ID = f'{{{NS_R}}}id'
+RELATIONSHIP = f'{{{NS_RELS}}}Relationship'
+
+PRESENTATION_PART = 'ppt/presentation.xml'
+PRESENTATION_RELS = 'ppt/_rels/presentation.xml.rels'
+
+# El archivo lo sube el usuario: sin entidades externas ni accesos de red
+ITERPARSE_OPTIONS = {'resolve_entities': False, 'no_network': True}
+
+
+def _release(elem):
+    """Libera un elemento ya procesado y sus hermanos anteriores."""
+    elem.clear()
+    while elem.getprevious() is not None:
+        del elem.getparent()[0]
+
+
+def slide_part_names(zf):
+    """Nombres de las partes XML de las diapositivas, en el orden de la presentación."""
+    targets = {}
+    with zf.open(PRESENTATION_RELS) as rels:
+        for _, elem in etree.iterparse(rels, tag=RELATIONSHIP, **ITERPARSE_OPTIONS):
+            targets[elem.get('Id')] = elem.get('Target')
+            _release(elem)
+
+    part_names = []
+    with zf.open(PRESENTATION_PART) as presentation:
+        for _, elem in etree.iterparse(presentation, tag=P_SLD_ID, **ITERPARSE_OPTIONS):
+            target = targets[elem.get(R_ID)]
+            if target.startswith('/'):
+                part_names.append(target.lstrip('/'))
+            else:
+                part_names.append(posixpath.normpath(posixpath.join('ppt', target)))
+            _release(elem)
+    return part_names
+
+
+def paragraph_text(paragraph):
+    # Igual que python-pptx: runs y campos aportan su texto, cada salto de línea un "\v"
+    parts = []
+    for child in paragraph:
+        if child.tag in (A_R, A_FLD):
+            t = child.find(A_T)
+            parts.append((t.text or "") if t is not None else "")
+        elif child.tag == A_BR:
+            parts.append("\v")
+    return "".join(parts)
+
+
+def iter_shape_texts(slide_xml):
+    """Genera el texto de cada forma de primer nivel de la diapositiva que tenga texto."""
+    sp_tree = None
+    for event, elem in etree.iterparse(slide_xml, events=('start', 'end'), **ITERPARSE_OPTIONS):
+        if event == 'start':
+            if sp_tree is None and elem.tag == P_SP_TREE:
+                sp_tree = elem
+            continue
+        if sp_tree is None or elem.getparent() is not sp_tree:
+            continue
+        # Fin de una forma hija directa de spTree: su subárbol ya está completo
+        if elem.tag == P_SP:
+            tx_body = elem.find(P_TX_BODY)
+            if tx_body is not None:
+                text = "\n".join(paragraph_text(p) for p in tx_body.iterfind(A_P))
+                if text:
+                    yield text
+        _release(elem)
+
+
+def iter_slide_texts(file_path):
+    """Genera, por diapositiva y en orden, la lista de textos de sus formas."""
+    with zipfile.ZipFile(file_path) as zf:
+        for part_name in slide_part_names(zf):
+            with zf.open(part_name) as slide_xml:
+                yield list(iter_shape_texts(slide_xml))
@@ -0,0 +1,117 @@
+import multiprocessing
+import os
+import signal
+from .extraction import ExtractionError
+
+try:
+    import resource
+except ImportError: # Windows: sin rlimits, solo se aplica el tiempo máximo
+    resource = None
+
+# Cada documento se extrae en un proceso hijo propio con límites de CPU, memoria
+# y tiempo real, para que un PDF malformado no pueda bloquear ni agotar el nodo.
+# Los rlimits son por proceso y los heredan los procesos que lance el hijo (PDF en
+# paralelo), así que el presupuesto del documento se reparte entre todos ellos.
+
+LIMIT_STATUS = 422
+
+
+def _context():
+    # forkserver evita hacer fork de un proceso con hilos (el worker usa un pool de hilos)
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context('forkserver')
+        ctx.set_forkserver_preload(['archivos.extraction'])
+        return ctx
+    return multiprocessing.get_context('spawn')
+
+
+def _apply_limits(cpu_seconds, memory_mb):
+    if resource is None:
+        return
+    # Grupo de procesos propio para poder matar también a los nietos (PDF en paralelo)
+    os.setpgid(0, 0)
+    if cpu_seconds:
+        # Al pasar el límite blando llega SIGXCPU; el duro garantiza un SIGKILL
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 5))
+    if memory_mb:
+        memory_bytes = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+
+
+def _child_main(sender, func, args, cpu_seconds, memory_mb):
+    _apply_limits(cpu_seconds, memory_mb)
+    try:
+        outcome = ('ok', func(*args))
+    except MemoryError:
+        outcome = ('error', ExtractionError(
+            f"El documento superó el límite de memoria de extracción ({memory_mb} MB).", LIMIT_STATUS
+        ))
+    except Exception as e:
+        outcome = ('error', e)
+    try:
+        sender.send(outcome)
+    except Exception as e: # Resultado o excepción que no se puede serializar
+        sender.send(('error', ExtractionError(f"Error inesperado durante la extracción: {e}")))
+    finally:
+        sender.close()
+
+
+def _exit_error(exitcode, cpu_seconds):
+    cpu_signals = (-signal.SIGXCPU, -signal.SIGKILL) if resource is not None else ()
+    if exitcode in cpu_signals:
+        return ExtractionError(
+            f"El documento superó el límite de CPU de extracción ({cpu_seconds} s).", LIMIT_STATUS
+        )
+    return ExtractionError(f"El proceso de extracción terminó inesperadamente (código {exitcode}).")
+
+
+def _kill(process):
+    if not process.is_alive():
+        return
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (AttributeError, OSError): # Sin grupos de procesos (Windows) o ya terminado
+        process.kill()
+
+
+def share_limit(limit, processes):
+    """Parte de un límite total que corresponde a cada uno de `processes` procesos."""
+    if not limit or processes <= 1:
+        return limit
+    return max(1, limit // processes)
+
+
+def run_sandboxed(func, *args, cpu_seconds=None, memory_mb=None, wall_seconds=None, processes=1):
+    """
+    Ejecuta func(*args) en un proceso hijo con límites de recursos y devuelve su
+    resultado. Si se supera un límite lanza ExtractionError con un mensaje claro;
+    las excepciones de func se relanzan tal cual en el proceso padre.
+    `processes` es el número de procesos que puede llegar a usar func (el hijo y
+    los que lance): cpu_seconds y memory_mb son el total y se reparten entre ellos.
+    """
+    ctx = _context()
+    receiver, sender = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_child_main, args=(
+        sender, func, args, share_limit(cpu_seconds, processes), share_limit(memory_mb, processes)
+    ))
+    process.start()
+    sender.close()
+    try:
+        if not receiver.poll(wall_seconds):
+            raise ExtractionError(
+                f"El documento superó el tiempo máximo de extracción ({wall_seconds} s).", LIMIT_STATUS
+            )
+        try:
+            outcome, value = receiver.recv()
+        except EOFError:
+            # El hijo murió sin responder: normalmente por una señal de rlimit
+            process.join()
+            raise _exit_error(process.exitcode, cpu_seconds)
+    finally:
+        _kill(process)
+        process.join()
+        receiver.close()
+
+    if outcome == 'error':
+        raise value
+    return value
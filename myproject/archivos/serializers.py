@@ -1,11 +1,14 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.urls import reverse
 from .models import UploadedFile
+from .textstore import has_compressed_name
 import os
 
 
 class FileUploadSerializer(serializers.ModelSerializer):
-    MAX_FILE_SIZE = 5 * 1024 * 1024
+    MAX_FILE_SIZE = settings.UPLOAD_MAX_FILE_SIZE_MB * 1024 * 1024
     ALLOWED_EXTENSIONS = ['.pdf', '.pptx']
 
     class Meta:
@@ -14,7 +17,7 @@ class FileUploadSerializer(serializers.ModelSerializer):
 
     def validate_file(self, value):
         if value.size > self.MAX_FILE_SIZE:
-            raise serializers.ValidationError("El archivo excede el tamaño máximo de 5MB.")
+            raise serializers.ValidationError(f"El archivo excede el tamaño máximo de {settings.UPLOAD_MAX_FILE_SIZE_MB}MB.")
         ext = os.path.splitext(value.name)[1].lower()
         if ext not in self.ALLOWED_EXTENSIONS:
             allowed_ext_str = ", ".join(self.ALLOWED_EXTENSIONS)
@@ -36,5 +39,10 @@ class UploadedFileSerializer(serializers.ModelSerializer):
     def get_text_file_url(self, obj):
         if obj.text_file:
             request = self.context.get('request')
-            return request.build_absolute_uri(obj.text_file.url) if request else obj.text_file.url
+            # Los textos comprimidos se sirven descomprimidos desde el endpoint de texto
+            if has_compressed_name(obj.text_file.name):
+                url = reverse('api_text_content', kwargs={'file_id': obj.id})
+            else:
+                url = obj.text_file.url
+            return request.build_absolute_uri(url) if request else url
         return None
\ No newline at end of file
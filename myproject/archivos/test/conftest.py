@@ -3,6 +3,8 @@ import pytest
 import os
 from django.conf import settings
 import shutil
+from archivos.extraction import extract_text_to_file
+from archivos.jobs import claim_pending_jobs, complete_extraction, complete_from_cache, get_file_extension, new_text_path
 
 @pytest.fixture(autouse=True)
 def use_tmp_media_root(tmp_path_factory, settings): # <-- Cambia 'django_settings' a 'settings'
@@ -31,4 +33,21 @@ def use_tmp_media_root(tmp_path_factory, settings): # <-- Cambia 'django_setting
     # except OSError as e:
     #      print(f"Warning: Could not cleanup test media directory {media_path}: {e}")
     # Restaurar (generalmente no necesario con pytest-django, pero por si acaso)
-    # settings.MEDIA_ROOT = original_media_root
\ No newline at end of file
+    # settings.MEDIA_ROOT = original_media_root
+
+
+@pytest.fixture
+def run_pending_jobs():
+    """
+    Ejecuta los trabajos pendientes como el worker, pero extrayendo en el propio
+    proceso del test (sin sandbox) para que se apliquen los mocks de pdfplumber.
+    """
+    def run_job(job):
+        if complete_from_cache(job):
+            return job
+        text_path = new_text_path()
+        return complete_extraction(job, text_path, lambda: extract_text_to_file(
+            job.file.file.path, get_file_extension(job.file), text_path, pdf_workers=settings.PDF_EXTRACTION_WORKERS
+        ))
+
+    return lambda: [run_job(job) for job in claim_pending_jobs(10)]
@@ -0,0 +1,106 @@
+import pytest
+from unittest.mock import patch, MagicMock
+from django.conf import settings
+from pptx import Presentation
+from pptx.util import Inches
+
+from archivos.extraction import ExtractionError, extract_text_to_file, split_page_ranges
+
+SAMPLE_PDF = settings.BASE_DIR / "myapp/files/pdf/ISPP2425.pdf"
+
+
+def test_split_page_ranges_covers_all_pages():
+    assert split_page_ranges(10, 3) == [(0, 4), (4, 7), (7, 10)]
+    assert split_page_ranges(2, 8) == [(0, 1), (1, 2)] # Nunca más rangos que páginas
+
+
+def test_parallel_pdf_extraction_matches_serial(tmp_path):
+    """El modo paralelo debe escribir exactamente el mismo texto, en el mismo orden."""
+    serial_path = tmp_path / "serie.txt"
+    parallel_path = tmp_path / "paralelo.txt"
+    extract_text_to_file(SAMPLE_PDF, '.pdf', serial_path)
+    extract_text_to_file(SAMPLE_PDF, '.pdf', parallel_path, pdf_workers=4)
+    assert parallel_path.read_text(encoding='utf-8') == serial_path.read_text(encoding='utf-8')
+
+
+@patch('archivos.extraction.pdfplumber.open')
+def test_pdf_streaming_releases_each_page(mock_pdf_open, tmp_path):
+    """Cada página se escribe y se libera (page.close) antes de pasar a la siguiente."""
+    pages = []
+    for text in ["Página uno", None, "Página tres"]:
+        page = MagicMock()
+        page.extract_text.return_value = text
+        pages.append(page)
+    mock_pdf = MagicMock()
+    mock_pdf.pages = pages
+    mock_pdf_open.return_value.__enter__.return_value = mock_pdf
+
+    dest = tmp_path / "salida.txt"
+    page_offsets = extract_text_to_file("guia.pdf", '.pdf', dest)
+
+    assert dest.read_text(encoding='utf-8') == "Página uno\nPágina tres"
+    # Offsets en bytes UTF-8; la página vacía ocupa cero bytes
+    assert page_offsets == [0, 11, 12]
+    for page in pages:
+        page.close.assert_called_once()
+
+
+def test_unsupported_extension_raises(tmp_path):
+    with pytest.raises(ExtractionError) as excinfo:
+        extract_text_to_file("foto.jpg", '.jpg', tmp_path / "salida.txt")
+    assert excinfo.value.status_code == 400
+
+
+# --- Extracción de PPTX en streaming (sin el modelo de objetos de python-pptx) ---
+
+def pptx_text_with_python_pptx(file_path):
+    """Resultado de referencia: lo que se obtenía recorriendo el modelo de python-pptx."""
+    temp_text = []
+    for slide in Presentation(file_path).slides:
+        for shape in slide.shapes:
+            if hasattr(shape, "text_frame") and shape.text_frame and shape.text_frame.text:
+                temp_text.append(shape.text_frame.text)
+    return '\n\n'.join(temp_text)
+
+
+@pytest.fixture
+def sample_pptx(tmp_path):
+    prs = Presentation()
+    title_slide = prs.slides.add_slide(prs.slide_layouts[0])
+    title_slide.shapes.title.text = "Guía docente"
+    title_slide.placeholders[1].text_frame.text = "Curso 2024/25\vSegundo cuatrimestre"
+
+    content_slide = prs.slides.add_slide(prs.slide_layouts[5])
+    content_slide.shapes.title.text = "Evaluación"
+    textbox = content_slide.shapes.add_textbox(Inches(1), Inches(2), Inches(4), Inches(2))
+    textbox.text_frame.text = "Examen final: 18 de junio"
+    textbox.text_frame.add_paragraph().text = "Entrega de prácticas: 30 de mayo"
+    table = content_slide.shapes.add_table(2, 2, Inches(1), Inches(4), Inches(4), Inches(1)).table
+    table.cell(0, 0).text = "Texto de tabla" # Las tablas no tienen text_frame propio
+    group = content_slide.shapes.add_group_shape()
+    group.shapes.add_textbox(Inches(5), Inches(5), Inches(1), Inches(1)).text_frame.text = "Dentro de un grupo"
+    content_slide.shapes.add_picture(str(settings.BASE_DIR / "frontend/public/logo192.png"), Inches(6), Inches(1))
+
+    prs.slides.add_slide(prs.slide_layouts[6]) # Diapositiva en blanco
+
+    last_slide = prs.slides.add_slide(prs.slide_layouts[1])
+    last_slide.shapes.title.text = "Profesores"
+
+    # Reordenar: la última diapositiva pasa a ser la segunda
+    sld_id_lst = prs.slides._sldIdLst
+    sld_id_lst.insert(1, sld_id_lst[-1])
+
+    path = tmp_path / "guia.pptx"
+    prs.save(path)
+    return path
+
+
+def test_pptx_streaming_matches_python_pptx(sample_pptx, tmp_path):
+    dest = tmp_path / "salida.txt"
+    page_offsets = extract_text_to_file(sample_pptx, '.pptx', dest)
+
+    text = dest.read_text(encoding='utf-8')
+    assert text == pptx_text_with_python_pptx(sample_pptx)
+    assert text.startswith("Guía docente\n\nCurso 2024/25\vSegundo cuatrimestre\n\nProfesores")
+    assert "Dentro de un grupo" not in text
+    assert len(page_offsets) == 4 # Una entrada por diapositiva, también la vacía
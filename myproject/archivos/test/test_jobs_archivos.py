@@ -0,0 +1,96 @@
+import pytest
+from datetime import timedelta
+from unittest.mock import patch
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.utils import timezone
+
+from archivos.models import UploadedFile, ExtractionJob
+from archivos.jobs import claim_pending_jobs, enqueue_extraction
+
+pytestmark = pytest.mark.django_db
+
+SAMPLE_PDF = settings.BASE_DIR / "myapp/files/pdf/ProyectoDocente-VC-24-25.pdf"
+
+
+@pytest.fixture
+def test_user(db):
+    return User.objects.create_user(username='testuser', password='password123')
+
+
+def test_worker_command_processes_queue(test_user):
+    """El worker extrae cada documento en un proceso aislado y guarda el texto de cada trabajo."""
+    pdf_file = UploadedFile.objects.create(
+        user=test_user,
+        file=SimpleUploadedFile("proyecto.pdf", SAMPLE_PDF.read_bytes(), content_type="application/pdf")
+    )
+    broken_file = UploadedFile.objects.create(
+        user=test_user,
+        file=SimpleUploadedFile("roto.pdf", b"esto no es un pdf", content_type="application/pdf")
+    )
+    ok_job = enqueue_extraction(pdf_file)
+    failed_job = enqueue_extraction(broken_file)
+
+    call_command('process_extraction_jobs', '--once', '--workers', '2', '--poll-interval', '0.1')
+
+    ok_job.refresh_from_db()
+    failed_job.refresh_from_db()
+    assert ok_job.status == ExtractionJob.STATUS_DONE
+    assert ok_job.finished_at is not None
+    assert failed_job.status == ExtractionJob.STATUS_FAILED
+    assert failed_job.error_message.startswith("Error al procesar el archivo PDF")
+
+    pdf_file.refresh_from_db()
+    with pdf_file.text_file.open('rb') as f:
+        assert f.read().strip()
+
+
+def test_cache_error_fails_the_job_and_worker_goes_on(test_user):
+    """Un error al reutilizar el texto ya extraído solo hace fallar ese trabajo."""
+    cached_file = UploadedFile.objects.create(
+        user=test_user, file=SimpleUploadedFile("cache.pdf", b"%PDF", content_type="application/pdf")
+    )
+    broken_file = UploadedFile.objects.create(
+        user=test_user, file=SimpleUploadedFile("roto.pdf", b"esto no es un pdf", content_type="application/pdf")
+    )
+    cached_job = enqueue_extraction(cached_file)
+    broken_job = enqueue_extraction(broken_file)
+
+    with patch('archivos.management.commands.process_extraction_jobs.complete_from_cache',
+               side_effect=[OSError("texto en caché ilegible"), False]):
+        call_command('process_extraction_jobs', '--once', '--workers', '2', '--poll-interval', '0.1')
+
+    cached_job.refresh_from_db()
+    assert cached_job.status == ExtractionJob.STATUS_FAILED
+    assert cached_job.error_message == "Error al reutilizar el texto ya extraído: texto en caché ilegible"
+    broken_job.refresh_from_db()
+    assert broken_job.status == ExtractionJob.STATUS_FAILED
+    assert broken_job.error_message.startswith("Error al procesar el archivo PDF")
+
+
+def test_stale_running_job_is_claimed_again(test_user, settings):
+    """Un trabajo que quedó en 'running' al caerse su worker vuelve a la cola pasado el plazo."""
+    settings.EXTRACTION_JOB_LEASE_SECONDS = 600
+    file_obj = UploadedFile.objects.create(
+        user=test_user, file=SimpleUploadedFile("guia.pdf", b"%PDF", content_type="application/pdf")
+    )
+    stale = enqueue_extraction(file_obj)
+    ExtractionJob.objects.filter(id=stale.id).update(
+        status=ExtractionJob.STATUS_RUNNING, started_at=timezone.now() - timedelta(seconds=601)
+    )
+    other_file = UploadedFile.objects.create(
+        user=test_user, file=SimpleUploadedFile("otra.pdf", b"%PDF", content_type="application/pdf")
+    )
+    recent = enqueue_extraction(other_file)
+    ExtractionJob.objects.filter(id=recent.id).update(
+        status=ExtractionJob.STATUS_RUNNING, started_at=timezone.now() - timedelta(seconds=60)
+    )
+
+    assert [job.id for job in claim_pending_jobs(5)] == [stale.id]
+    stale.refresh_from_db()
+    assert stale.status == ExtractionJob.STATUS_RUNNING
+    assert stale.started_at > timezone.now() - timedelta(seconds=60)
+    recent.refresh_from_db()
+    assert recent.status == ExtractionJob.STATUS_RUNNING
@@ -0,0 +1,87 @@
+import resource
+import time
+import pytest
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+
+from archivos.extraction import ExtractionError, extract_text_to_file
+from archivos.sandbox import run_sandboxed, LIMIT_STATUS
+
+SAMPLE_PDF = settings.BASE_DIR / "myapp/files/pdf/ISPP2425.pdf"
+
+
+def test_sandbox_returns_result():
+    assert run_sandboxed(len, "abc") == 3
+
+
+def test_sandbox_reraises_child_exception():
+    with pytest.raises(ValueError):
+        run_sandboxed(int, "no es un número")
+
+
+def test_sandbox_wall_time_limit():
+    start = time.monotonic()
+    with pytest.raises(ExtractionError) as excinfo:
+        run_sandboxed(time.sleep, 30, wall_seconds=1)
+    assert time.monotonic() - start < 10 # El hijo se mata, no se espera a que termine
+    assert excinfo.value.status_code == LIMIT_STATUS
+    assert "tiempo máximo" in excinfo.value.message
+
+
+def test_sandbox_cpu_limit():
+    with pytest.raises(ExtractionError) as excinfo:
+        run_sandboxed(sum, range(10 ** 12), cpu_seconds=1, wall_seconds=30)
+    assert excinfo.value.status_code == LIMIT_STATUS
+    assert "límite de CPU" in excinfo.value.message
+
+
+def test_sandbox_memory_limit():
+    with pytest.raises(ExtractionError) as excinfo:
+        run_sandboxed(bytearray, 3 * 1024 ** 3, memory_mb=512, wall_seconds=30)
+    assert excinfo.value.status_code == LIMIT_STATUS
+    assert "límite de memoria" in excinfo.value.message
+
+
+def test_sandboxed_pdf_extraction_matches_in_process(tmp_path):
+    """Con los límites por defecto un PDF normal se extrae igual que sin sandbox."""
+    direct_path = tmp_path / "directo.txt"
+    sandbox_path = tmp_path / "sandbox.txt"
+    expected_offsets = extract_text_to_file(SAMPLE_PDF, '.pdf', direct_path)
+    offsets = run_sandboxed(
+        extract_text_to_file, SAMPLE_PDF, '.pdf', sandbox_path, 1,
+        cpu_seconds=settings.EXTRACTION_CPU_SECONDS,
+        memory_mb=settings.EXTRACTION_MEMORY_MB,
+        wall_seconds=settings.EXTRACTION_WALL_SECONDS,
+    )
+    assert offsets == expected_offsets
+    assert sandbox_path.read_text(encoding='utf-8') == direct_path.read_text(encoding='utf-8')
+
+
+def _limits():
+    return resource.getrlimit(resource.RLIMIT_CPU)[0], resource.getrlimit(resource.RLIMIT_AS)[0]
+
+
+def _limits_with_pool(workers):
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [_limits()] + list(pool.map(_limits_in_worker, range(workers)))
+
+
+def _limits_in_worker(_):
+    return _limits()
+
+
+def test_sandbox_splits_limits_between_processes():
+    """Los procesos que lanza el hijo heredan su límite: entre todos no pasan del total."""
+    limits = run_sandboxed(_limits_with_pool, 2, cpu_seconds=90, memory_mb=3000, wall_seconds=60, processes=3)
+    assert limits == [(30, 1000 * 1024 * 1024)] * 3
+
+
+def test_parallel_pdf_extraction_within_the_document_budget(tmp_path, settings):
+    # Importado aquí: el hijo importa este módulo para ejecutar los helpers de arriba, sin Django inicializado
+    from archivos.jobs import run_extraction
+    settings.PDF_EXTRACTION_WORKERS = 2
+    direct_path = tmp_path / "directo.txt"
+    sandbox_path = tmp_path / "sandbox.txt"
+    expected_offsets = extract_text_to_file(SAMPLE_PDF, '.pdf', direct_path)
+    assert run_extraction(SAMPLE_PDF, '.pdf', sandbox_path) == expected_offsets
+    assert sandbox_path.read_text(encoding='utf-8') == direct_path.read_text(encoding='utf-8')
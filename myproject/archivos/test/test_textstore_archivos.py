@@ -0,0 +1,117 @@
+import gzip
+import pytest
+from unittest.mock import patch, MagicMock
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from archivos.models import UploadedFile, ExtractionJob
+from archivos.jobs import enqueue_extraction
+from archivos.textstore import CODEC_ZSTD, compressed_copy, read_text, text_size
+
+pytestmark = pytest.mark.django_db
+
+PAGES = ["Guía docente de Visión por Computador.", "Examen final: 20 de junio."]
+
+
+@pytest.fixture
+def test_user(db):
+    return User.objects.create_user(username='testuser', password='password123')
+
+
+@pytest.fixture
+def authenticated_client(test_user):
+    client = APIClient()
+    client.force_authenticate(user=test_user)
+    return client
+
+
+@pytest.fixture
+def mock_two_page_pdf():
+    with patch('archivos.extraction.pdfplumber.open') as mock_pdf_open:
+        pages = []
+        for text in PAGES:
+            page = MagicMock()
+            page.extract_text.return_value = text
+            pages.append(page)
+        mock_pdf = MagicMock()
+        mock_pdf.pages = pages
+        mock_pdf_open.return_value.__enter__.return_value = mock_pdf
+        yield mock_pdf_open
+
+
+@pytest.fixture
+def extract(run_pending_jobs):
+    def run(uploaded_file):
+        enqueue_extraction(uploaded_file)
+        [job] = run_pending_jobs()
+        assert job.status == ExtractionJob.STATUS_DONE, job.error_message
+        uploaded_file.refresh_from_db()
+        return uploaded_file
+
+    return run
+
+
+def test_extraction_stores_gzip_and_readers_decompress(settings, mock_two_page_pdf, authenticated_client, test_user, extract):
+    settings.TEXT_COMPRESSION = 'gzip'
+    uploaded_file = UploadedFile.objects.create(user=test_user, file=SimpleUploadedFile("guia.pdf", b"pdf"))
+    uploaded_file = extract(uploaded_file)
+
+    assert uploaded_file.text_file.name.endswith('guia.txt.gz')
+    with uploaded_file.text_file.open('rb') as f:
+        stored = f.read()
+    expected = "\n".join(PAGES).encode('utf-8')
+    assert gzip.decompress(stored) == expected
+
+    read_response = authenticated_client.get(reverse('api_read_text', kwargs={'file_id': uploaded_file.id}))
+    assert read_response.data['text'] == expected.decode('utf-8')
+
+    # Los offsets de página y los rangos se refieren al texto sin comprimir
+    raw_url = reverse('api_text_content', kwargs={'file_id': uploaded_file.id})
+    page_response = authenticated_client.get(raw_url, {'pages': '2'})
+    assert b"".join(page_response.streaming_content) == PAGES[1].encode('utf-8')
+    range_response = authenticated_client.get(raw_url, HTTP_RANGE='bytes=0-5')
+    assert range_response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert b"".join(range_response.streaming_content) == expected[:6]
+    assert range_response['Content-Range'] == f"bytes 0-5/{len(expected)}"
+
+    # El enlace del listado apunta al endpoint que descomprime, no al .gz
+    list_response = authenticated_client.get(reverse('api_list'))
+    assert list_response.data['results'][0]['text_file_url'].endswith(raw_url)
+
+
+def test_compress_text_files_command_converts_existing_files(settings, test_user):
+    uploaded_file = UploadedFile.objects.create(user=test_user, file=SimpleUploadedFile("antigua.pdf", b"pdf"))
+    text = "Temario antiguo sin comprimir. " * 200
+    uploaded_file.text_file.save("antigua.txt", ContentFile(text.encode('utf-8')))
+    old_name = uploaded_file.text_file.name
+
+    call_command('compress_text_files', '--codec', 'gzip')
+
+    uploaded_file.refresh_from_db()
+    assert uploaded_file.text_file.name.endswith('antigua.txt.gz')
+    assert not uploaded_file.text_file.storage.exists(old_name)
+    assert uploaded_file.text_file.size < len(text)
+    assert read_text(uploaded_file.text_file) == text
+    assert text_size(uploaded_file.text_file) == len(text.encode('utf-8'))
+
+    # Una segunda pasada no vuelve a comprimir
+    call_command('compress_text_files', '--codec', 'gzip')
+    compressed_name = uploaded_file.text_file.name
+    uploaded_file.refresh_from_db()
+    assert uploaded_file.text_file.name == compressed_name
+
+
+def test_zstd_round_trip(test_user):
+    pytest.importorskip('zstandard')
+    data = ("Fechas de evaluación. " * 500).encode('utf-8')
+    uploaded_file = UploadedFile.objects.create(user=test_user, file=SimpleUploadedFile("zstd.pdf", b"pdf"))
+    source = ContentFile(data)
+    with compressed_copy(source, CODEC_ZSTD, size=len(data)) as compressed:
+        uploaded_file.text_file.save("zstd.txt.zst", ContentFile(compressed.read()))
+    assert read_text(uploaded_file.text_file) == data.decode('utf-8')
+    assert text_size(uploaded_file.text_file) == len(data)
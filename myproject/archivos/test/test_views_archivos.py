@@ -1,5 +1,9 @@
 import pytest
 import os
+import hashlib
+from io import BytesIO
+from pptx import Presentation
+from pptx.util import Inches
 from django.urls import reverse
 from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
@@ -9,7 +13,8 @@ from rest_framework import status
 from rest_framework.test import APIClient
 from unittest.mock import patch, MagicMock # Para mockear la extracción
 
-from archivos.models import UploadedFile
+from archivos.models import UploadedFile, ExtractionJob
+from archivos.jobs import claim_pending_jobs
 from django.core.files.storage import default_storage
 
 # Marca para que todos los tests en este módulo usen la BD
@@ -96,6 +101,14 @@ def test_upload_file_pdf_success(authenticated_client, test_user):
     if uploaded_file.file and os.path.exists(uploaded_file.file.path):
          os.remove(uploaded_file.file.path) # Eliminar archivo físico si existe
 
+def test_upload_file_stores_content_hash(authenticated_client, test_user):
+    url = reverse('api_upload')
+    content = b"mismo contenido"
+    response = authenticated_client.post(url, {'file': SimpleUploadedFile("guia.pdf", content)}, format='multipart')
+    assert response.status_code == status.HTTP_201_CREATED
+    uploaded_file = UploadedFile.objects.get(user=test_user)
+    assert uploaded_file.content_hash == hashlib.sha256(content).hexdigest()
+
 def test_upload_file_pptx_success(authenticated_client, test_user):
     url = reverse('api_upload')
     pptx_file = SimpleUploadedFile("test_presentation.pptx", b"file_content_ppt", content_type="application/vnd.openxmlformats-officedocument.presentationml.presentation")
@@ -221,13 +234,11 @@ def test_delete_file_unauthenticated(api_client, create_uploaded_file, test_user
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
 
 # --- Tests para ExtractTextView ---
-# Usaremos mock para no depender de pdfplumber y python-pptx
+# Usaremos mock para no depender de pdfplumber y python-pptx.
+# La vista solo encola; el trabajo se ejecuta en el proceso del test con la fixture run_pending_jobs.
 
-@patch('archivos.views.pdfplumber.open') # Mockear pdfplumber
-# @patch('archivos.views.ContentFile') # <-- ELIMINADO
-# def test_extract_text_pdf_success(mock_content_file, mock_pdf_open, authenticated_client, create_uploaded_file, test_user): # <-- mock_content_file ELIMINADO
-def test_extract_text_pdf_success(mock_pdf_open, authenticated_client, create_uploaded_file, test_user):
-    # ... (configuración del mock de pdfplumber igual que antes) ...
+@patch('archivos.extraction.pdfplumber.open') # Mockear pdfplumber
+def test_extract_text_pdf_success(mock_pdf_open, authenticated_client, create_uploaded_file, test_user, run_pending_jobs):
     mock_pdf = MagicMock()
     mock_page = MagicMock()
     mock_page.extract_text.return_value = "Texto extraído de la página."
@@ -241,83 +252,59 @@ def test_extract_text_pdf_success(mock_pdf_open, authenticated_client, create_up
     url = reverse('api_extract_text', kwargs={'file_id': file_id})
     response = authenticated_client.post(url)
 
-    # Verificar el status code y mensaje básico
-    assert response.status_code == status.HTTP_200_OK, f"Expected 200 OK, got {response.status_code}. Response data: {response.data}"
-    assert response.data['message'] == "Texto extraído y guardado con éxito"
-    assert 'text_file_url' in response.data['file']
-    assert response.data['file']['text_file_url'] is not None
+    # La petición solo encola el trabajo
+    assert response.status_code == status.HTTP_202_ACCEPTED, f"Expected 202, got {response.status_code}. Response data: {response.data}"
+    assert response.data['status'] == ExtractionJob.STATUS_PENDING
+    job_id = response.data['job_id']
+    assert response.data['status_url'] == reverse('api_extraction_job', kwargs={'job_id': job_id})
+    mock_pdf_open.assert_not_called()
+
+    jobs = run_pending_jobs()
+    assert [job.id for job in jobs] == [job_id]
 
     # Verificar que se llamó a pdfplumber.open con la ruta correcta
     mock_pdf_open.assert_called_once_with(uploaded_file.file.path)
-    # mock_content_file.assert_called_once_with("Texto extraído de la página.".encode('utf-8')) # <-- ELIMINADO
+
+    # El endpoint de estado devuelve el archivo con el texto ya disponible
+    status_response = authenticated_client.get(response.data['status_url'])
+    assert status_response.status_code == status.HTTP_200_OK
+    assert status_response.data['status'] == ExtractionJob.STATUS_DONE
+    assert status_response.data['message'] == "Texto extraído y guardado con éxito"
+    assert status_response.data['file']['text_file_url'] is not None
 
     # Verificar en la BD y en el storage que el archivo de texto existe
     uploaded_file.refresh_from_db()
     assert uploaded_file.text_file is not None
-    assert uploaded_file.text_file.name is not None
     assert expected_text_filename in uploaded_file.text_file.name # Verificar que el nombre es correcto
-
-    # Opcional: Leer el contenido del archivo guardado para verificarlo
     assert default_storage.exists(uploaded_file.text_file.name) # Comprobar existencia en storage
-    with default_storage.open(uploaded_file.text_file.name, 'rb') as f: # Cambiar 'r' a 'rb'
-        saved_content_bytes = f.read() # Leer como bytes
-    saved_content = saved_content_bytes.decode('utf-8') # Decodificar usando UTF-8
+    with default_storage.open(uploaded_file.text_file.name, 'rb') as f:
+        saved_content = f.read().decode('utf-8')
     assert saved_content == "Texto extraído de la página."
+    assert uploaded_file.text_page_offsets == [0] # Índice de páginas para /text/raw/?pages=
 
-    # Limpieza (ya no es estrictamente necesario si tmp_path_factory funciona bien)
-    # if uploaded_file.text_file and default_storage.exists(uploaded_file.text_file.name):
-    #      default_storage.delete(uploaded_file.text_file.name)
-
-
-
-@patch('archivos.views.Presentation') # Mockear Presentation
-# @patch('archivos.views.ContentFile') # <-- ELIMINADO
-# def test_extract_text_pptx_success(mock_content_file, mock_presentation, authenticated_client, create_uploaded_file, test_user): # <-- mock_content_file ELIMINADO
-def test_extract_text_pptx_success(mock_presentation, authenticated_client, create_uploaded_file, test_user):
-    # ... (configuración del mock de Presentation igual que antes) ...
-    mock_pres = MagicMock()
-    mock_slide = MagicMock()
-    mock_shape = MagicMock()
-    mock_text_frame = MagicMock()
-    mock_text_frame.text = "Texto de la diapositiva."
-    mock_shape.text_frame = mock_text_frame
-    mock_shape.has_text_frame = True
-    mock_slide.shapes = [mock_shape]
-    mock_pres.slides = [mock_slide]
-    mock_presentation.return_value = mock_pres
-
-    uploaded_file = create_uploaded_file(filename="extract_me.pptx")
-    file_id = uploaded_file.id
-    expected_text_filename = 'extract_me.txt' # Nombre esperado
 
-    url = reverse('api_extract_text', kwargs={'file_id': file_id})
-    response = authenticated_client.post(url)
+def test_extract_text_pptx_success(authenticated_client, create_uploaded_file, test_user, run_pending_jobs):
+    # El PPTX se lee directamente del XML, así que usamos una presentación real
+    prs = Presentation()
+    slide = prs.slides.add_slide(prs.slide_layouts[6])
+    slide.shapes.add_textbox(Inches(1), Inches(1), Inches(4), Inches(1)).text_frame.text = "Texto de la diapositiva."
+    pptx_content = BytesIO()
+    prs.save(pptx_content)
 
-    # Verificar status code y mensaje
-    assert response.status_code == status.HTTP_200_OK, f"Expected 200 OK, got {response.status_code}. Response data: {response.data}"
-    assert response.data['message'] == "Texto extraído y guardado con éxito"
+    uploaded_file = create_uploaded_file(filename="extract_me.pptx", content=pptx_content.getvalue())
+    url = reverse('api_extract_text', kwargs={'file_id': uploaded_file.id})
+    response = authenticated_client.post(url)
+    assert response.status_code == status.HTTP_202_ACCEPTED
 
-    # Verificar llamada a Presentation
-    mock_presentation.assert_called_once_with(uploaded_file.file.path)
-    # mock_content_file.assert_called_once_with("Texto de la diapositiva.".encode('utf-8')) # <-- ELIMINADO
+    run_pending_jobs()
 
     # Verificar en BD y storage
     uploaded_file.refresh_from_db()
-    assert uploaded_file.text_file is not None
-    assert uploaded_file.text_file.name is not None
-    assert expected_text_filename in uploaded_file.text_file.name
-
-    # Opcional: Leer contenido
-    assert default_storage.exists(uploaded_file.text_file.name)
-    with default_storage.open(uploaded_file.text_file.name, 'rb') as f: # Cambiar 'r' a 'rb'
-        saved_content_bytes = f.read() # Leer como bytes
-    saved_content = saved_content_bytes.decode('utf-8') # Decodificar usando UTF-8
+    assert 'extract_me.txt' in uploaded_file.text_file.name
+    with default_storage.open(uploaded_file.text_file.name, 'rb') as f:
+        saved_content = f.read().decode('utf-8')
     assert saved_content == "Texto de la diapositiva."
 
-    # Limpieza (opcional)
-    # if uploaded_file.text_file and default_storage.exists(uploaded_file.text_file.name):
-    #      default_storage.delete(uploaded_file.text_file.name)
-
 
 def test_extract_text_unsupported_type(authenticated_client, create_uploaded_file):
     uploaded_file = create_uploaded_file(filename="image.jpg", content=b"jpeg_data")
@@ -325,9 +312,18 @@ def test_extract_text_unsupported_type(authenticated_client, create_uploaded_fil
     response = authenticated_client.post(url)
     assert response.status_code == status.HTTP_400_BAD_REQUEST
     assert "Tipo de archivo no soportado: '.jpg'" in response.data['message']
+    assert not ExtractionJob.objects.exists() # No se encola nada
 
-@patch('archivos.views.pdfplumber.open')
-def test_extract_text_no_text_found(mock_pdf_open, authenticated_client, create_uploaded_file):
+def test_extract_text_reuses_active_job(authenticated_client, create_uploaded_file):
+    uploaded_file = create_uploaded_file(filename="double_click.pdf")
+    url = reverse('api_extract_text', kwargs={'file_id': uploaded_file.id})
+    first = authenticated_client.post(url)
+    second = authenticated_client.post(url)
+    assert first.data['job_id'] == second.data['job_id']
+    assert ExtractionJob.objects.filter(file=uploaded_file).count() == 1
+
+@patch('archivos.extraction.pdfplumber.open')
+def test_extract_text_no_text_found(mock_pdf_open, authenticated_client, create_uploaded_file, run_pending_jobs):
     # Simular que pdfplumber no extrae texto
     mock_pdf = MagicMock()
     mock_page = MagicMock()
@@ -338,21 +334,120 @@ def test_extract_text_no_text_found(mock_pdf_open, authenticated_client, create_
     uploaded_file = create_uploaded_file(filename="empty.pdf")
     url = reverse('api_extract_text', kwargs={'file_id': uploaded_file.id})
     response = authenticated_client.post(url)
+    run_pending_jobs()
 
-    assert response.status_code == status.HTTP_400_BAD_REQUEST
-    assert "No se pudo extraer contenido de texto" in response.data['message']
+    status_response = authenticated_client.get(response.data['status_url'])
+    assert status_response.data['status'] == ExtractionJob.STATUS_FAILED
+    assert "No se pudo extraer contenido de texto" in status_response.data['message']
+    uploaded_file.refresh_from_db()
+    assert not uploaded_file.text_file
 
-@patch('archivos.views.pdfplumber.open')
-def test_extract_text_extraction_error(mock_pdf_open, authenticated_client, create_uploaded_file):
+@patch('archivos.extraction.pdfplumber.open')
+def test_extract_text_extraction_error(mock_pdf_open, authenticated_client, create_uploaded_file, run_pending_jobs):
     # Simular un error durante la extracción
     mock_pdf_open.side_effect = Exception("Error simulado de pdfplumber")
 
     uploaded_file = create_uploaded_file(filename="error.pdf")
     url = reverse('api_extract_text', kwargs={'file_id': uploaded_file.id})
     response = authenticated_client.post(url)
+    run_pending_jobs()
+
+    status_response = authenticated_client.get(response.data['status_url'])
+    assert status_response.data['status'] == ExtractionJob.STATUS_FAILED
+    assert "Error al procesar el archivo PDF: Error simulado de pdfplumber" in status_response.data['message']
+
+@patch('archivos.extraction.pdfplumber.open')
+def test_extract_text_reuses_text_of_identical_file(mock_pdf_open, authenticated_client, create_uploaded_file, run_pending_jobs):
+    # Un archivo idéntico ya extraído: no se vuelve a abrir el PDF
+    original = create_uploaded_file(filename="guia.pdf", content=b"misma guia", text_content="Texto ya extraido")
+    copy = create_uploaded_file(filename="guia_copia.pdf", content=b"misma guia")
+    for uploaded_file in (original, copy):
+        uploaded_file.content_hash = hashlib.sha256(b"misma guia").hexdigest()
+        uploaded_file.save()
+
+    url = reverse('api_extract_text', kwargs={'file_id': copy.id})
+    authenticated_client.post(url)
+    run_pending_jobs()
+
+    mock_pdf_open.assert_not_called()
+    copy.refresh_from_db()
+    assert copy.text_file.name != original.text_file.name # Cada archivo tiene su propia copia
+    with default_storage.open(copy.text_file.name, 'rb') as f:
+        assert f.read().decode('utf-8') == "Texto ya extraido"
+
+def test_extraction_job_status_wrong_user(authenticated_client):
+    other_user = User.objects.create_user(username='otheruser', password='password123')
+    other_file = UploadedFile.objects.create(user=other_user, file=SimpleUploadedFile("other.pdf", b"content"))
+    job = ExtractionJob.objects.create(file=other_file)
+    url = reverse('api_extraction_job', kwargs={'job_id': job.id})
+    response = authenticated_client.get(url)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
 
-    assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
-    assert "Error al procesar el archivo PDF: Error simulado de pdfplumber" in response.data['message']
+@patch('archivos.extraction.pdfplumber.open')
+def test_extract_batch_enqueues_and_reports_per_file(mock_pdf_open, authenticated_client, create_uploaded_file, run_pending_jobs):
+    mock_pdf = MagicMock()
+    mock_page = MagicMock()
+    mock_page.extract_text.return_value = "Texto de la guía."
+    mock_pdf.pages = [mock_page]
+    mock_pdf_open.return_value.__enter__.return_value = mock_pdf
+
+    first = create_uploaded_file(filename="guia1.pdf", content=b"guia uno")
+    second = create_uploaded_file(filename="guia2.pdf", content=b"guia dos")
+    image = create_uploaded_file(filename="foto.jpg", content=b"jpeg_data")
+    other_user = User.objects.create_user(username='otheruser', password='password123')
+    foreign = UploadedFile.objects.create(user=other_user, file=SimpleUploadedFile("ajeno.pdf", b"content"))
+
+    url = reverse('api_extract_batch')
+    response = authenticated_client.post(
+        url, {"file_ids": [first.id, second.id, image.id, foreign.id, first.id]}, format='json'
+    )
+
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert [job['file_id'] for job in response.data['jobs']] == [first.id, second.id]
+    assert {error['file_id'] for error in response.data['errors']} == {image.id, foreign.id}
+    mock_pdf_open.assert_not_called()
+
+    # Repetir el lote reutiliza los trabajos activos
+    again = authenticated_client.post(url, {"file_ids": [first.id, second.id]}, format='json')
+    assert [job['job_id'] for job in again.data['jobs']] == [job['job_id'] for job in response.data['jobs']]
+
+    pending = authenticated_client.get(response.data['status_url'])
+    assert pending.status_code == status.HTTP_200_OK
+    assert pending.data['count'] == 2
+    assert pending.data['pending'] == 2
+
+    run_pending_jobs()
+    done = authenticated_client.get(response.data['status_url'])
+    assert done.data['pending'] == 0
+    assert [job['status'] for job in done.data['jobs']] == [ExtractionJob.STATUS_DONE] * 2
+    assert all(job['file']['text_file_url'] for job in done.data['jobs'])
+
+def test_extract_batch_invalid_body(authenticated_client):
+    url = reverse('api_extract_batch')
+    assert authenticated_client.post(url, {}, format='json').status_code == status.HTTP_400_BAD_REQUEST
+    assert authenticated_client.post(url, {"file_ids": ["a"]}, format='json').status_code == status.HTTP_400_BAD_REQUEST
+    response = authenticated_client.post(url, {"file_ids": [999999]}, format='json')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST # Ningún archivo válido
+    assert response.data['errors'][0]['message'] == "Archivo no encontrado"
+
+def test_extraction_job_list_hides_other_users(authenticated_client):
+    other_user = User.objects.create_user(username='otheruser', password='password123')
+    other_file = UploadedFile.objects.create(user=other_user, file=SimpleUploadedFile("other.pdf", b"content"))
+    job = ExtractionJob.objects.create(file=other_file)
+    url = reverse('api_extraction_jobs')
+    response = authenticated_client.get(url, {'ids': str(job.id)})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['count'] == 0
+    assert authenticated_client.get(url, {'ids': 'x'}).status_code == status.HTTP_400_BAD_REQUEST
+
+def test_claim_pending_jobs_only_once(create_uploaded_file):
+    uploaded_file = create_uploaded_file(filename="claim.pdf")
+    job = ExtractionJob.objects.create(file=uploaded_file)
+    assert [claimed.id for claimed in claim_pending_jobs(5)] == [job.id]
+    assert claim_pending_jobs(5) == [] # Ya está en 'running'
+    job.refresh_from_db()
+    assert job.status == ExtractionJob.STATUS_RUNNING
+    assert job.started_at is not None
 
 # --- Tests para ReadTextView ---
 
@@ -387,6 +482,59 @@ def test_read_text_file_not_found(authenticated_client):
     response = authenticated_client.get(url)
     assert response.status_code == status.HTTP_404_NOT_FOUND
 
+# --- Tests para TextContentView ---
+
+PAGED_TEXT = "Página 1\nPágina 2\nPágina 3"
+
+@pytest.fixture
+def paged_text_file(create_uploaded_file):
+    uploaded_file = create_uploaded_file(filename="paginado.pdf", text_content=PAGED_TEXT)
+    uploaded_file.text_page_offsets = [0, 10, 20] # "Página N" son 9 bytes + salto de línea
+    uploaded_file.save()
+    return uploaded_file
+
+def test_text_content_streams_full_text(authenticated_client, paged_text_file):
+    url = reverse('api_text_content', kwargs={'file_id': paged_text_file.id})
+    response = authenticated_client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert b''.join(response.streaming_content).decode('utf-8') == PAGED_TEXT
+    assert response['Accept-Ranges'] == 'bytes'
+    assert response['X-Page-Count'] == '3'
+    assert response.has_header('ETag')
+    assert response.has_header('Last-Modified')
+
+def test_text_content_not_modified(authenticated_client, paged_text_file):
+    url = reverse('api_text_content', kwargs={'file_id': paged_text_file.id})
+    etag = authenticated_client.get(url)['ETag']
+    response = authenticated_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response['ETag'] == etag
+
+def test_text_content_byte_range(authenticated_client, paged_text_file):
+    url = reverse('api_text_content', kwargs={'file_id': paged_text_file.id})
+    response = authenticated_client.get(url, HTTP_RANGE='bytes=0-2')
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert b''.join(response.streaming_content) == b"P\xc3\xa1" # "Pá"
+    assert response['Content-Range'] == f"bytes 0-2/{len(PAGED_TEXT.encode('utf-8'))}"
+
+def test_text_content_range_not_satisfiable(authenticated_client, paged_text_file):
+    url = reverse('api_text_content', kwargs={'file_id': paged_text_file.id})
+    response = authenticated_client.get(url, HTTP_RANGE='bytes=1000-')
+    assert response.status_code == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+
+def test_text_content_pages_slice(authenticated_client, paged_text_file):
+    url = reverse('api_text_content', kwargs={'file_id': paged_text_file.id})
+    response = authenticated_client.get(url, {'pages': '2-3'})
+    assert response.status_code == status.HTTP_200_OK
+    assert b''.join(response.streaming_content).decode('utf-8') == "Página 2\nPágina 3"
+
+def test_text_content_pages_without_index(authenticated_client, create_uploaded_file):
+    uploaded_file = create_uploaded_file(filename="sin_indice.pdf", text_content="Texto antiguo")
+    url = reverse('api_text_content', kwargs={'file_id': uploaded_file.id})
+    response = authenticated_client.get(url, {'pages': '1'})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "índice de páginas" in response.data['message']
+
 # --- Tests para UserExtractedDataView ---
 
 def test_get_extracted_data_success(authenticated_client, create_uploaded_file, test_user):
@@ -437,7 +585,7 @@ def test_get_extracted_data_none(authenticated_client, create_uploaded_file):
 def test_update_extracted_data_success(authenticated_client, create_uploaded_file):
     uploaded_file = create_uploaded_file(filename="update_me.pdf", extracted_data={"old": "data"})
     file_id = uploaded_file.id
-    new_data = {"new": "info", "value": 123}
+    new_data = {"asignatura": {"nombre": " Algebra "}, "fechas": [{"titulo": "Final", "fecha": "2025-06-20"}], "extra": 1}
 
     url = reverse('update-extracted', kwargs={'file_id': file_id})
     response = authenticated_client.put(url, {'extracted_data': new_data}, format='json')
@@ -445,8 +593,37 @@ def test_update_extracted_data_success(authenticated_client, create_uploaded_fil
     assert response.status_code == status.HTTP_200_OK
     assert response.data['message'] == 'Datos actualizados con éxito'
 
+    # Se guarda normalizado con el esquema de JSON_utilizar.json
+    uploaded_file.refresh_from_db()
+    assert uploaded_file.extracted_data == {
+        "asignatura": {"nombre": "Algebra", "grado": "", "departamento": "", "universidad": "", "condiciones_aprobado": ""},
+        "fechas": [{"titulo": "Final", "fecha": "2025-06-20"}],
+        "horarios": [],
+        "profesores": [],
+    }
+
+def test_update_extracted_data_invalid_structure(authenticated_client, create_uploaded_file):
+    uploaded_file = create_uploaded_file(filename="invalid.pdf", extracted_data={"old": "data"})
+    url = reverse('update-extracted', kwargs={'file_id': uploaded_file.id})
+    response = authenticated_client.put(url, {'extracted_data': {"profesores": [{"nombre": ["a", "b"]}]}}, format='json')
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data['errors'] == ["profesores[].nombre: se esperaba un texto"]
+    uploaded_file.refresh_from_db()
+    assert uploaded_file.extracted_data == {"old": "data"}
+
+def test_update_extracted_data_accepts_professor_schedule_object(authenticated_client, create_uploaded_file):
+    """El horario de tutorías como objeto (la forma que procesa ProcessExtractedDataView) sigue siendo válido."""
+    uploaded_file = create_uploaded_file(filename="horario.pdf", extracted_data={"old": "data"})
+    horario = {"grupo": "", "tipo": "tutoria", "dia": "Martes", "hora": "16-17", "aula": "D1"}
+    url = reverse('update-extracted', kwargs={'file_id': uploaded_file.id})
+    response = authenticated_client.put(
+        url, {'extracted_data': {"profesores": [{"nombre": "Prof. Gauss", "horario": horario}]}}, format='json'
+    )
+
+    assert response.status_code == status.HTTP_200_OK
     uploaded_file.refresh_from_db()
-    assert uploaded_file.extracted_data == new_data
+    assert uploaded_file.extracted_data["profesores"][0]["horario"] == horario
 
 def test_update_extracted_data_clear(authenticated_client, create_uploaded_file):
     uploaded_file = create_uploaded_file(filename="clear_me.pdf", extracted_data={"some": "data"})
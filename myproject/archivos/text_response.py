@@ -0,0 +1,137 @@
+import hashlib
+import re
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from .textstore import open_text, text_size
+
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+PAGES_RE = re.compile(r'^(\d+)(?:-(\d+))?$')
+
+
+class InvalidPagesError(ValueError):
+    pass
+
+
+class UnsatisfiableRangeError(ValueError):
+    pass
+
+
+def page_byte_range(page_offsets, pages_param, total_size):
+    """
+    Convierte `?pages=a-b` (páginas desde 1, ambas incluidas) en el rango de
+    bytes [start, end) del texto usando el índice de offsets guardado al extraer.
+    """
+    if not page_offsets:
+        raise InvalidPagesError("Este texto no tiene índice de páginas; vuelve a extraerlo para poder usar 'pages'.")
+    match = PAGES_RE.match(pages_param.strip())
+    if not match:
+        raise InvalidPagesError("Formato de 'pages' no válido. Usa por ejemplo 'pages=3' o 'pages=2-5'.")
+    first = int(match.group(1))
+    last = int(match.group(2) or first)
+    page_count = len(page_offsets)
+    if first < 1 or last < first or first > page_count:
+        raise InvalidPagesError(f"Rango de páginas no válido. El documento tiene {page_count} páginas.")
+    last = min(last, page_count)
+    end = page_offsets[last] if last < page_count else total_size
+    return page_offsets[first - 1], end
+
+
+def parse_range_header(header, size):
+    """
+    Devuelve el rango [start, end) pedido en la cabecera Range, o None si no hay
+    o si es de varios rangos (en ese caso se sirve el contenido completo).
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    if match.group(1):
+        start = int(match.group(1))
+        end = int(match.group(2)) + 1 if match.group(2) else size
+    else:
+        # bytes=-N: los últimos N bytes
+        start = max(size - int(match.group(2)), 0)
+        end = size
+    end = min(end, size)
+    if start >= size or start >= end:
+        raise UnsatisfiableRangeError()
+    return start, end
+
+
+def iter_file_range(f, start, length):
+    try:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def text_file_response(request, text_file, page_offsets=None, pages_param=None):
+    """
+    Respuesta en streaming de un .txt extraído con ETag/Last-Modified (304 si el
+    cliente ya lo tiene), soporte de Range y recorte opcional por páginas. Si el
+    texto está comprimido se descomprime al vuelo.
+    """
+    storage = text_file.storage
+    stored_size = storage.size(text_file.name)
+    modified_at = storage.get_modified_time(text_file.name)
+
+    # La representación depende del recorte por páginas, así que entra en el ETag
+    etag_source = f"{text_file.name}:{stored_size}:{modified_at.timestamp()}:{pages_param or ''}"
+    etag = quote_etag(hashlib.sha256(etag_source.encode('utf-8')).hexdigest()[:32])
+    last_modified = int(modified_at.timestamp())
+
+    conditional_response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional_response is not None:
+        conditional_response.headers['ETag'] = etag
+        conditional_response.headers['Last-Modified'] = http_date(last_modified)
+        return conditional_response
+
+    # Los offsets y los rangos se refieren siempre al texto sin comprimir
+    total_size = text_size(text_file)
+    start, end = 0, total_size
+    if pages_param:
+        start, end = page_byte_range(page_offsets, pages_param, total_size)
+    body_size = end - start
+
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag:
+        range_header = None # El cliente tiene una versión antigua: se envía todo
+    try:
+        byte_range = parse_range_header(range_header, body_size)
+    except UnsatisfiableRangeError:
+        response = HttpResponse(status=416)
+        response.headers['Content-Range'] = f"bytes */{body_size}"
+        return response
+
+    status_code = 200
+    if byte_range:
+        range_start, range_end = byte_range
+        status_code = 206
+        start, end = start + range_start, start + range_end
+
+    response = StreamingHttpResponse(
+        iter_file_range(open_text(text_file), start, end - start),
+        status=status_code,
+        content_type='text/plain; charset=utf-8',
+    )
+    response.headers['Content-Length'] = str(end - start)
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(last_modified)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    if byte_range:
+        response.headers['Content-Range'] = f"bytes {byte_range[0]}-{byte_range[1] - 1}/{body_size}"
+    if page_offsets:
+        response.headers['X-Page-Count'] = str(len(page_offsets))
+    return response
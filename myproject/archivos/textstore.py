@@ -0,0 +1,173 @@
+import gzip
+import io
+import shutil
+import tempfile
+from django.conf import settings
+
+try:
+    import zstandard
+except ImportError: # zstd es opcional; sin él se comprime con gzip
+    zstandard = None
+
+# Almacenamiento opcionalmente comprimido de los .txt extraídos. Los lectores
+# detectan el formato por los bytes mágicos, así que conviven archivos planos,
+# gzip y zstd (por ejemplo, mientras se migran los antiguos con compress_text_files).
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+CODEC_GZIP = 'gzip'
+CODEC_ZSTD = 'zstd'
+CODEC_SUFFIXES = {CODEC_GZIP: '.gz', CODEC_ZSTD: '.zst'}
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 10
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+
+class TextStoreError(OSError):
+    pass
+
+
+def resolve_codec(codec):
+    """Normaliza el códec pedido; '' o None significa sin compresión."""
+    codec = (codec or '').strip().lower()
+    if not codec or codec == 'none':
+        return None
+    if codec not in CODEC_SUFFIXES:
+        raise ValueError(f"Códec de compresión no soportado: '{codec}'. Usa 'gzip' o 'zstd'.")
+    if codec == CODEC_ZSTD and zstandard is None:
+        return CODEC_GZIP
+    return codec
+
+
+def configured_codec():
+    return resolve_codec(settings.TEXT_COMPRESSION)
+
+
+def stored_name(filename, codec):
+    """Nombre con el que se guarda el texto: 'guia.txt' -> 'guia.txt.gz'."""
+    return filename + CODEC_SUFFIXES[codec] if codec else filename
+
+
+def detect_codec(f):
+    """Códec de un archivo binario abierto según su cabecera (None si es texto plano)."""
+    position = f.tell()
+    header = f.read(4)
+    f.seek(position)
+    if header.startswith(GZIP_MAGIC):
+        return CODEC_GZIP
+    if header.startswith(ZSTD_MAGIC):
+        return CODEC_ZSTD
+    return None
+
+
+def compress_stream(source, dest, codec, size=None):
+    """Copia `source` (binario, sin comprimir) en `dest` comprimiéndolo por bloques."""
+    if codec == CODEC_ZSTD:
+        # Con el tamaño en la cabecera del frame se conoce sin descomprimir
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        compressor.copy_stream(source, dest, size=size if size is not None else -1)
+    else:
+        with gzip.GzipFile(fileobj=dest, mode='wb', compresslevel=GZIP_LEVEL, mtime=0) as gz:
+            shutil.copyfileobj(source, gz)
+
+
+def compressed_copy(source, codec, size=None):
+    """Devuelve un temporal (en memoria si es pequeño) con `source` comprimido."""
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    compress_stream(source, spooled, codec, size=size)
+    spooled.seek(0)
+    return spooled
+
+
+class DecompressedFile(io.BufferedIOBase):
+    """Lectura descomprimida que cierra también el archivo original."""
+
+    def __init__(self, stream, raw):
+        super().__init__()
+        self._stream = stream
+        self._raw = raw
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        return self._stream.read(size)
+
+    def read1(self, size=-1):
+        return self._stream.read(size)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        # Solo hacia delante: se descomprime y descarta hasta llegar al offset
+        return self._stream.seek(offset, whence)
+
+    def tell(self):
+        return self._stream.tell()
+
+    def close(self):
+        if not self.closed:
+            try:
+                self._stream.close()
+            finally:
+                self._raw.close()
+        super().close()
+
+
+def _decompressed(raw, codec):
+    if codec == CODEC_GZIP:
+        return DecompressedFile(gzip.GzipFile(fileobj=raw, mode='rb'), raw)
+    if zstandard is None:
+        raw.close()
+        raise TextStoreError("El texto está comprimido con zstd y el paquete 'zstandard' no está instalado.")
+    return DecompressedFile(zstandard.ZstdDecompressor().stream_reader(raw, closefd=False), raw)
+
+
+def open_text(field_file):
+    """Abre en binario el texto de un FileField, descomprimiéndolo si hace falta."""
+    raw = field_file.storage.open(field_file.name, 'rb')
+    codec = detect_codec(raw)
+    if codec is None:
+        return raw
+    return _decompressed(raw, codec)
+
+
+def read_text(field_file):
+    with open_text(field_file) as f:
+        return f.read().decode('utf-8')
+
+
+def text_size(field_file):
+    """Tamaño en bytes del texto sin comprimir."""
+    storage = field_file.storage
+    stored_size = storage.size(field_file.name)
+    with storage.open(field_file.name, 'rb') as raw:
+        codec = detect_codec(raw)
+        if codec is None:
+            return stored_size
+        if codec == CODEC_GZIP and stored_size >= 18:
+            # El trailer de gzip guarda el tamaño original (módulo 2^32)
+            raw.seek(stored_size - 4)
+            return int.from_bytes(raw.read(4), 'little')
+        if codec == CODEC_ZSTD and zstandard is not None:
+            try:
+                content_size = zstandard.frame_content_size(raw.read(18))
+            except zstandard.ZstdError:
+                content_size = -1
+            if content_size >= 0:
+                return content_size
+    # Sin tamaño en la cabecera: se descomprime contando los bytes
+    total = 0
+    with open_text(field_file) as f:
+        while True:
+            chunk = f.read(64 * 1024)
+            if not chunk:
+                return total
+            total += len(chunk)
+
+
+def has_compressed_name(name):
+    return bool(name) and name.endswith(tuple(CODEC_SUFFIXES.values()))
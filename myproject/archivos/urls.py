@@ -1,12 +1,16 @@
 from django.urls import path
-from .views import FileUploadView, FileListView, FileDeleteView, ExtractTextView, ReadTextView, UserExtractedDataView, UpdateExtractedDataView
+from .views import FileUploadView, FileListView, FileDeleteView, ExtractTextView, ReadTextView, UserExtractedDataView, UpdateExtractedDataView, ExtractionJobStatusView, ExtractionJobListView, ExtractBatchView, TextContentView
 
 urlpatterns = [
     path('', FileUploadView.as_view(), name='api_upload'),
     path('list/', FileListView.as_view(), name='api_list'),
     path('delete/<int:file_id>/', FileDeleteView.as_view(), name='api_delete'),
     path('<int:file_id>/extract/', ExtractTextView.as_view(), name='api_extract_text'),  
+    path('extract-batch/', ExtractBatchView.as_view(), name='api_extract_batch'),
+    path('jobs/', ExtractionJobListView.as_view(), name='api_extraction_jobs'),
+    path('jobs/<int:job_id>/', ExtractionJobStatusView.as_view(), name='api_extraction_job'),
     path('<int:file_id>/text/', ReadTextView.as_view(), name='api_read_text'),
+    path('<int:file_id>/text/raw/', TextContentView.as_view(), name='api_text_content'),
     path('extracted/', UserExtractedDataView.as_view(), name='api_extracted_data'),
     path('<int:file_id>/update-extracted/', UpdateExtractedDataView.as_view(), name='update-extracted'),
     
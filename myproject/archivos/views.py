@@ -3,13 +3,18 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from .serializers import FileUploadSerializer, UploadedFileSerializer
-import pdfplumber
-from .models import UploadedFile
+from .models import UploadedFile, ExtractionJob
+from .extraction import SUPPORTED_EXTENSIONS
+from .jobs import enqueue_extraction, enqueue_extractions, get_file_extension
+from .content_cache import compute_content_hash
+from .text_response import InvalidPagesError, text_file_response
+from .textstore import read_text
+from myapp.schema import SchemaValidationError, get_schema
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from rest_framework.pagination import PageNumberPagination
-from django.core.files.base import ContentFile
-import os
-from pptx import Presentation
+
+MAX_BATCH_FILES = 100
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 6  # 4 archivos por página
@@ -22,7 +27,8 @@ class FileUploadView(APIView):
     def post(self, request):
         serializer = FileUploadSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(user=request.user)
+            content_hash = compute_content_hash(serializer.validated_data['file'])
+            serializer.save(user=request.user, content_hash=content_hash)
             return Response({"message": "Archivo subido con éxito"}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
  
@@ -53,79 +59,124 @@ class ExtractTextView(APIView):
 
     def post(self, request, file_id):
         file_obj = get_object_or_404(UploadedFile, id=file_id, user=request.user)
-        file_path = file_obj.file.path
-        original_filename = file_obj.file.name
 
         # Obtener la extensión del archivo para determinar el tipo
-        try:
-            filename_base, file_extension = os.path.splitext(original_filename)
-            file_extension = file_extension.lower() # Convertir a minúsculas para comparación
-        except Exception as e:
-             return Response(
-                {"message": f"No se pudo determinar la extensión del archivo: {e}"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        extracted_text = ''
-        error_message = None
-        # --- Lógica de extracción basada en la extensión ---
-        if file_extension == '.pdf':
-            try:
-                with pdfplumber.open(file_path) as pdf:
-                    temp_text = []
-                    for page in pdf.pages:
-                        page_text = page.extract_text()
-                        if page_text: # Añadir solo si hay texto en la página
-                            temp_text.append(page_text)
-                    extracted_text = '\n'.join(temp_text) # Unir páginas con salto de línea
-            except Exception as e:
-                error_message = f"Error al procesar el archivo PDF: {e}"
-
-        elif file_extension == '.pptx':
-            try:
-                prs = Presentation(file_path)
-                temp_text = []
-                for slide in prs.slides:
-                    for shape in slide.shapes:
-                        # Verificar si la forma tiene un marco de texto y si contiene texto
-                        if hasattr(shape, "text_frame") and shape.text_frame and shape.text_frame.text:
-                            temp_text.append(shape.text_frame.text)
-                extracted_text = '\n\n'.join(temp_text) # Unir texto de formas/diapositivas con doble salto
-            except Exception as e:
-                error_message = f"Error al procesar el archivo PowerPoint: {e}"
-
-        else:
-            # Si no es ni PDF ni PPTX, devolvemos un error
+        file_extension = get_file_extension(file_obj)
+        if file_extension not in SUPPORTED_EXTENSIONS:
+            # Si no es ni PDF ni PPTX, devolvemos un error sin encolar nada
             return Response(
                 {"message": f"Tipo de archivo no soportado: '{file_extension}'. Solo se admiten PDF y PPTX."},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Si ocurrió un error durante la extracción específica del tipo de archivo
-        if error_message:
-             return Response({"message": error_message}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # La extracción la hace el worker (process_extraction_jobs); aquí solo se encola
+        job = enqueue_extraction(file_obj)
+        return Response({
+            "message": "Extracción de texto en cola",
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": reverse('api_extraction_job', kwargs={'job_id': job.id}),
+        }, status=status.HTTP_202_ACCEPTED)
 
-        # Verificar si se extrajo algo de texto útil
-        if not extracted_text or not extracted_text.strip():
-            return Response(
-                {"message": f"No se pudo extraer contenido de texto del archivo ({file_extension}) o el archivo está vacío."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
 
-        output_filename_base = os.path.basename(filename_base)
-        text_filename = f"{output_filename_base}.txt"
+class ExtractBatchView(APIView):
+    permission_classes = [IsAuthenticated]
 
+    def post(self, request):
+        file_ids = request.data.get('file_ids')
+        if not isinstance(file_ids, list) or not file_ids:
+            return Response({"message": "Debes enviar 'file_ids' con una lista de IDs de archivo"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(file_ids) > MAX_BATCH_FILES:
+            return Response({"message": f"Como máximo se pueden extraer {MAX_BATCH_FILES} archivos por petición"}, status=status.HTTP_400_BAD_REQUEST)
+        if not all(isinstance(file_id, int) and not isinstance(file_id, bool) for file_id in file_ids):
+            return Response({"message": "Los IDs de archivo deben ser números enteros"}, status=status.HTTP_400_BAD_REQUEST)
+
+        file_ids = list(dict.fromkeys(file_ids)) # Sin duplicados, manteniendo el orden
+        files = UploadedFile.objects.filter(id__in=file_ids, user=request.user).in_bulk()
+
+        errors = []
+        to_enqueue = []
+        for file_id in file_ids:
+            file_obj = files.get(file_id)
+            if file_obj is None:
+                errors.append({"file_id": file_id, "message": "Archivo no encontrado"})
+                continue
+            file_extension = get_file_extension(file_obj)
+            if file_extension not in SUPPORTED_EXTENSIONS:
+                errors.append({
+                    "file_id": file_id,
+                    "message": f"Tipo de archivo no soportado: '{file_extension}'. Solo se admiten PDF y PPTX."
+                })
+                continue
+            to_enqueue.append(file_obj)
+
+        # Los trabajos los reparte el worker entre su pool de procesos limitado
+        jobs = enqueue_extractions(to_enqueue)
+        queued = [
+            {
+                "file_id": file_obj.id,
+                "job_id": jobs[file_obj.id].id,
+                "status": jobs[file_obj.id].status,
+                "status_url": reverse('api_extraction_job', kwargs={'job_id': jobs[file_obj.id].id}),
+            }
+            for file_obj in to_enqueue
+        ]
+        job_ids = ",".join(str(job["job_id"]) for job in queued)
+        return Response({
+            "message": f"{len(queued)} extracciones en cola",
+            "jobs": queued,
+            "errors": errors,
+            "status_url": f"{reverse('api_extraction_jobs')}?ids={job_ids}" if queued else None,
+        }, status=status.HTTP_202_ACCEPTED if queued else status.HTTP_400_BAD_REQUEST)
+
+
+def job_status_data(job, request):
+    data = {
+        "job_id": job.id,
+        "file_id": job.file_id,
+        "status": job.status,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+    if job.status == ExtractionJob.STATUS_DONE:
+        data["message"] = "Texto extraído y guardado con éxito"
+        data["file"] = UploadedFileSerializer(job.file, context={'request': request}).data
+    elif job.status == ExtractionJob.STATUS_FAILED:
+        data["message"] = job.error_message
+    return data
+
+
+class ExtractionJobStatusView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        job = get_object_or_404(ExtractionJob, id=job_id, file__user=request.user)
+        return Response(job_status_data(job, request), status=status.HTTP_200_OK)
+
+
+class ExtractionJobListView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        # Estado de varios trabajos en una sola petición: ?ids=1,2,3
         try:
-            file_obj.text_file.save(text_filename, ContentFile(extracted_text.encode('utf-8')), save=True)
-            serializer = UploadedFileSerializer(file_obj, context={'request': request})
-            return Response({
-                "message": "Texto extraído y guardado con éxito",
-                "file": serializer.data
-            }, status=status.HTTP_200_OK)
-        except Exception as e:
-             return Response(
-                 {"message": f"Error al guardar el archivo de texto extraído: {e}"},
-                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-             )
+            job_ids = [int(job_id) for job_id in request.query_params.get('ids', '').split(',') if job_id.strip()]
+        except ValueError:
+            return Response({"message": "El parámetro 'ids' debe ser una lista de números separados por comas"}, status=status.HTTP_400_BAD_REQUEST)
+        if not job_ids:
+            return Response({"message": "Debes indicar los trabajos con 'ids'"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(job_ids) > MAX_BATCH_FILES:
+            return Response({"message": f"Como máximo se pueden consultar {MAX_BATCH_FILES} trabajos por petición"}, status=status.HTTP_400_BAD_REQUEST)
+
+        jobs = ExtractionJob.objects.filter(id__in=job_ids, file__user=request.user).select_related('file').order_by('id')
+        results = [job_status_data(job, request) for job in jobs]
+        pending = sum(1 for job in results if job["status"] in ExtractionJob.ACTIVE_STATUSES)
+        return Response({
+            "count": len(results),
+            "pending": pending,
+            "jobs": results,
+        }, status=status.HTTP_200_OK)
 
 
 class ReadTextView(APIView):
@@ -136,8 +187,7 @@ class ReadTextView(APIView):
         if not file_obj.text_file:
             return Response({"message": "No hay texto extraído para este archivo"}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            with open(file_obj.text_file.path, 'r', encoding='utf-8') as f:
-                text_content = f.read()
+            text_content = read_text(file_obj.text_file)
             return Response({
                 "text": text_content,
                 "extracted_data": file_obj.extracted_data if file_obj.extracted_data else {}
@@ -145,6 +195,26 @@ class ReadTextView(APIView):
         except Exception as e:
             return Response({"message": f"Error al leer el archivo de texto: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
+class TextContentView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, file_id):
+        file_obj = get_object_or_404(UploadedFile, id=file_id, user=request.user)
+        if not file_obj.text_file:
+            return Response({"message": "No hay texto extraído para este archivo"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return text_file_response(
+                request,
+                file_obj.text_file,
+                page_offsets=file_obj.text_page_offsets,
+                pages_param=request.query_params.get('pages'),
+            )
+        except InvalidPagesError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except OSError as e:
+            return Response({"message": f"Error al leer el archivo de texto: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 class UserExtractedDataView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -187,6 +257,14 @@ class UpdateExtractedDataView(APIView):
     def put(self, request, file_id):
         file = get_object_or_404(UploadedFile, id=file_id, user=request.user)
         extracted_data = request.data.get('extracted_data', {})
+        if extracted_data:
+            try:
+                extracted_data = get_schema().validate(extracted_data)
+            except SchemaValidationError as e:
+                return Response(
+                    {'message': 'Los datos no cumplen la estructura esperada', 'errors': e.errors},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
         file.extracted_data = extracted_data
         file.save()
         return Response({'message': 'Datos actualizados con éxito'}, status=status.HTTP_200_OK)
\ No newline at end of file
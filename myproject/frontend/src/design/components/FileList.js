@@ -573,6 +573,22 @@ function FileList() {
     }
   };
 
+  // Consulta el estado del trabajo de extracción hasta que termina
+  const waitForExtractionJob = async (statusUrl, token) => {
+      while (true) {
+          const response = await fetch(`${backendUrl}${statusUrl}`, {
+              headers: {
+                  'Authorization': `Bearer ${token}`,
+              },
+          });
+          const job = await response.json();
+          if (!response.ok || job.status === 'done' || job.status === 'failed') {
+              return { ok: response.ok && job.status === 'done', job };
+          }
+          await new Promise((resolve) => setTimeout(resolve, 1500));
+      }
+  };
+
   const handleExtractText = async (fileId) => {
       setExtractingId(fileId);
       setMessage('');
@@ -587,14 +603,21 @@ function FileList() {
           });
 
           const result = await response.json();
-          if (response.ok) {
+          if (!response.ok) {
+              setMessage('Error al extraer texto: ' + (result.detail || result.message || JSON.stringify(result)));
+              setMessageType('error');
+              return;
+          }
+
+          const { ok, job } = await waitForExtractionJob(result.status_url, token);
+          if (ok) {
               setMessage('Texto extraído con éxito para el archivo.');
               setMessageType('success');
-              setFiles(files.map((file) =>
-                  file.id === fileId ? result.file : file
+              setFiles((currentFiles) => currentFiles.map((file) =>
+                  file.id === fileId ? job.file : file
               ));
           } else {
-              setMessage('Error al extraer texto: ' + (result.detail || JSON.stringify(result)));
+              setMessage('Error al extraer texto: ' + (job.message || job.detail || JSON.stringify(job)));
               setMessageType('error');
           }
       } catch (error) {
@@ -97,6 +97,18 @@ const ProgressText = styled.p`
   margin-bottom: 2rem;
 `;
 
+// Fechas ya extraídas mientras se generan el resto de secciones (modo por secciones)
+const PartialDates = styled.ul`
+  list-style: none;
+  padding: 0;
+  margin: 0 0 1.5rem;
+  max-height: 12rem;
+  overflow-y: auto;
+  text-align: left;
+  font-size: ${theme.typography.fontSize.sm};
+  color: ${theme.colors.text.secondary};
+`;
+
 const CancelButton = styled.button`
   padding: 0.75rem 1.5rem;
   font-size: ${theme.typography.fontSize.base};
@@ -132,6 +144,42 @@ const ErrorDisplay = styled.div`
   word-break: break-word;
 `;
 
+// --- Lectura de Server-Sent Events ---
+
+const STAGE_MESSAGES = {
+  summary: 'Resumiendo la guía docente...',
+  json: 'Generando los datos estructurados...',
+  gemini: 'Generando respuesta con Gemini API...',
+  chunks: 'Procesando el documento por fragmentos...',
+  sections: 'Extrayendo cada sección de la guía en paralelo...',
+  structured: 'Extrayendo los datos estructurados...',
+  dates: 'Buscando fechas en el texto...',
+  waiting: 'Esperando a otra extracción del mismo documento...',
+};
+
+// Lee la respuesta SSE de /dates/stream/ y llama a onEvent(evento, datos) por cada evento
+const readEventStream = async (response, onEvent) => {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder('utf-8');
+  let buffer = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const blocks = buffer.split('\n\n');
+    buffer = blocks.pop();
+    for (const block of blocks) {
+      let event = 'message';
+      let data = '';
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      }
+      if (data) onEvent(event, JSON.parse(data));
+    }
+  }
+};
+
 // --- Componente React ---
 function LoadingScreenFunctionalStyled() {
   const { fileId } = useParams();
@@ -188,11 +236,13 @@ function LoadingScreenFunctionalStyled() {
         setStatus(model_mode === 'api' ? 'Conectando con Gemini API...' : 'Extrayendo información clave...');
         setProgress(10);
 
-        const fetchDatesResponse = await fetch(`${backendUrl}/api/ai/${fileId}/dates/`, {
+        // El backend envía el progreso y los tokens generados como Server-Sent Events
+        const fetchDatesResponse = await fetch(`${backendUrl}/api/ai/${fileId}/dates/stream/`, {
           method: 'POST',
           headers: {
             'Authorization': `Bearer ${token}`,
             'Content-Type': 'application/json',
+            'Accept': 'text/event-stream',
           },
           body: JSON.stringify({
             model_mode,
@@ -201,15 +251,66 @@ function LoadingScreenFunctionalStyled() {
           }),
         });
 
-        const datesResult = await fetchDatesResponse.json();
-
+        if (fetchDatesResponse.status === 429) {
+          const retryAfter = fetchDatesResponse.headers.get('Retry-After');
+          throw new Error(`El servidor está ocupado con otras extracciones. Inténtalo de nuevo en ${retryAfter || 'unos'} segundos.`);
+        }
+        if (fetchDatesResponse.status === 503) {
+          const retryAfter = fetchDatesResponse.headers.get('Retry-After');
+          throw new Error(`El servicio de IA no está disponible ahora mismo. Inténtalo de nuevo en ${retryAfter || 'unos'} segundos.`);
+        }
         if (!fetchDatesResponse.ok) {
-          const errorMsg = datesResult?.detail || JSON.stringify(datesResult);
-          throw new Error(`Error ${fetchDatesResponse.status} al extraer: ${errorMsg}`);
+          const errorText = await fetchDatesResponse.text();
+          throw new Error(`Error ${fetchDatesResponse.status} al extraer: ${errorText}`);
+        }
+
+        let datesResult = null;
+        let streamError = null;
+        let incomplete = false;
+        let tokenCount = 0;
+        const partialResult = {};
+        await readEventStream(fetchDatesResponse, (event, data) => {
+          if (event === 'stage' && data.stage === 'route') {
+            setStatus(data.mode === 'api' ? 'Modo automático: usando Gemini API...' : 'Modo automático: usando modelos locales...');
+          } else if (event === 'stage' && data.stage === 'prefilter') {
+            setStatus(`Secciones relevantes: ${data.kept_sections} de ${data.sections} (${data.kept_chars} de ${data.original_chars} caracteres)`);
+          } else if (event === 'stage' && data.stage === 'queued') {
+            setStatus(`En cola: ${data.position} extracción(es) por delante...`);
+          } else if (event === 'stage' && data.stage === 'section') {
+            // Cada sección llega en cuanto está lista; se muestra sin esperar al resto
+            if (data.data !== undefined) {
+              partialResult[data.section] = data.data;
+              setDatesDataForNav({ ...partialResult });
+            }
+            setStatus(`Sección "${data.section}" ${data.error ? 'con errores' : 'lista'} (${data.completed} de ${data.total})`);
+            setProgress(10 + Math.floor((35 * data.completed) / data.total));
+          } else if (event === 'stage' && data.stage === 'chunk') {
+            setStatus(`Fragmentos procesados: ${data.completed} de ${data.total}`);
+            setProgress(10 + Math.floor((35 * data.completed) / data.total));
+          } else if (event === 'stage' && data.status === 'started') {
+            setStatus(STAGE_MESSAGES[data.stage] || 'Procesando...');
+          } else if (event === 'token') {
+            // Avance aproximado mientras se generan tokens, sin pasar del 45%
+            tokenCount += 1;
+            setProgress(Math.min(45, 10 + Math.floor(tokenCount / 20)));
+          } else if (event === 'incomplete') {
+            // Parte del documento falló; el resultado no se cachea y se puede volver a extraer
+            incomplete = true;
+          } else if (event === 'result') {
+            datesResult = data;
+          } else if (event === 'error') {
+            streamError = data.error || data.message || JSON.stringify(data);
+          }
+        });
+
+        if (streamError || !datesResult) {
+          throw new Error(`Error al extraer: ${streamError || 'la respuesta terminó sin resultado'}`);
         }
 
         setDatesDataForNav(datesResult);
-        setStatus('Procesando datos extraídos...');
+        setStatus(incomplete
+          ? 'Procesando datos extraídos (incompletos: vuelve a extraerlos para completarlos)...'
+          : 'Procesando datos extraídos...');
         setProgress(50);
 
         // Paso 2: Procesar Datos Extraídos
@@ -273,6 +374,14 @@ function LoadingScreenFunctionalStyled() {
           </>
         )}
 
+        {showSpinner && datesDataForNav?.fechas?.length > 0 && (
+          <PartialDates>
+            {datesDataForNav.fechas.map((fecha, index) => (
+              <li key={index}>{`${fecha.fecha} · ${fecha.titulo}`}</li>
+            ))}
+          </PartialDates>
+        )}
+
         {error && (
           <ErrorDisplay>
             <strong>Algo ha fallado. Espere un momento, si no vuelva a archivos y repita el proceso</strong>
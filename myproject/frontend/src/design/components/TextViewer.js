@@ -280,6 +280,7 @@ function TextViewer() {
   const [summaryModel, setSummaryModel] = useState('gemma2:9b');
   const [jsonModel, setJsonModel] = useState('gemma2:9b');
   const [modelMode, setModelMode] = useState('local'); // 'local' o 'api'
+  const [localMode, setLocalMode] = useState('local'); // 'local', 'local_structured', 'local_divided', 'local_chunked', 'rules' o 'auto'
   const backendUrl = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8000';
 
   // Efecto para cargar datos al montar
@@ -339,7 +340,7 @@ function TextViewer() {
   // Manejar extracción de fechas
   const handleExtractDates = async () => {
     const payload = {
-      model_mode: modelMode,
+      model_mode: modelMode === 'local' ? localMode : modelMode,
       summary_model: modelMode === 'api' ? 'gemini-2.5-flash' : summaryModel,
       json_model: modelMode === 'api' ? 'gemini-2.5-flash' : jsonModel,
     };
@@ -397,6 +398,22 @@ function TextViewer() {
             </ToggleButton>
             {modelMode === 'local' ? (
               <>
+                <ModelSelector>
+                  <label htmlFor="local-mode-select">Modo de extracción:</label>
+                  <select
+                    id="local-mode-select"
+                    value={localMode}
+                    onChange={(e) => setLocalMode(e.target.value)}
+                  >
+                    <option value="local">Resumen + JSON</option>
+                    <option value="local_structured">Una pasada (JSON con esquema)</option>
+                    <option value="local_divided">Por secciones en paralelo</option>
+                    <option value="local_chunked">Documento largo (por fragmentos en paralelo)</option>
+                    <option value="rules">Solo fechas (sin IA, inmediato)</option>
+                    <option value="auto">Automático (local o API, el más rápido ahora)</option>
+                  </select>
+                </ModelSelector>
+                {localMode === 'local' && (
                 <ModelSelector>
                   <label htmlFor="summary-model-select">Modelo para resumen:</label>
                   <select
@@ -408,6 +425,8 @@ function TextViewer() {
                     <option value="llama3.1:8b">Llama3.1 8B</option>
                   </select>
                 </ModelSelector>
+                )}
+                {localMode !== 'rules' && (
                 <ModelSelector>
                   <label htmlFor="json-model-select">Modelo para extraer JSON:</label>
                   <select
@@ -419,6 +438,7 @@ function TextViewer() {
                     <option value="llama3.1:8b">Llama3.1 8B</option>
                   </select>
                 </ModelSelector>
+                )}
               </>
             ) : (
               <ModelSelector>
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myapp'
+
+    def ready(self):
+        # Los esquemas de extracción se leen y compilan una sola vez por proceso
+        from .schema import load_schemas
+        load_schemas()
@@ -0,0 +1,143 @@
+import re
+from .schema import get_schema
+
+# División de guías docentes largas en fragmentos que caben en el contexto del
+# modelo y fusión de los JSON parciales que se extraen de cada uno.
+
+# Un título de sección: línea corta en mayúsculas o numerada ("3. EVALUACIÓN", "2.1 Temario")
+SECTION_RE = re.compile(r'\n(?=(?:\d+(?:\.\d+)*\.?\s+\S|[A-ZÁÉÍÓÚÑ][A-ZÁÉÍÓÚÑ0-9 ,;:()-]{3,80}\n))')
+PLACEHOLDER_RE = re.compile(r'^\(.*\)$', re.DOTALL)
+
+# Campos que identifican un elemento repetido en varios fragmentos. Las listas de
+# la plantilla que no están aquí se identifican por todos los campos de su elemento.
+ITEM_KEY_FIELDS = {
+    "fechas": ("titulo", "fecha"),
+    "horarios": ("grupo", "tipo", "dia", "hora", "aula"),
+    "profesores": ("nombre",),
+}
+
+
+def split_pages(text, page_offsets):
+    """Separa el texto en páginas usando los offsets en bytes guardados al extraerlo."""
+    if not page_offsets:
+        return [text]
+    data = text.encode('utf-8')
+    bounds = list(page_offsets) + [len(data)]
+    pages = []
+    for start, end in zip(bounds, bounds[1:]):
+        page = data[start:end].decode('utf-8', errors='ignore')
+        if page.strip():
+            pages.append(page)
+    return pages
+
+
+def _split_oversized(block, max_chars):
+    """Parte un bloque demasiado grande por secciones, párrafos, líneas y, si no, por tamaño."""
+    if len(block) <= max_chars:
+        return [block]
+    for pattern in (SECTION_RE, re.compile(r'\n\s*\n'), re.compile(r'\n')):
+        pieces = [piece for piece in pattern.split(block) if piece.strip()]
+        if len(pieces) > 1:
+            return _pack(pieces, max_chars)
+    return [block[i:i + max_chars] for i in range(0, len(block), max_chars)]
+
+
+def _pack(blocks, max_chars):
+    """Agrupa bloques consecutivos en fragmentos de como mucho max_chars caracteres."""
+    chunks = []
+    current = ""
+    for block in blocks:
+        for piece in _split_oversized(block, max_chars):
+            if current and len(current) + len(piece) + 1 > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n{piece}" if current else piece
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+
+def split_into_chunks(text, max_chars, page_offsets=None):
+    """
+    Divide el texto en fragmentos de como mucho max_chars caracteres, cortando
+    preferentemente entre páginas y, dentro de una página, entre secciones.
+    """
+    if not text or not text.strip():
+        return []
+    return _pack(split_pages(text, page_offsets), max_chars)
+
+
+def is_empty_value(value):
+    if value is None:
+        return True
+    if isinstance(value, str):
+        value = value.strip()
+        # Los modelos a veces dejan el texto de ejemplo de la estructura, "(nombre...)"
+        return not value or bool(PLACEHOLDER_RE.match(value))
+    return False
+
+
+def _normalize(value):
+    return re.sub(r'\s+', ' ', str(value)).strip().lower() if not is_empty_value(value) else ""
+
+
+def _merge_item(target, item):
+    for field, value in item.items():
+        if is_empty_value(target.get(field)) and not is_empty_value(value):
+            target[field] = value
+
+
+def _list_key_fields(section, template):
+    item = template[0] if template and isinstance(template[0], dict) else {}
+    key_fields = tuple(field for field in ITEM_KEY_FIELDS.get(section, ()) if field in item)
+    return key_fields or tuple(item)
+
+
+def merge_partial_results(partials, template=None):
+    """
+    Fusiona los JSON extraídos de cada fragmento (en orden del documento) en uno
+    con la estructura de la plantilla del esquema (por defecto la registrada): de
+    cada objeto (la asignatura) se queda el primer valor no vacío de cada campo y
+    las listas se concatenan sin duplicados.
+    """
+    template = get_schema().template if template is None else template
+    object_sections = [section for section, value in template.items() if isinstance(value, dict)]
+    list_sections = {
+        section: _list_key_fields(section, value) for section, value in template.items() if isinstance(value, list)
+    }
+    merged = {section: {field: "" for field in template[section]} for section in object_sections}
+    for section in list_sections:
+        merged[section] = []
+    seen = {section: {} for section in list_sections}
+
+    for partial in partials:
+        if not isinstance(partial, dict):
+            continue
+        for section in object_sections:
+            if isinstance(partial.get(section), dict):
+                _merge_item(merged[section], partial[section])
+
+        for section, key_fields in list_sections.items():
+            items = partial.get(section)
+            if not isinstance(items, list):
+                continue
+            for item in items:
+                if not isinstance(item, dict) or all(is_empty_value(v) for v in item.values()):
+                    continue
+                key = tuple(_normalize(item.get(field)) for field in key_fields)
+                if not any(key):
+                    merged[section].append(dict(item)) # Sin datos con los que identificarlo
+                    continue
+                if key in seen[section]:
+                    # Mismo elemento visto en otro fragmento: completar los campos vacíos
+                    _merge_item(seen[section][key], item)
+                    continue
+                copy = dict(item)
+                seen[section][key] = copy
+                merged[section].append(copy)
+
+    for section in object_sections:
+        for field, value in merged[section].items():
+            if is_empty_value(value):
+                merged[section][field] = ""
+    return merged
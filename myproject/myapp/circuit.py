@@ -0,0 +1,163 @@
+import math
+import threading
+import time
+from collections import deque
+from django.conf import settings
+
+# Circuit breakers delante de los backends de IA (Ollama y Gemini). Tras varios
+# fallos seguidos, o si la latencia de las últimas llamadas se dispara, el
+# circuito se abre y las extracciones se rechazan al momento con un 503 en lugar
+# de ocupar un worker esperando a que falle la conexión. Pasado un tiempo deja
+# pasar una sola llamada de prueba (semiabierto): si va bien se cierra y si no
+# vuelve a abrirse. El estado es por proceso.
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name, retry_after):
+        super().__init__(f"El servicio de IA ({name}) no está disponible en este momento")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, reset_seconds=30.0, latency_seconds=None,
+                 latency_percentile=0.9, window=20):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        # Se abre también si el percentil de la duración de las últimas `window`
+        # llamadas supera latency_seconds (None o 0 lo desactiva)
+        self.latency_seconds = latency_seconds
+        self.latency_percentile = latency_percentile
+        self.window = window
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.reason = None
+        self._durations = deque(maxlen=window)
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _retry_after(self, now):
+        return max(1, math.ceil(self.opened_at + self.reset_seconds - now))
+
+    def before_call(self):
+        """Lanza CircuitOpenError si la llamada no debe hacerse; si no, la registra."""
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return
+            now = time.monotonic()
+            if self.state == STATE_OPEN and now >= self.opened_at + self.reset_seconds:
+                self.state = STATE_HALF_OPEN
+            if self.state == STATE_HALF_OPEN and not self._probe_in_flight:
+                # Solo una llamada de prueba a la vez
+                self._probe_in_flight = True
+                return
+            raise CircuitOpenError(self.name, self._retry_after(now) if self.state == STATE_OPEN else 1)
+
+    def check(self):
+        """Como before_call, pero sin ocupar la llamada de prueba (para rechazar antes de empezar)."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == STATE_OPEN and now < self.opened_at + self.reset_seconds:
+                raise CircuitOpenError(self.name, self._retry_after(now))
+
+    def record_success(self, duration=None):
+        with self._lock:
+            if self.state == STATE_OPEN:
+                return # Llamada empezada antes de abrirse; no demuestra que se haya recuperado
+            if self.state == STATE_HALF_OPEN:
+                self._close()
+            self.failures = 0
+            if duration is not None:
+                self._durations.append(duration)
+                if self._latency_exceeded():
+                    self._open("latencia")
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == STATE_HALF_OPEN or self.failures >= self.failure_threshold:
+                self._open("errores")
+
+    def release(self):
+        """La llamada terminó sin resultado que valorar (el cliente dejó de leer)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def _latency_exceeded(self):
+        if not self.latency_seconds or len(self._durations) < self.window:
+            return False
+        durations = sorted(self._durations)
+        index = min(len(durations) - 1, math.ceil(self.latency_percentile * len(durations)) - 1)
+        return durations[index] > self.latency_seconds
+
+    def _open(self, reason):
+        self.state = STATE_OPEN
+        self.opened_at = time.monotonic()
+        self.reason = reason
+        self._probe_in_flight = False
+        self._durations.clear()
+
+    def _close(self):
+        self.state = STATE_CLOSED
+        self.reason = None
+        self._probe_in_flight = False
+
+    def status(self):
+        with self._lock:
+            data = {"state": self.state, "failures": self.failures, "reason": self.reason}
+            if self.state == STATE_OPEN:
+                data["retry_after"] = self._retry_after(time.monotonic())
+            return data
+
+
+def guarded(breaker, tokens, is_failure=lambda error: True):
+    """
+    Recorre un generador de tokens a través del circuit breaker: falla al
+    momento si está abierto y registra el resultado y la duración de la llamada.
+    `is_failure(error)` decide qué excepciones cuentan como fallo del backend.
+    """
+    breaker.before_call()
+    start = time.monotonic()
+    try:
+        yield from tokens
+    except Exception as e:
+        if is_failure(e):
+            breaker.record_failure()
+        else:
+            breaker.release()
+        raise
+    except GeneratorExit:
+        breaker.release()
+        raise
+    breaker.record_success(time.monotonic() - start)
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """Circuit breaker compartido por el proceso para el backend `name`."""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(
+                name,
+                failure_threshold=settings.LLM_BREAKER_FAILURE_THRESHOLD,
+                reset_seconds=settings.LLM_BREAKER_RESET_SECONDS,
+                latency_seconds=settings.LLM_BREAKER_LATENCY_SECONDS,
+                latency_percentile=settings.LLM_BREAKER_LATENCY_PERCENTILE,
+                window=settings.LLM_BREAKER_WINDOW,
+            )
+        return _breakers[name]
+
+
+def breakers_status():
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {name: breaker.status() for name, breaker in breakers.items()}
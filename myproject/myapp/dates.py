@@ -0,0 +1,216 @@
+import re
+from collections import Counter
+from datetime import date
+
+# Extracción de fechas por reglas, sin LLM: busca expresiones de fecha en español
+# ("18 de marzo de 2025", "18/03/25", "del 3 al 7 de marzo"), las normaliza a
+# YYYY-MM-DD y toma como título el texto que las acompaña. Tarda milisegundos y
+# sirve por sí sola o para rellenar las fechas antes de llamar al LLM.
+
+# Versión de las reglas; forma parte de la variante de la caché de resultados
+RULES_VERSION = 2
+
+MONTHS = {
+    "enero": 1, "ene": 1, "febrero": 2, "feb": 2, "marzo": 3, "mar": 3, "abril": 4, "abr": 4,
+    "mayo": 5, "may": 5, "junio": 6, "jun": 6, "julio": 7, "jul": 7, "agosto": 8, "ago": 8,
+    "septiembre": 9, "setiembre": 9, "sept": 9, "sep": 9, "octubre": 10, "oct": 10,
+    "noviembre": 11, "nov": 11, "diciembre": 12, "dic": 12,
+}
+MONTH = r"(?P<{name}>" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")\b\.?"
+YEAR = r"(?:,?\s+(?:(?:de|del)\s+)?(?P<{name}>(?:19|20)\d{{2}})(?!\d))?"
+# "mar" también es "martes" y "mar" (el sustantivo): solo es marzo con el año ("18 mar 2025")
+AMBIGUOUS_MONTHS = {"mar"}
+
+# "del 3 al 7 de marzo de 2025", "del 28 de febrero al 4 de marzo", "3-7 de marzo"
+RANGE_RE = re.compile(
+    r"(?:\b(?:del?|desde el)\s+)?\b(?P<day1>\d{1,2})(?:\s+de\s+" + MONTH.format(name="month1") + r")?"
+    r"\s*(?:\bal?\b|hasta el|-|–)\s*(?P<day2>\d{1,2})\s+de\s+" + MONTH.format(name="month2")
+    + YEAR.format(name="year"),
+    re.IGNORECASE,
+)
+# "18 de marzo de 2025", "18 de marzo", "30 abril"
+TEXT_DATE_RE = re.compile(
+    r"\b(?P<day>\d{1,2})\s+(?:de\s+)?" + MONTH.format(name="month") + YEAR.format(name="year"),
+    re.IGNORECASE,
+)
+# "18/03/2025", "18-03-25"
+NUMERIC_DATE_RE = re.compile(r"(?<![\d/.-])(?P<day>\d{1,2})(?P<sep>[/-])(?P<month>\d{1,2})(?P=sep)(?P<year>\d{4}|\d{2})(?![\d/.-])")
+ISO_DATE_RE = re.compile(r"(?<![\d-])(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})(?![\d-])")
+# "curso 2024-2025", "2024/25"
+ACADEMIC_YEAR_RE = re.compile(r"\b(20\d{2})\s*[-/]\s*(20\d{2}|\d{2})\b")
+EXPLICIT_YEAR_RE = re.compile(r"\b(20\d{2})\b")
+
+WEEKDAY_RE = re.compile(r"\b(lunes|martes|mi[eé]rcoles|jueves|viernes|s[aá]bado|domingo)\b,?", re.IGNORECASE)
+# Palabras que rodean a una fecha pero no la describen ("los días", "el", "y"...)
+FILLER_WORDS = {
+    "y", "o", "e", "el", "la", "los", "las", "del", "de", "a", "al", "en", "hasta", "desde", "partir",
+    "día", "dia", "días", "dias", "semana", "fecha", "fechas", "para", "con", "es", "son", "será", "serán",
+}
+KEYWORD_TITLES = [
+    (re.compile(r"parcial", re.IGNORECASE), "Examen parcial"),
+    (re.compile(r"convocatoria|examen final", re.IGNORECASE), "Examen final"),
+    (re.compile(r"entrega", re.IGNORECASE), "Entrega"),
+    (re.compile(r"pr[aá]cticas?", re.IGNORECASE), "Prácticas"),
+    (re.compile(r"examen", re.IGNORECASE), "Examen"),
+]
+MAX_TITLE_LENGTH = 100 # Fechas.titulo
+
+
+def infer_year_context(text, default_year=None):
+    """
+    Devuelve una función mes -> año para las fechas que no lo indican: con un
+    curso académico (2024-2025) de septiembre a diciembre es el primer año y el
+    resto el segundo; si no, el año que más aparece en las fechas completas y,
+    en su defecto, en el texto. Sin ninguno (ni default_year) devuelve None y
+    esas fechas se descartan.
+    """
+    for match in ACADEMIC_YEAR_RE.finditer(text):
+        first = int(match.group(1))
+        second = int(match.group(2))
+        if second < 100:
+            second += first // 100 * 100
+        if second == first + 1:
+            return lambda month: first if month >= 9 else second
+    years = Counter(int(m.group("year")) for m in TEXT_DATE_RE.finditer(text) if m.group("year"))
+    years.update(_full_year(m.group("year")) for m in NUMERIC_DATE_RE.finditer(text))
+    years.update(int(m.group("year")) for m in ISO_DATE_RE.finditer(text))
+    if not years:
+        years = Counter(int(year) for year in EXPLICIT_YEAR_RE.findall(text))
+    year = years.most_common(1)[0][0] if years else default_year
+    return lambda month: year
+
+
+def _month(match, name):
+    """Número del mes del grupo `name`, o None si es una abreviatura ambigua sin año."""
+    month = match.group(name).lower()
+    if month in AMBIGUOUS_MONTHS and not match.group("year"):
+        return None
+    return MONTHS[month]
+
+
+def _to_iso(year, month, day):
+    if year is None or month is None:
+        return None
+    try:
+        return date(year, month, day).isoformat()
+    except ValueError:
+        return None
+
+
+def _full_year(year):
+    year = int(year)
+    return year + 2000 if year < 100 else year
+
+
+def _filler_key(word):
+    # Sin los restos de acentos de algunos PDF ("d´ıas")
+    return re.sub(r"[´`¨]", "", word).replace("ı", "i").lower()
+
+
+def _clean_title(text):
+    text = WEEKDAY_RE.sub(" ", text)
+    text = re.sub(r"[•·▪\-–—*]+", " ", text)
+    words = re.sub(r"\s+", " ", text).strip(" \t:;,.(").split(" ")
+    while words and _filler_key(words[0].strip(":;,.()")) in FILLER_WORDS:
+        words.pop(0)
+    while words and _filler_key(words[-1].strip(":;,.()")) in FILLER_WORDS:
+        words.pop()
+    text = " ".join(words).strip(" \t:;,.(")
+    if text.count("(") > text.count(")"):
+        # Paréntesis abierto antes de la fecha: "Exposición (30 abril"
+        text = text.rsplit("(", 1)[0].strip()
+    return text if sum(c.isalpha() for c in text) >= 4 else ""
+
+
+def _title_for(before, after, context, previous_line):
+    """
+    Título de una fecha: la última frase o cláusula que la precede en su línea,
+    el texto que la sigue, una palabra clave cercana ("parcial", "entrega"...)
+    o la línea anterior.
+    """
+    clause = re.split(r"[.,;]\s", before)[-1]
+    title = _clean_title(clause) or _clean_title(re.split(r"[.,;]\s", after, maxsplit=1)[0])
+    if not title:
+        title = next((name for pattern, name in KEYWORD_TITLES if pattern.search(context)), "")
+    if not title:
+        title = _clean_title(previous_line) or "Fecha"
+    return title[:MAX_TITLE_LENGTH]
+
+
+def _find_matches(text, year_for):
+    """Devuelve (inicio, fin, [(fecha ISO, sufijo del título)]) sin solapamientos."""
+    matches = []
+    taken = []
+
+    def add(match, dates):
+        if any(match.start() < end and start < match.end() for start, end in taken):
+            return
+        dates = [(iso, suffix) for iso, suffix in dates if iso]
+        if dates:
+            taken.append((match.start(), match.end()))
+            matches.append((match.start(), match.end(), dates))
+
+    for match in RANGE_RE.finditer(text):
+        month2 = _month(match, "month2")
+        month1 = _month(match, "month1") if match.group("month1") else month2
+        if month1 is None or month2 is None:
+            continue
+        year2 = int(match.group("year")) if match.group("year") else year_for(month2)
+        year1 = year2 - 1 if year2 is not None and month1 > month2 else year2
+        start_day, end_day = int(match.group("day1")), int(match.group("day2"))
+        if month1 == month2 and start_day >= end_day:
+            continue
+        add(match, [(_to_iso(year1, month1, start_day), " (inicio)"), (_to_iso(year2, month2, end_day), " (fin)")])
+    for match in TEXT_DATE_RE.finditer(text):
+        month = _month(match, "month")
+        if month is None:
+            continue
+        year = int(match.group("year")) if match.group("year") else year_for(month)
+        add(match, [(_to_iso(year, month, int(match.group("day"))), "")])
+    for match in NUMERIC_DATE_RE.finditer(text):
+        add(match, [(_to_iso(_full_year(match.group("year")), int(match.group("month")), int(match.group("day"))), "")])
+    for match in ISO_DATE_RE.finditer(text):
+        add(match, [(_to_iso(int(match.group("year")), int(match.group("month")), int(match.group("day"))), "")])
+    matches.sort()
+    return matches
+
+
+def extract_dates(text, default_year=None):
+    """
+    Devuelve las fechas del texto como una lista de {"titulo", "fecha"} con la
+    estructura de JSON_utilizar.json, en orden de aparición y sin duplicados.
+    """
+    if not text:
+        return []
+    year_for = infer_year_context(text, default_year)
+    fechas = []
+    seen = set()
+    matches = _find_matches(text, year_for)
+    for index, (start, end, dates) in enumerate(matches):
+        line_start = text.rfind("\n", 0, start) + 1
+        line_end = text.find("\n", end)
+        line_end = len(text) if line_end == -1 else line_end
+        # Los límites del título son la línea y las fechas vecinas de la misma línea
+        before_start = max(line_start, matches[index - 1][1] if index else 0)
+        after_end = min(line_end, matches[index + 1][0] if index + 1 < len(matches) else line_end)
+        previous_line = text[text.rfind("\n", 0, max(line_start - 1, 0)) + 1:max(line_start - 1, 0)]
+        title = _title_for(text[before_start:start], text[end:after_end], text[max(0, start - 200):start], previous_line)
+        for iso, suffix in dates:
+            item = {"titulo": (title + suffix)[:MAX_TITLE_LENGTH], "fecha": iso}
+            if (item["titulo"].lower(), iso) not in seen:
+                seen.add((item["titulo"].lower(), iso))
+                fechas.append(item)
+    return fechas
+
+
+def merge_dates(rule_dates, llm_dates):
+    """
+    Combina las fechas por reglas con las del LLM: se quedan todas las de las
+    reglas y, de las del LLM, las de días que las reglas no han encontrado.
+    """
+    found = {item["fecha"] for item in rule_dates}
+    merged = list(rule_dates)
+    for item in llm_dates or []:
+        if isinstance(item, dict) and item.get("fecha") not in found:
+            merged.append(item)
+    return merged
@@ -0,0 +1,263 @@
+import copy
+import json
+
+# Parser JSON incremental y tolerante para la salida de los LLM. Recorre el texto
+# una sola vez, carácter a carácter y según llegan los tokens, y admite lo que los
+# modelos suelen producir: bloques ```json, texto antes o después del JSON, comas
+# finales, claves sin comillas y cadenas con comillas simples. A diferencia de
+# reemplazar todas las ' por ", no estropea los apóstrofos dentro del texto.
+
+WHITESPACE = " \t\r\n"
+DELIMITERS = ",:}]"
+ESCAPES = {'"': '"', "'": "'", '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+
+
+class JSONParseError(ValueError):
+    def __init__(self, message, position):
+        super().__init__(f"{message} (posición {position})")
+        self.position = position
+
+
+class _Frame:
+    __slots__ = ("value", "key", "expect")
+
+    def __init__(self, value, expect):
+        self.value = value
+        self.key = None
+        # Qué se espera a continuación: 'key', 'colon', 'value' o 'comma'
+        self.expect = expect
+
+
+class IncrementalJSONParser:
+    """
+    Uso: feed() con cada fragmento de texto, snapshot() para obtener lo que se
+    lleva interpretado (con los objetos y listas abiertos cerrados) y finish()
+    al terminar. `done` pasa a True al cerrarse el objeto o lista raíz; lo que
+    venga después se ignora.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.done = False
+        self._stack = []
+        self._position = 0
+        # Token en curso: cadena o literal (número, true, clave sin comillas...)
+        self._string = None
+        self._quote = None
+        self._is_key = False
+        self._escape = False
+        self._unicode = None
+        self._pending_quote = None
+        self._literal = None
+
+    # --- Entrada ---
+
+    def feed(self, text):
+        for char in text:
+            if self.done:
+                break
+            self._consume(char)
+            self._position += 1
+        return self
+
+    def finish(self, partial=False):
+        """
+        Devuelve el valor interpretado. Si el JSON está incompleto lanza
+        JSONParseError, salvo con partial=True, que devuelve snapshot().
+        """
+        if self._pending_quote is not None:
+            self._close_string()
+        if self._literal is not None and self._stack:
+            try:
+                self._close_literal()
+            except JSONParseError:
+                if not partial:
+                    raise
+                self._literal = None # Número o literal cortado: se descarta
+        if self.done:
+            return self.root
+        if partial and self.root is not None:
+            return self.snapshot()
+        if self.root is None:
+            raise JSONParseError("No se encontró ningún objeto JSON", self._position)
+        raise JSONParseError("JSON incompleto", self._position)
+
+    def snapshot(self):
+        """Copia del valor parcial, con la cadena en curso si es un valor."""
+        if self.root is None:
+            return None
+        memo = {}
+        root = copy.deepcopy(self.root, memo)
+        if self._string is not None and not self._is_key and self._stack:
+            top = memo[id(self._stack[-1].value)]
+            partial_string = "".join(self._string)
+            if isinstance(top, list):
+                top.append(partial_string)
+            elif self._stack[-1].key is not None:
+                top[self._stack[-1].key] = partial_string
+        return root
+
+    # --- Máquina de estados ---
+
+    def _error(self, message):
+        raise JSONParseError(message, self._position)
+
+    def _consume(self, char):
+        if self._pending_quote is not None:
+            if self._resolve_single_quote(char):
+                return
+        if self._string is not None:
+            self._consume_string(char)
+            return
+        if self._literal is not None:
+            if char not in WHITESPACE and char not in DELIMITERS:
+                self._literal.append(char)
+                return
+            self._close_literal()
+
+        if not self._stack:
+            # Antes de la raíz se ignora el texto (bloques ```json, explicaciones...)
+            if char in "{[":
+                self._open(char)
+            return
+        if char in WHITESPACE:
+            return
+
+        frame = self._stack[-1]
+        if char in "{[":
+            if frame.expect != "value":
+                self._error(f"'{char}' inesperado")
+            self._open(char)
+        elif char in "}]":
+            self._close(char)
+        elif char == ",":
+            if frame.expect != "comma":
+                self._error("',' inesperada")
+            frame.expect = "key" if isinstance(frame.value, dict) else "value"
+        elif char == ":":
+            if frame.expect != "colon":
+                self._error("':' inesperado")
+            frame.expect = "value"
+        elif char in "\"'":
+            if frame.expect not in ("key", "value"):
+                self._error("Cadena inesperada")
+            self._string = []
+            self._quote = char
+            self._is_key = frame.expect == "key"
+        else:
+            if frame.expect not in ("key", "value"):
+                self._error(f"'{char}' inesperado")
+            self._literal = [char]
+
+    def _consume_string(self, char):
+        if self._unicode is not None:
+            self._unicode.append(char)
+            if len(self._unicode) == 4:
+                try:
+                    self._string.append(chr(int("".join(self._unicode), 16)))
+                except ValueError:
+                    self._error("Secuencia \\u no válida")
+                self._unicode = None
+        elif self._escape:
+            self._escape = False
+            if char == 'u':
+                self._unicode = []
+            else:
+                self._string.append(ESCAPES.get(char, char))
+        elif char == '\\':
+            self._escape = True
+        elif char == self._quote:
+            if self._quote == "'":
+                # Puede ser un apóstrofo ("l'Art"): se decide con el siguiente carácter
+                self._pending_quote = []
+            else:
+                self._close_string()
+        else:
+            self._string.append(char)
+
+    def _resolve_single_quote(self, char):
+        """Devuelve True si el carácter ya queda consumido."""
+        if char in WHITESPACE:
+            self._pending_quote.append(char)
+            return True
+        pending = self._pending_quote
+        self._pending_quote = None
+        if char in DELIMITERS:
+            self._close_string()
+            return False
+        # Era un apóstrofo dentro del texto
+        self._string.append("'")
+        self._string.extend(pending)
+        return False
+
+    def _close_string(self):
+        value = "".join(self._string)
+        if any('\ud800' <= c <= '\udfff' for c in value):
+            value = value.encode('utf-16', 'surrogatepass').decode('utf-16', 'replace')
+        self._string = None
+        self._pending_quote = None
+        if self._is_key:
+            self._set_key(value)
+        else:
+            self._add_value(value)
+
+    def _close_literal(self):
+        text = "".join(self._literal)
+        self._literal = None
+        frame = self._stack[-1]
+        if frame.expect == "key":
+            self._set_key(text)
+            return
+        if text in LITERALS:
+            self._add_value(LITERALS[text])
+            return
+        try:
+            value = json.loads(text)
+        except ValueError:
+            self._error(f"Valor no válido: {text}")
+        if not isinstance(value, (int, float)):
+            self._error(f"Valor no válido: {text}")
+        self._add_value(value)
+
+    def _set_key(self, key):
+        frame = self._stack[-1]
+        frame.key = key
+        frame.expect = "colon"
+
+    def _add_value(self, value):
+        frame = self._stack[-1]
+        if isinstance(frame.value, list):
+            frame.value.append(value)
+        else:
+            frame.value[frame.key] = value
+            frame.key = None
+        frame.expect = "comma"
+
+    def _open(self, char):
+        container = {} if char == "{" else []
+        if self._stack:
+            self._add_value(container)
+        else:
+            self.root = container
+        self._stack.append(_Frame(container, "key" if char == "{" else "value"))
+
+    def _close(self, char):
+        frame = self._stack[-1]
+        if isinstance(frame.value, dict) != (char == "}"):
+            self._error(f"'{char}' no cierra la estructura abierta")
+        # Se admiten comas finales ({"a": 1,}), pero no claves sin valor
+        if frame.expect in ("colon", "value") and isinstance(frame.value, dict):
+            self._error("Clave sin valor")
+        self._stack.pop()
+        if not self._stack:
+            self.done = True
+
+
+def parse_json(text, partial=False):
+    """
+    Interpreta la salida de un LLM de una pasada. Con partial=True una salida
+    cortada (por ejemplo, al alcanzar el límite de tokens) devuelve lo que se
+    haya podido interpretar en lugar de fallar.
+    """
+    return IncrementalJSONParser().feed(text).finish(partial=partial)
@@ -0,0 +1,521 @@
+import json
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from .llm_cache import LLMResponseCache
+
+logger = logging.getLogger(__name__)
+
+# Códigos HTTP que indican un fallo transitorio de Ollama (cargando modelo, saturado...)
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class OllamaError(Exception):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        # Código HTTP de la respuesta de error, si la hubo (None si falló la conexión)
+        self.status_code = status_code
+
+    @property
+    def is_backend_failure(self):
+        """False para errores de la petición (modelo inexistente...), que no indican que Ollama falle."""
+        return self.status_code is None or self.status_code in RETRYABLE_STATUS
+
+
+@dataclass
+class LLMCallMetrics:
+    """Datos de una llamada a Ollama que reciben los hooks de métricas."""
+    endpoint: str
+    model: str
+    attempts: int
+    duration: float
+    ok: bool
+    status_code: Optional[int] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    error: Optional[str] = None
+    cached: bool = False
+    backend: Optional[str] = None
+
+
+class OllamaBackend:
+    """Estado de un servidor de Ollama visto desde este proceso."""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.in_flight = 0
+        # Media móvil exponencial de la duración de las llamadas (segundos)
+        self.latency = None
+        self.failures = 0 # Fallos consecutivos
+        self.ejected_until = 0.0
+        self.last_model = None
+
+    def available(self, now):
+        return now >= self.ejected_until
+
+
+class BackendPool:
+    """
+    Reparte las llamadas entre varios servidores de Ollama: cada una va al
+    servidor sano con menor espera estimada (llamadas en curso por latencia
+    observada) y, a igualdad, al que usó el mismo modelo la última vez. Tras
+    `failure_threshold` fallos seguidos un servidor se expulsa `eject_seconds`;
+    vuelve antes si responde a las comprobaciones de salud.
+    """
+
+    def __init__(self, urls, failure_threshold=3, eject_seconds=30.0, latency_alpha=0.3):
+        if isinstance(urls, str):
+            urls = [urls]
+        if not urls:
+            raise ValueError("Se necesita al menos un servidor de Ollama")
+        self.backends = [OllamaBackend(url) for url in urls]
+        self.failure_threshold = failure_threshold
+        self.eject_seconds = eject_seconds
+        self.latency_alpha = latency_alpha
+        self._lock = threading.Lock()
+        self._health_thread = None
+
+    def _score(self, backend, model, default_latency):
+        latency = backend.latency if backend.latency is not None else default_latency
+        return ((backend.in_flight + 1) * latency, backend.last_model != model)
+
+    def acquire(self, model=None, exclude=()):
+        """Elige un servidor y cuenta la llamada como en curso hasta release()."""
+        with self._lock:
+            now = time.monotonic()
+            available = [backend for backend in self.backends if backend.available(now)]
+            # Al reintentar se prueba antes otro servidor distinto
+            candidates = [backend for backend in available if backend not in exclude] or available
+            if not candidates:
+                # Todos expulsados: se prueba el primero que vuelve
+                candidates = [min(self.backends, key=lambda backend: backend.ejected_until)]
+            known = [backend.latency for backend in self.backends if backend.latency is not None]
+            default_latency = sum(known) / len(known) if known else 1.0
+            backend = min(candidates, key=lambda backend: self._score(backend, model, default_latency))
+            backend.in_flight += 1
+            return backend
+
+    def release(self, backend, ok, duration=None, model=None):
+        with self._lock:
+            backend.in_flight -= 1
+            if ok:
+                self._mark_up(backend)
+                if duration is not None:
+                    backend.latency = duration if backend.latency is None else (
+                        self.latency_alpha * duration + (1 - self.latency_alpha) * backend.latency
+                    )
+                if model:
+                    backend.last_model = model
+            else:
+                self._mark_down(backend)
+
+    def _mark_up(self, backend):
+        backend.failures = 0
+        backend.ejected_until = 0.0
+
+    def _mark_down(self, backend):
+        backend.failures += 1
+        if backend.failures >= self.failure_threshold:
+            if backend.available(time.monotonic()):
+                logger.warning("Servidor de Ollama %s expulsado durante %ss", backend.url, self.eject_seconds)
+            backend.ejected_until = time.monotonic() + self.eject_seconds
+
+    def check_health(self, session, timeout):
+        """Consulta /api/version de cada servidor y actualiza su estado."""
+        for backend in self.backends:
+            try:
+                session.get(f"{backend.url}/api/version", timeout=timeout).raise_for_status()
+                ok = True
+            except requests.RequestException:
+                ok = False
+            with self._lock:
+                self._mark_up(backend) if ok else self._mark_down(backend)
+
+    def start_health_checks(self, session, interval, timeout):
+        """Lanza en segundo plano las comprobaciones de salud periódicas."""
+        if self._health_thread is not None or interval <= 0:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.check_health(session, timeout)
+                except Exception:
+                    logger.exception("Error al comprobar los servidores de Ollama")
+
+        self._health_thread = threading.Thread(target=run, name="ollama-health", daemon=True)
+        self._health_thread.start()
+
+    def status(self):
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                "url": backend.url,
+                "healthy": backend.available(now),
+                "in_flight": backend.in_flight,
+                "latency": backend.latency,
+                "failures": backend.failures,
+                "last_model": backend.last_model,
+            } for backend in self.backends]
+
+
+class OllamaClient:
+    """
+    Cliente de la API de Ollama con una sesión HTTP compartida (conexiones
+    keep-alive reutilizadas), timeouts de conexión y lectura y reintentos
+    acotados con backoff exponencial y jitter. `base_url` puede ser una lista
+    de servidores: las llamadas se reparten con un BackendPool y los
+    reintentos van, si es posible, a otro servidor.
+    """
+
+    def __init__(self, base_url, connect_timeout=5.0, read_timeout=300.0, max_retries=2,
+                 retry_backoff=0.5, pool_size=10, cache=None, keep_alive=None, backends=None):
+        self.backends = backends or BackendPool(base_url)
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.backends.backends), pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._metrics_hooks = []
+        # LLMResponseCache opcional; con ella las respuestas se reutilizan entre procesos
+        self.cache = cache
+        # Tiempo que Ollama mantiene cargado el modelo tras cada llamada ("30m", -1 = siempre).
+        # No forma parte de la clave de la caché: no cambia la respuesta.
+        self.keep_alive = keep_alive
+
+    def add_metrics_hook(self, hook):
+        """Registra una función que recibe un LLMCallMetrics tras cada llamada."""
+        self._metrics_hooks.append(hook)
+
+    def remove_metrics_hook(self, hook):
+        self._metrics_hooks.remove(hook)
+
+    def _emit(self, metrics):
+        for hook in list(self._metrics_hooks):
+            try:
+                hook(metrics)
+            except Exception:
+                logger.exception("Error en un hook de métricas de Ollama")
+
+    def _sleep_before_retry(self, attempt):
+        # Backoff exponencial con "full jitter" para no sincronizar reintentos
+        time.sleep(random.uniform(0, self.retry_backoff * (2 ** attempt)))
+
+    def _send(self, path, payload, stream=False):
+        """
+        POST con reintentos ante errores transitorios. Devuelve (respuesta,
+        intentos, servidor); el servidor sigue contando la llamada como en curso
+        hasta que se llame a backends.release(). Si se agotan los intentos lanza
+        _SendError con el último error.
+        """
+        model = payload.get('model')
+        attempts = 0
+        last_error = None
+        tried = []
+        while attempts <= self.max_retries:
+            backend = self.backends.acquire(model, exclude=tried)
+            if backend in tried:
+                # Sin otro servidor al que pasar: se espera antes de repetir
+                self._sleep_before_retry(attempts - 1)
+            attempts += 1
+            tried.append(backend)
+            url = f"{backend.url}{path}"
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.backends.release(backend, ok=False)
+                last_error = e
+                continue
+            if response.status_code in RETRYABLE_STATUS:
+                self.backends.release(backend, ok=False)
+                last_error = requests.HTTPError(f"{response.status_code} desde {url}", response=response)
+                response.close()
+                continue
+            try:
+                response.raise_for_status()
+            except requests.HTTPError as e:
+                # Errores no transitorios (404 de modelo...): no se reintenta
+                self.backends.release(backend, ok=True)
+                response.close()
+                raise _SendError(e, attempts, response.status_code, backend.url) from e
+            return response, attempts, backend
+        raise _SendError(
+            last_error, attempts, getattr(getattr(last_error, 'response', None), 'status_code', None),
+            tried[-1].url if tried else None
+        )
+
+    def post(self, path, payload):
+        """POST a la API de Ollama con reintentos. Devuelve el JSON de la respuesta."""
+        model = payload.get('model', '')
+        start = time.monotonic()
+        try:
+            response, attempts, backend = self._send(path, payload)
+        except _SendError as e:
+            self._emit_failure(path, model, start, e.attempts, e.status_code, e.error, e.backend)
+            raise OllamaError(str(e.error), e.status_code) from e.error
+        try:
+            data = response.json()
+        except ValueError as e:
+            self.backends.release(backend, ok=False)
+            self._emit_failure(path, model, start, attempts, response.status_code, e, backend.url)
+            raise OllamaError(f"Respuesta no válida de Ollama: {e}") from e
+        duration = time.monotonic() - start
+        self.backends.release(backend, ok=True, duration=duration, model=model)
+        self._emit(LLMCallMetrics(
+            endpoint=path, model=model, attempts=attempts, duration=duration,
+            ok=True, status_code=response.status_code,
+            prompt_tokens=data.get('prompt_eval_count') if isinstance(data, dict) else None,
+            completion_tokens=data.get('eval_count') if isinstance(data, dict) else None,
+            backend=backend.url,
+        ))
+        return data
+
+    def _emit_failure(self, path, model, start, attempts, status_code, error, backend=None):
+        self._emit(LLMCallMetrics(
+            endpoint=path, model=model, attempts=attempts, duration=time.monotonic() - start,
+            ok=False, status_code=status_code, error=str(error), backend=backend,
+        ))
+
+    def _prepare_generation(self, model, prompt, prompt_version, options, params):
+        """Fija la generación si hay caché y devuelve (options, clave de caché)."""
+        options = dict(options or {})
+        if self.cache is None:
+            return options, None
+        options.update(temperature=0, seed=self.cache.seed)
+        return options, self.cache.make_key(model, prompt_version, prompt, {"options": options, **params})
+
+    def _generate_payload(self, model, prompt, stream, options, params):
+        payload = {"model": model, "prompt": prompt, "stream": stream, **params}
+        if options:
+            payload["options"] = options
+        if self.keep_alive is not None:
+            payload.setdefault("keep_alive", self.keep_alive)
+        return payload
+
+    def warm_up(self, model):
+        """
+        Carga el modelo en memoria en todos los servidores sin generar nada (un
+        /api/generate sin prompt), para que la primera extracción no pague el
+        tiempo de carga.
+        """
+        payload = {"model": model}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        errors = []
+        for backend in self.backends.backends:
+            try:
+                self.session.post(f"{backend.url}/api/generate", json=payload, timeout=self.timeout).raise_for_status()
+            except requests.RequestException as e:
+                errors.append(f"{backend.url}: {e}")
+            else:
+                backend.last_model = model
+        if errors:
+            raise OllamaError("; ".join(errors))
+
+    def loaded_models(self):
+        """Nombres de los modelos que tienen cargados ahora mismo los servidores (/api/ps)."""
+        loaded = []
+        errors = []
+        for backend in self.backends.backends:
+            try:
+                response = self.session.get(f"{backend.url}/api/ps", timeout=self.timeout)
+                response.raise_for_status()
+                names = [model["name"] for model in response.json().get("models", [])]
+            except (requests.RequestException, ValueError, KeyError, TypeError, AttributeError) as e:
+                errors.append(f"{backend.url}: {e}")
+                continue
+            loaded.extend(name for name in names if name not in loaded)
+        if errors and len(errors) == len(self.backends.backends):
+            raise OllamaError(f"No se pudo consultar los modelos cargados: {'; '.join(errors)}")
+        return loaded
+
+    def _cached_response(self, model, cache_key, use_cache):
+        if cache_key is None or not use_cache:
+            return None
+        cached_response = self.cache.get(cache_key)
+        if cached_response is not None:
+            self._emit(LLMCallMetrics(
+                endpoint='/api/generate', model=model, attempts=0, duration=0.0, ok=True, cached=True
+            ))
+        return cached_response
+
+    def _store_response(self, model, prompt_version, cache_key, cacheable, response_text):
+        if cache_key is not None and (cacheable is None or cacheable(response_text)):
+            self.cache.set(cache_key, model, prompt_version, response_text)
+
+    def generate(self, model, prompt, prompt_version=None, use_cache=True, cacheable=None, options=None, **params):
+        """
+        Llamada sin streaming a /api/generate. Devuelve el texto generado.
+        Con caché, la generación se fija determinista (temperature 0 y semilla
+        fija) y la respuesta se reutiliza para el mismo modelo, versión de prompt,
+        parámetros y prompt. Con use_cache=False se regenera y se actualiza la caché.
+        `cacheable(texto)` permite descartar respuestas que el llamador no acepta.
+        """
+        options, cache_key = self._prepare_generation(model, prompt, prompt_version, options, params)
+        cached_response = self._cached_response(model, cache_key, use_cache)
+        if cached_response is not None:
+            return cached_response
+
+        payload = self._generate_payload(model, prompt, False, options, params)
+        data = self.post('/api/generate', payload)
+        try:
+            response_text = data["response"]
+        except (KeyError, TypeError):
+            raise OllamaError(f"Respuesta inesperada de Ollama: {data}")
+        self._store_response(model, prompt_version, cache_key, cacheable, response_text)
+        return response_text
+
+    def generate_stream(self, model, prompt, prompt_version=None, use_cache=True, cacheable=None, options=None, **params):
+        """
+        Igual que generate, pero genera los fragmentos de texto según los produce
+        Ollama. Solo se reintenta antes de recibir el primer fragmento; una
+        respuesta cacheada se entrega en un único fragmento.
+        """
+        options, cache_key = self._prepare_generation(model, prompt, prompt_version, options, params)
+        cached_response = self._cached_response(model, cache_key, use_cache)
+        if cached_response is not None:
+            yield cached_response
+            return
+
+        path = '/api/generate'
+        payload = self._generate_payload(model, prompt, True, options, params)
+        start = time.monotonic()
+        try:
+            response, attempts, backend = self._send(path, payload, stream=True)
+        except _SendError as e:
+            self._emit_failure(path, model, start, e.attempts, e.status_code, e.error, e.backend)
+            raise OllamaError(str(e.error), e.status_code) from e.error
+
+        parts = []
+        data = {}
+        # Solo cuenta como fallo del servidor que se corte la conexión; un error de
+        # Ollama dentro del stream o que el cliente deje de leer, no
+        failed = False
+        completed = False
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get('error'):
+                    raise OllamaError(data['error'])
+                token = data.get('response', '')
+                if token:
+                    parts.append(token)
+                    yield token
+                if data.get('done'):
+                    break
+            completed = True
+        except (requests.RequestException, ValueError) as e:
+            failed = True
+            self._emit_failure(path, model, start, attempts, response.status_code, e, backend.url)
+            raise OllamaError(f"Se interrumpió la respuesta de Ollama: {e}") from e
+        except OllamaError as e:
+            self._emit_failure(path, model, start, attempts, response.status_code, e, backend.url)
+            raise
+        finally:
+            response.close()
+            self.backends.release(
+                backend, ok=not failed, duration=time.monotonic() - start if completed else None, model=model
+            )
+
+        self._emit(LLMCallMetrics(
+            endpoint=path, model=model, attempts=attempts, duration=time.monotonic() - start,
+            ok=True, status_code=response.status_code,
+            prompt_tokens=data.get('prompt_eval_count'),
+            completion_tokens=data.get('eval_count'),
+            backend=backend.url,
+        ))
+        self._store_response(model, prompt_version, cache_key, cacheable, "".join(parts))
+
+
+class _SendError(Exception):
+    def __init__(self, error, attempts, status_code, backend=None):
+        super().__init__(str(error))
+        self.error = error
+        self.attempts = attempts
+        self.status_code = status_code
+        self.backend = backend
+
+
+def build_response_cache():
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    return LLMResponseCache(
+        settings.LLM_CACHE_PATH,
+        max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+        ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+        seed=settings.LLM_CACHE_SEED,
+    )
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_ollama_client():
+    """Cliente compartido por todo el proceso, creado la primera vez que se usa."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                backends = BackendPool(
+                    settings.OLLAMA_API_URLS,
+                    failure_threshold=settings.OLLAMA_FAILURE_THRESHOLD,
+                    eject_seconds=settings.OLLAMA_EJECT_SECONDS,
+                )
+                _client = OllamaClient(
+                    settings.OLLAMA_API_URLS,
+                    connect_timeout=settings.OLLAMA_CONNECT_TIMEOUT,
+                    read_timeout=settings.OLLAMA_READ_TIMEOUT,
+                    max_retries=settings.OLLAMA_MAX_RETRIES,
+                    retry_backoff=settings.OLLAMA_RETRY_BACKOFF,
+                    pool_size=settings.OLLAMA_POOL_SIZE,
+                    cache=build_response_cache(),
+                    keep_alive=settings.OLLAMA_KEEP_ALIVE,
+                    backends=backends,
+                )
+                if len(backends.backends) > 1:
+                    backends.start_health_checks(
+                        _client.session, settings.OLLAMA_HEALTH_CHECK_INTERVAL, settings.OLLAMA_CONNECT_TIMEOUT
+                    )
+    return _client
+
+
+def start_warmup_thread():
+    """
+    Precarga OLLAMA_WARMUP_MODELS en segundo plano para no retrasar el arranque.
+    Se llama desde el punto de entrada del servidor web (wsgi.py, asgi.py).
+    """
+    if not settings.OLLAMA_WARMUP_ON_STARTUP or not settings.OLLAMA_WARMUP_MODELS:
+        return None
+    thread = threading.Thread(target=warm_up_models, name="ollama-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def warm_up_models(models=None):
+    """
+    Carga en Ollama los modelos de OLLAMA_WARMUP_MODELS (o los indicados).
+    Devuelve los que no se pudieron cargar; los fallos solo se registran.
+    """
+    client = get_ollama_client()
+    failed = []
+    for model in settings.OLLAMA_WARMUP_MODELS if models is None else models:
+        try:
+            client.warm_up(model)
+            logger.info("Modelo %s cargado en Ollama", model)
+        except OllamaError as e:
+            logger.warning("No se pudo precargar el modelo %s: %s", model, e)
+            failed.append(model)
+    return failed
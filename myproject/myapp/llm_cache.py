@@ -0,0 +1,123 @@
+import hashlib
+import json
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+
+# Caché persistente de respuestas del LLM en un archivo SQLite propio, compartido
+# por todos los procesos (gunicorn, worker...). La clave combina modelo, versión
+# del prompt, parámetros de generación y hash del prompt completo.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_response (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    prompt_version TEXT,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS llm_response_last_access ON llm_response (last_access);
+CREATE TABLE IF NOT EXISTS llm_stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class LLMResponseCache:
+    """Caché con expiración (TTL) y expulsión de las entradas menos usadas (LRU)."""
+
+    def __init__(self, path, max_entries=5000, ttl_seconds=30 * 24 * 3600, seed=42):
+        self.path = str(path)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # Con la caché activa la generación se fija determinista con esta semilla
+        self.seed = seed
+        with closing(self._connect()) as conn, conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        # Una conexión por operación: sirve igual desde varios hilos y procesos
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def make_key(model, prompt_version, prompt, params):
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        key_source = json.dumps(
+            {"model": model, "prompt_version": prompt_version, "params": params, "prompt": prompt_hash},
+            sort_keys=True, ensure_ascii=False, default=str,
+        )
+        return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+
+    def _expired_before(self, now):
+        return now - self.ttl_seconds if self.ttl_seconds else None
+
+    def _count(self, conn, name):
+        conn.execute(
+            "INSERT INTO llm_stats (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+
+    def get(self, key):
+        now = time.time()
+        expired_before = self._expired_before(now)
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT response, created_at FROM llm_response WHERE key = ?", (key,)).fetchone()
+            if row is not None and expired_before is not None and row[1] < expired_before:
+                conn.execute("DELETE FROM llm_response WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self._count(conn, 'misses')
+                return None
+            conn.execute("UPDATE llm_response SET last_access = ? WHERE key = ?", (now, key))
+            self._count(conn, 'hits')
+            return row[0]
+
+    def set(self, key, model, prompt_version, response):
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_response (key, model, prompt_version, response, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, None if prompt_version is None else str(prompt_version), response, now, now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        expired_before = self._expired_before(now)
+        if expired_before is not None:
+            conn.execute("DELETE FROM llm_response WHERE created_at < ?", (expired_before,))
+        if self.max_entries:
+            conn.execute(
+                "DELETE FROM llm_response WHERE key IN ("
+                "SELECT key FROM llm_response ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def purge_expired(self):
+        with closing(self._connect()) as conn, conn:
+            self._evict(conn, time.time())
+
+    def clear(self):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM llm_response")
+            conn.execute("DELETE FROM llm_stats")
+
+    def stats(self):
+        with closing(self._connect()) as conn:
+            counters = dict(conn.execute("SELECT name, value FROM llm_stats").fetchall())
+            entries = conn.execute("SELECT COUNT(*) FROM llm_response").fetchone()[0]
+        hits = counters.get('hits', 0)
+        misses = counters.get('misses', 0)
+        lookups = hits + misses
+        return {
+            "entries": entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
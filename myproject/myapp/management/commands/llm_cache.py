@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from myapp.llm import build_response_cache
+
+
+class Command(BaseCommand):
+    help = 'Muestra las estadísticas de la caché de respuestas del LLM o la vacía'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true', help='Borra todas las respuestas y contadores')
+        parser.add_argument('--purge-expired', action='store_true',
+                            help='Elimina las entradas caducadas o que exceden el máximo')
+
+    def handle(self, *args, **options):
+        cache = build_response_cache()
+        if cache is None:
+            self.stdout.write(self.style.WARNING('La caché de respuestas del LLM está desactivada.'))
+            return
+
+        if options['clear']:
+            cache.clear()
+            self.stdout.write(self.style.SUCCESS('Caché de respuestas del LLM vaciada.'))
+        elif options['purge_expired']:
+            cache.purge_expired()
+
+        stats = cache.stats()
+        self.stdout.write(
+            f"Entradas: {stats['entries']}, aciertos: {stats['hits']}, fallos: {stats['misses']}, "
+            f"tasa de acierto: {stats['hit_rate']:.1%}"
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from myapp.llm import OllamaError, get_ollama_client, warm_up_models
+
+
+class Command(BaseCommand):
+    help = 'Carga en Ollama los modelos de OLLAMA_WARMUP_MODELS (o los indicados) y muestra los cargados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', help='Modelos a cargar (por defecto OLLAMA_WARMUP_MODELS)')
+
+    def handle(self, *args, **options):
+        failed = warm_up_models(options['models'] or None)
+        if failed:
+            self.stdout.write(self.style.ERROR(f"No se pudieron cargar: {', '.join(failed)}"))
+        try:
+            loaded = get_ollama_client().loaded_models()
+        except OllamaError as e:
+            self.stdout.write(self.style.WARNING(str(e)))
+            return
+        self.stdout.write(f"Modelos cargados en Ollama: {', '.join(loaded) or 'ninguno'}")
@@ -0,0 +1,603 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.conf import settings
+from google import genai
+from google.genai import types
+from .chunking import merge_partial_results, split_into_chunks
+from .circuit import CircuitOpenError, get_breaker, guarded
+from .dates import RULES_VERSION, extract_dates, merge_dates
+from .jsonparse import IncrementalJSONParser, JSONParseError, parse_json
+from .llm import OllamaError, get_ollama_client
+from .prefilter import PREFILTER_VERSION, prefilter_text
+from .schema import SchemaValidationError, extraction_schema, get_schema
+
+# Pipeline de extracción de datos de una guía docente con IA, compartido por la
+# vista JSON y la vista en streaming (SSE). Los pasos se exponen como una
+# secuencia de eventos para poder reenviar el progreso y los tokens al cliente.
+
+GEMINI_MODEL = "gemini-2.5-flash-preview-04-17"
+
+# Versión de los prompts y de JSON_utilizar.json. Incrementarla al cambiarlos para
+# que no se reutilicen resultados cacheados generados con los prompts anteriores.
+PROMPT_VERSION = 1
+
+MODE_API = "api"
+MODE_LOCAL = "local"
+# Divide los documentos largos en fragmentos que se procesan en paralelo (map-reduce)
+MODE_LOCAL_CHUNKED = "local_chunked"
+# Una sola llamada a Ollama con la salida restringida al esquema de JSON_utilizar.json
+MODE_LOCAL_STRUCTURED = "local_structured"
+# Una llamada más pequeña por sección del esquema (asignatura, fechas...), en paralelo
+MODE_LOCAL_DIVIDED = "local_divided"
+LOCAL_MODES = [MODE_LOCAL, MODE_LOCAL_CHUNKED, MODE_LOCAL_STRUCTURED, MODE_LOCAL_DIVIDED]
+# Solo fechas, por reglas y sin LLM (milisegundos)
+MODE_RULES = "rules"
+# Elige en cada petición entre local y API (myapp/routing.py); nunca llega al pipeline
+MODE_AUTO = "auto"
+VALID_MODES = LOCAL_MODES + [MODE_API, MODE_RULES, MODE_AUTO]
+
+# Backends de IA, cada uno con su circuit breaker (myapp/circuit.py)
+BACKEND_OLLAMA = "ollama"
+BACKEND_GEMINI = "gemini"
+
+VALID_LOCAL_MODELS = ["gemma2:9b", "llama3.1:8b"]
+DEFAULT_LOCAL_MODEL = "gemma2:9b"
+
+# Eventos que genera iter_pipeline_events
+EVENT_STAGE = 'stage'
+EVENT_TOKEN = 'token'
+EVENT_RESULT = 'result'
+EVENT_ERROR = 'error'
+# Antes de 'result' si parte del documento falló (fragmentos o secciones): el
+# resultado se entrega pero no se cachea, para que al reintentar se complete
+EVENT_INCOMPLETE = 'incomplete'
+
+
+class PipelineError(Exception):
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+class BackendUnavailable(PipelineError):
+    """El circuit breaker del backend está abierto: se puede reintentar pasados retry_after segundos."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def get_json_structure():
+    # Estructura de JSON_utilizar.json ya serializada en el registro de esquemas
+    return get_schema().structure
+
+
+def is_valid_json_response(raw_response):
+    # Solo se cachean respuestas completas; una cortada es un error
+    try:
+        parse_json(raw_response)
+        return True
+    except JSONParseError:
+        return False
+
+
+def is_strict_json_response(raw_response):
+    # La salida restringida por esquema ya es JSON válido y no necesita reparación
+    try:
+        json.loads(raw_response)
+        return True
+    except json.JSONDecodeError:
+        return False
+
+
+def gemini_system_instruction():
+    return f"""Actúa como un experto en extracción y estructuración de información a partir de documentos académicos (guías docentes, syllabus, etc.). Tu tarea es analizar el texto proporcionado y generar un único objeto JSON que contenga la información relevante sobre la asignatura, siguiendo estrictamente la estructura especificada.
+                                             **Estructura JSON Requerida:**
+                                             {get_json_structure()}
+                                             Asegúrate de que el JSON sea sintácticamente correcto, sin comas adicionales ni errores de formato."""
+
+
+def summary_prompt(text):
+    return f"""Eres un asistente de IA avanzado diseñado para resumir textos relacionados con asignaturas universitarias, extrayendo solo la información relevante. A continuación, te proporcionaré un texto que describe una asignatura. Tu tarea es:
+
+            1. Analizar el texto y resumirlo, incluyendo únicamente los siguientes tipos de información:
+               - Nombre de la asignatura.
+               - Nombre del grado al que pertenece.
+               - Nombre del departamento responsable.
+               - Nombre de la universidad.
+               - Condiciones para aprobar (si se mencionan).
+               - Fechas relevantes (como exámenes, inicio de prácticas, etc.) con su propósito o descripción.
+               - Detalles de horarios (grupos, tipo de sesión, horas y aulas, si se especifican).
+               - Nombre, despacho, enlace y horario de tutorías de los profesores (si se mencionan).
+
+            2. Descartar cualquier información no relevante para estos campos.
+
+            3. Proporciona el resumen como un texto plano, incluyendo solo los datos extraídos y omitiendo explicaciones adicionales.
+
+            Ahora, por favor, procesa el siguiente texto:
+
+            [{text}]"""
+
+
+def json_prompt(summary):
+    return f"""Eres un asistente de IA avanzado diseñado para transformar un texto resumido sobre una asignatura universitaria en un JSON estructurado. A continuación, te proporcionaré un texto resumido que contiene solo la información relevante para rellenar una estructura JSON. Tu tarea es:
+
+            1. Convertir el texto resumido en un JSON con la siguiente estructura:
+               {get_json_structure()}
+
+            2. Si alguna información no está presente en el texto resumido, deja el campo correspondiente con la información más probable, pero mantén la estructura JSON intacta.
+            3. Asegúrate de que las fechas estén en formato "YYYY-MM-DD" si se proporcionan, y convierte cualquier formato de texto (como "18 de marzo de 2023") a este estándar.
+            4. Proporciona solo el JSON como salida, sin explicaciones adicionales, y asegúrate de que sea sintácticamente correcto, sin comas adicionales ni errores de formato.
+
+            Ahora, por favor, procesa el siguiente texto resumido:
+
+            [{summary}]"""
+
+
+def chunk_prompt(chunk):
+    return f"""Eres un asistente de IA avanzado diseñado para extraer información de guías docentes de asignaturas universitarias. A continuación, te proporcionaré un fragmento de una guía docente; el resto del documento se procesa por separado. Tu tarea es:
+
+            1. Extraer únicamente la información que aparece en este fragmento y devolverla en un JSON con la siguiente estructura:
+               {get_json_structure()}
+
+            2. Si un campo no aparece en el fragmento, déjalo como cadena vacía ("") o lista vacía ([]). No inventes ni deduzcas datos que no estén en el fragmento.
+            3. Asegúrate de que las fechas estén en formato "YYYY-MM-DD" si se proporcionan, y convierte cualquier formato de texto (como "18 de marzo de 2023") a este estándar.
+            4. Proporciona solo el JSON como salida, sin explicaciones adicionales, y asegúrate de que sea sintácticamente correcto, sin comas adicionales ni errores de formato.
+
+            Fragmento:
+
+            [{chunk}]"""
+
+
+def structured_prompt(text, include_dates=True):
+    # Con las fechas ya extraídas por reglas, el modelo solo genera el resto de campos
+    dates_step = (
+        '2. Extraer las fechas relevantes (exámenes, entregas, inicio de prácticas, etc.) con su propósito, en formato "YYYY-MM-DD"; convierte cualquier formato de texto (como "18 de marzo de 2023") a este estándar.'
+        if include_dates else
+        "2. No extraigas las fechas: se obtienen por separado."
+    )
+    return f"""Eres un asistente de IA avanzado diseñado para extraer información de guías docentes de asignaturas universitarias. A continuación, te proporcionaré el texto de una guía docente. Tu tarea es:
+
+            1. Extraer el nombre de la asignatura, el grado, el departamento, la universidad y las condiciones para aprobar (si se mencionan).
+            {dates_step}
+            3. Extraer los horarios (grupo, tipo de sesión, día, hora y aula) y los profesores (nombre, despacho, enlace y horario de tutorías).
+            4. Si un campo no aparece en el texto, déjalo como cadena vacía ("") o lista vacía ([]). No inventes datos.
+
+            Responde únicamente con el JSON. Texto de la guía docente:
+
+            [{text}]"""
+
+
+# Qué extraer en cada sección del modo 'local_divided'
+SECTION_FOCUS = {
+    "asignatura": "el nombre de la asignatura, el grado, el departamento, la universidad y las condiciones para aprobar (si se mencionan)",
+    "fechas": 'las fechas relevantes (exámenes, entregas, inicio de prácticas, etc.) con su propósito, en formato "YYYY-MM-DD"; convierte cualquier formato de texto (como "18 de marzo de 2023") a este estándar',
+    "horarios": "los horarios de clase: grupo, tipo de sesión (teoría, práctica o tutoría), día de la semana, hora y aula",
+    "profesores": "los profesores: nombre, despacho, enlace y horario de tutorías",
+}
+
+
+def section_prompt(text, section):
+    structure = json.dumps({section: get_schema().template[section]}, ensure_ascii=False)
+    focus = SECTION_FOCUS.get(section, f"los datos de '{section}'")
+    return f"""Eres un asistente de IA avanzado diseñado para extraer información de guías docentes de asignaturas universitarias. A continuación, te proporcionaré el texto de una guía docente. Tu tarea es:
+
+            1. Extraer únicamente {focus}, con la siguiente estructura JSON:
+               {structure}
+
+            2. Ignora el resto de la información de la guía: se extrae por separado.
+            3. Si un campo no aparece en el texto, déjalo como cadena vacía ("") o lista vacía ([]). No inventes datos.
+
+            Responde únicamente con el JSON. Texto de la guía docente:
+
+            [{text}]"""
+
+
+def cache_variant(model_mode, summary_model, json_model, prefill_dates=False):
+    """Identifica modo, modelos y versión del prompt en la caché de resultados."""
+    if model_mode == MODE_RULES:
+        return f"rules:v{RULES_VERSION}"
+    if model_mode == MODE_API:
+        variant = f"api:{GEMINI_MODEL}:v{PROMPT_VERSION}"
+    elif model_mode == MODE_LOCAL_CHUNKED:
+        # El tamaño de fragmento cambia el resultado, así que forma parte de la variante
+        variant = f"local_chunked:{json_model}:{settings.LLM_CHUNK_MAX_CHARS}:v{PROMPT_VERSION}"
+    elif model_mode == MODE_LOCAL_STRUCTURED:
+        variant = f"local_structured:{json_model}:v{PROMPT_VERSION}"
+    elif model_mode == MODE_LOCAL_DIVIDED:
+        variant = f"local_divided:{json_model}:v{PROMPT_VERSION}"
+    else:
+        variant = f"local:{summary_model}:{json_model}:v{PROMPT_VERSION}"
+    if settings.LLM_PREFILTER_ENABLED:
+        variant = f"{variant}:prefiltro_v{PREFILTER_VERSION}"
+    return f"{variant}:fechas_reglas_v{RULES_VERSION}" if prefill_dates else variant
+
+
+def pipeline_backend(model_mode):
+    """Backend de IA que usa el modo (None si no usa ninguno)."""
+    if model_mode in LOCAL_MODES:
+        return BACKEND_OLLAMA
+    if model_mode == MODE_API:
+        return BACKEND_GEMINI
+    return None
+
+
+def pipeline_models(model_mode, summary_model, json_model, **params):
+    """Modelos de Ollama que usa una extracción, en el orden en que los carga."""
+    if model_mode == MODE_LOCAL:
+        return [summary_model] if summary_model == json_model else [summary_model, json_model]
+    if model_mode in LOCAL_MODES:
+        return [json_model]
+    return []
+
+
+def pipeline_concurrency(model_mode, **params):
+    """Peticiones a Ollama que una extracción quiere enviar a la vez."""
+    if model_mode == MODE_LOCAL_CHUNKED:
+        return max(1, settings.LLM_CHUNK_CONCURRENCY)
+    if model_mode == MODE_LOCAL_DIVIDED:
+        return max(1, settings.LLM_SECTION_CONCURRENCY)
+    return 1
+
+
+def parse_pipeline_params(data):
+    """
+    Lee y valida los parámetros del pipeline de la petición. Devuelve
+    (params, mensaje de error); el mensaje es None si son válidos.
+    """
+    params = {
+        "model_mode": data.get("model_mode", MODE_LOCAL),
+        "summary_model": data.get("summary_model", DEFAULT_LOCAL_MODEL),
+        "json_model": data.get("json_model", DEFAULT_LOCAL_MODEL),
+        "force_refresh": bool(data.get("force_refresh", False)),
+        # Fechas por reglas antes del LLM; se combinan con las que este encuentre
+        "prefill_dates": bool(data.get("prefill_dates", False)),
+    }
+    if params["model_mode"] not in VALID_MODES:
+        return params, "Modo de extracción no válido"
+    # Validar los modelos si el modo es local (o puede acabar siéndolo)
+    if params["model_mode"] in LOCAL_MODES or params["model_mode"] == MODE_AUTO:
+        if params["summary_model"] not in VALID_LOCAL_MODELS or params["json_model"] not in VALID_LOCAL_MODELS:
+            return params, "Uno o ambos modelos no son válidos"
+    return params, None
+
+
+def iter_gemini_tokens(text):
+    client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
+    contents = [
+        types.Content(
+            role="user",
+            parts=[types.Part.from_text(text=text)],
+        ),
+    ]
+    generate_content_config = types.GenerateContentConfig(
+        response_mime_type="application/json",  # Cambiado a JSON para forzar formato correcto
+        system_instruction=[
+            types.Part.from_text(text=gemini_system_instruction()),
+        ],
+    )
+    for chunk in client.models.generate_content_stream(
+        model=GEMINI_MODEL,
+        contents=contents,
+        config=generate_content_config,
+    ):
+        if chunk.text:
+            yield chunk.text
+
+
+def _ollama_failure(error):
+    # Los errores de la petición (modelo inexistente...) no abren el circuito
+    return isinstance(error, OllamaError) and error.is_backend_failure
+
+
+def _ollama_tokens(model, prompt, stream, force_refresh, cacheable=None, **params):
+    client = get_ollama_client()
+    kwargs = {"prompt_version": PROMPT_VERSION, "use_cache": not force_refresh, "cacheable": cacheable, **params}
+    if stream:
+        yield from client.generate_stream(model, prompt, **kwargs)
+    else:
+        yield client.generate(model, prompt, **kwargs)
+
+
+def _iter_ollama_tokens(model, prompt, stream, force_refresh, cacheable=None, **params):
+    tokens = _ollama_tokens(model, prompt, stream, force_refresh, cacheable, **params)
+    return guarded(get_breaker(BACKEND_OLLAMA), tokens, _ollama_failure)
+
+
+def _run_stage(stage, tokens, parser=None):
+    """
+    Reenvía los tokens de una etapa como eventos y devuelve el texto completo.
+    Si se pasa un IncrementalJSONParser, se le van dando los tokens según llegan.
+    """
+    parts = []
+    yield EVENT_STAGE, {"stage": stage, "status": "started"}
+    for token in tokens:
+        parts.append(token)
+        if parser is not None:
+            parser.feed(token)
+        yield EVENT_TOKEN, {"stage": stage, "text": token}
+    yield EVENT_STAGE, {"stage": stage, "status": "done"}
+    return "".join(parts)
+
+
+def _parse_json_output(raw_response, parser=None):
+    """
+    Interpreta la salida del modelo (con el parser que la ha ido leyendo, si lo
+    hay). Se reparan comillas simples y comas sobrantes, pero una salida cortada
+    es un error: un resultado incompleto se guardaría y se cachearía para todos.
+    """
+    try:
+        if parser is None:
+            parser = IncrementalJSONParser().feed(raw_response)
+        return parser.finish()
+    except JSONParseError as e:
+        raise PipelineError(f"Error: JSON inválido generado ({e}): {raw_response}")
+
+
+def _iter_api_events(text_content):
+    parser = IncrementalJSONParser()
+    try:
+        json_response = yield from _run_stage(
+            "gemini", guarded(get_breaker(BACKEND_GEMINI), iter_gemini_tokens(text_content)), parser
+        )
+    except JSONParseError as e:
+        raise PipelineError(f"Error: JSON inválido generado ({e})")
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        raise PipelineError(f"Error al conectar con Gemini API: {str(e)}")
+    return _parse_json_output(json_response, parser)
+
+
+def _iter_local_events(text_content, summary_model, json_model, force_refresh, stream):
+    try:
+        summary = yield from _run_stage(
+            "summary", _iter_ollama_tokens(summary_model, summary_prompt(text_content), stream, force_refresh)
+        )
+    except OllamaError as e:
+        raise PipelineError(f"Error al conectar con Ollama: {str(e)}")
+
+    parser = IncrementalJSONParser()
+    try:
+        json_response = yield from _run_stage(
+            "json",
+            _iter_ollama_tokens(json_model, json_prompt(summary), stream, force_refresh, is_valid_json_response),
+            parser,
+        )
+    except JSONParseError as e:
+        raise PipelineError(f"Error: JSON inválido generado ({e})")
+    except OllamaError as e:
+        raise PipelineError(f"Error al conectar con Ollama: {str(e)}")
+    return _parse_json_output(json_response, parser)
+
+
+def _iter_structured_events(text_content, json_model, force_refresh, stream, include_dates=True):
+    """Extracción en una sola generación, con el esquema como `format` de Ollama."""
+    schema = extraction_schema() if include_dates else get_schema().json_schema_without("fechas")
+    try:
+        json_response = yield from _run_stage(
+            "structured", _iter_ollama_tokens(
+                json_model, structured_prompt(text_content, include_dates), stream, force_refresh,
+                is_strict_json_response, format=schema
+            )
+        )
+    except OllamaError as e:
+        raise PipelineError(f"Error al conectar con Ollama: {str(e)}")
+    try:
+        return json.loads(json_response)
+    except json.JSONDecodeError:
+        raise PipelineError(f"Error: JSON inválido generado: {json_response}")
+
+
+def _extract_chunk(json_model, chunk, force_refresh):
+    raw_response = "".join(
+        _iter_ollama_tokens(json_model, chunk_prompt(chunk), False, force_refresh, is_valid_json_response)
+    )
+    data = _parse_json_output(raw_response)
+    if not isinstance(data, dict):
+        raise PipelineError("Error: el modelo no devolvió un objeto JSON")
+    return data
+
+
+def _iter_chunked_events(text_content, json_model, force_refresh, page_offsets, concurrency=None):
+    """
+    Map-reduce para documentos largos: cada fragmento se extrae a JSON en paralelo
+    (hasta `concurrency` peticiones a la vez, por defecto LLM_CHUNK_CONCURRENCY) y
+    los resultados se fusionan. Devuelve (resultado, errores de los fragmentos que fallaron).
+    """
+    chunks = split_into_chunks(text_content, settings.LLM_CHUNK_MAX_CHARS, page_offsets)
+    if not chunks:
+        raise PipelineError("Error: el documento no tiene texto para procesar")
+    total = len(chunks)
+    yield EVENT_STAGE, {"stage": "chunks", "status": "started", "total": total}
+
+    partials = [None] * total
+    errors = []
+    circuit_error = None
+    workers = max(1, min(concurrency or settings.LLM_CHUNK_CONCURRENCY, total))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_extract_chunk, json_model, chunk, force_refresh): index
+            for index, chunk in enumerate(chunks)
+        }
+        try:
+            for completed, future in enumerate(as_completed(futures), start=1):
+                index = futures[future]
+                try:
+                    partials[index] = future.result()
+                except CircuitOpenError as e:
+                    circuit_error = e
+                    errors.append(f"Fragmento {index + 1}: {e}")
+                except (OllamaError, PipelineError) as e:
+                    errors.append(f"Fragmento {index + 1}: {e}")
+                yield EVENT_STAGE, {
+                    "stage": "chunk", "status": "done", "index": index + 1, "completed": completed, "total": total
+                }
+        except GeneratorExit:
+            # El cliente se desconectó: no lanzar los fragmentos que aún no han empezado
+            for future in futures:
+                future.cancel()
+            raise
+
+    yield EVENT_STAGE, {"stage": "chunks", "status": "done", "total": total, "failed": len(errors)}
+    results = [partial for partial in partials if partial is not None]
+    if not results:
+        if circuit_error is not None:
+            raise circuit_error
+        raise PipelineError("Error al procesar los fragmentos del documento: " + "; ".join(errors))
+    return merge_partial_results(results), errors
+
+
+def _extract_section(json_model, text_content, section, force_refresh):
+    raw_response = "".join(_iter_ollama_tokens(
+        json_model, section_prompt(text_content, section), False, force_refresh,
+        is_strict_json_response, format=get_schema().json_schema_only(section)
+    ))
+    try:
+        data = json.loads(raw_response)
+    except json.JSONDecodeError:
+        raise PipelineError(f"Error: JSON inválido generado: {raw_response}")
+    if not isinstance(data, dict):
+        raise PipelineError("Error: el modelo no devolvió un objeto JSON")
+    return data.get(section)
+
+
+def _iter_divided_events(text_content, json_model, force_refresh, include_dates=True, concurrency=None):
+    """
+    Una petición por sección del esquema, en paralelo (hasta `concurrency` a la
+    vez, por defecto LLM_SECTION_CONCURRENCY). Cada sección se envía en cuanto está lista, ya normalizada, para
+    que el cliente pueda mostrarla sin esperar al resto. Devuelve (resultado,
+    errores de las secciones que fallaron).
+    """
+    schema = get_schema()
+    sections = [section for section in schema.template if include_dates or section != "fechas"]
+    total = len(sections)
+    yield EVENT_STAGE, {"stage": "sections", "status": "started", "total": total}
+
+    result = {}
+    errors = []
+    circuit_error = None
+    workers = max(1, min(concurrency or settings.LLM_SECTION_CONCURRENCY, total))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_extract_section, json_model, text_content, section, force_refresh): section
+            for section in sections
+        }
+        try:
+            for completed, future in enumerate(as_completed(futures), start=1):
+                section = futures[future]
+                event = {"stage": "section", "status": "done", "section": section, "completed": completed, "total": total}
+                try:
+                    event["data"] = schema.validate({section: future.result()})[section]
+                    result[section] = event["data"]
+                except CircuitOpenError as e:
+                    circuit_error = e
+                    errors.append(f"{section}: {e}")
+                    event["error"] = str(e)
+                except (OllamaError, PipelineError, SchemaValidationError) as e:
+                    errors.append(f"{section}: {e}")
+                    event["error"] = str(e)
+                yield EVENT_STAGE, event
+        except GeneratorExit:
+            for future in futures:
+                future.cancel()
+            raise
+
+    yield EVENT_STAGE, {"stage": "sections", "status": "done", "total": total, "failed": len(errors)}
+    if not result:
+        if circuit_error is not None:
+            raise circuit_error
+        raise PipelineError("Error al extraer las secciones del documento: " + "; ".join(errors))
+    return result, errors
+
+
+def _iter_rule_dates(text_content):
+    yield EVENT_STAGE, {"stage": "dates", "status": "started"}
+    fechas = extract_dates(text_content)
+    # Las fechas se envían ya, sin esperar al LLM
+    yield EVENT_STAGE, {"stage": "dates", "status": "done", "fechas": fechas}
+    return fechas
+
+
+def iter_pipeline_events(text_content, model_mode=MODE_LOCAL, summary_model=DEFAULT_LOCAL_MODEL,
+                         json_model=DEFAULT_LOCAL_MODEL, force_refresh=False, stream=True, page_offsets=None,
+                         prefill_dates=False, concurrency=None):
+    """
+    Ejecuta el pipeline y genera tuplas (evento, datos): 'stage' al empezar y
+    terminar cada etapa, 'token' con cada fragmento generado y, al final,
+    'result' con el JSON extraído (normalizado con el esquema) o 'error' con el mensaje.
+    Con stream=False cada etapa de Ollama se pide sin streaming (un único token).
+    `page_offsets` permite al modo por fragmentos cortar entre páginas. Con
+    prefill_dates las fechas se extraen antes por reglas y en los modos
+    local_structured y local_divided el modelo ya no las genera. Con
+    LLM_PREFILTER_ENABLED al modelo solo le llegan las secciones relevantes del
+    texto; las fechas por reglas se buscan en el texto completo. `concurrency`
+    son los huecos concedidos por la cola del LLM: los modos por fragmentos y por
+    secciones no envían más peticiones a la vez.
+    """
+    if model_mode not in VALID_MODES or model_mode == MODE_AUTO:
+        raise ValueError(f"Modo de extracción desconocido: {model_mode}")
+    rule_dates = None
+    # Partes del documento que fallaron; con alguna el resultado está incompleto
+    errors = []
+    try:
+        if model_mode == MODE_RULES or prefill_dates:
+            rule_dates = yield from _iter_rule_dates(text_content)
+        if model_mode != MODE_RULES and settings.LLM_PREFILTER_ENABLED:
+            prefiltered = prefilter_text(text_content, page_offsets)
+            if prefiltered.kept_chars < prefiltered.original_chars:
+                yield EVENT_STAGE, prefiltered.stage_event()
+                text_content, page_offsets = prefiltered.text, prefiltered.page_offsets
+
+        if model_mode == MODE_RULES:
+            json_data = {"fechas": rule_dates}
+        elif model_mode == MODE_API:
+            json_data = yield from _iter_api_events(text_content)
+        elif model_mode == MODE_LOCAL_CHUNKED:
+            json_data, errors = yield from _iter_chunked_events(
+                text_content, json_model, force_refresh, page_offsets, concurrency
+            )
+        elif model_mode == MODE_LOCAL_STRUCTURED:
+            json_data = yield from _iter_structured_events(
+                text_content, json_model, force_refresh, stream, include_dates=rule_dates is None
+            )
+        elif model_mode == MODE_LOCAL_DIVIDED:
+            json_data, errors = yield from _iter_divided_events(
+                text_content, json_model, force_refresh, include_dates=rule_dates is None, concurrency=concurrency
+            )
+        elif model_mode == MODE_LOCAL:
+            json_data = yield from _iter_local_events(text_content, summary_model, json_model, force_refresh, stream)
+        if rule_dates is not None and model_mode != MODE_RULES and isinstance(json_data, dict):
+            json_data["fechas"] = merge_dates(rule_dates, json_data.get("fechas"))
+        json_data = get_schema().validate(json_data)
+    except SchemaValidationError as e:
+        yield EVENT_ERROR, {"error": f"Error: el JSON generado no cumple la estructura esperada: {e}"}
+        return
+    except CircuitOpenError as e:
+        yield EVENT_ERROR, {"error": str(e), "retry_after": e.retry_after}
+        return
+    except PipelineError as e:
+        yield EVENT_ERROR, {"error": e.message}
+        return
+    if errors:
+        yield EVENT_INCOMPLETE, {"message": "Parte del documento no se pudo procesar", "errors": errors}
+    yield EVENT_RESULT, json_data
+
+
+def run_pipeline(text_content, **params):
+    """
+    Versión sin streaming: devuelve (JSON extraído, errores de las partes que
+    fallaron; vacío si el resultado está completo) o lanza PipelineError.
+    """
+    errors = []
+    for event, payload in iter_pipeline_events(text_content, stream=False, **params):
+        if event == EVENT_INCOMPLETE:
+            errors = payload["errors"]
+        if event == EVENT_RESULT:
+            return payload, errors
+        if event == EVENT_ERROR:
+            if "retry_after" in payload:
+                raise BackendUnavailable(payload["error"], payload["retry_after"])
+            raise PipelineError(payload["error"])
+    raise PipelineError("El pipeline terminó sin resultado")
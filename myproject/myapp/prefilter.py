@@ -0,0 +1,203 @@
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from django.conf import settings
+from .chunking import SECTION_RE, split_pages
+from .dates import ISO_DATE_RE, NUMERIC_DATE_RE, RANGE_RE, TEXT_DATE_RE, WEEKDAY_RE
+
+# Prefiltro de relevancia: las guías docentes son sobre todo texto que no se
+# extrae (competencias, bibliografía, normativa). Antes de llamar al LLM se
+# quitan las cabeceras y pies que se repiten en cada página, se divide el texto
+# en secciones, se puntúa cada una según las fechas, horarios, profesores y
+# criterios de evaluación que contiene y solo se envían las mejores. Menos texto
+# en el prompt es menos tiempo de procesado y de generación en el modelo local.
+
+# Versión del prefiltro; forma parte de la variante de la caché de resultados
+PREFILTER_VERSION = 1
+
+# Apartados más cortos se unen a los siguientes (filas de una tabla, diapositivas de un título)
+MIN_SECTION_CHARS = 150
+# Líneas del principio y del final de cada página donde se buscan cabeceras y pies
+EDGE_LINES = 3
+# Una línea es cabecera o pie si se repite en al menos esta fracción de las páginas
+REPEATED_RATIO = 0.5
+MIN_REPEATED_PAGES = 3
+
+# Apartado con etiqueta al principio de línea ("Temario:", "Sistema de evaluación:")
+LABEL_RE = re.compile(r"\n(?=[A-ZÁÉÍÓÚÑ][^\n:.•]{2,40}:(?:\s|$))")
+PAGE_NUMBER_RE = re.compile(r"^(?:p[aá]g(?:ina)?\.?|page)?\s*\d{1,4}(?:\s*(?:/|de|of)\s*\d{1,4})?$", re.IGNORECASE)
+# "10/9", "3-10": fechas sin año, habituales en las planificaciones de clases
+SHORT_DATE_RE = re.compile(r"(?<![\d/.-])\d{1,2}/\d{1,2}(?![\d/])")
+# "10:40", "de 9 a 11 horas", "12,30 h" (no "0.35": las notas no son horas)
+TIME_RE = re.compile(r"\b\d{1,2}:\d{2}\b|\b\d{1,2}(?:[:.,]\d{2})?\s*(?:h\b|horas\b)", re.IGNORECASE)
+# Pesos de la nota final ("60%")
+PERCENT_RE = re.compile(r"\b\d{1,3}(?:[.,]\d+)?\s*%")
+EMAIL_RE = re.compile(r"\b[\w.+-]+@[\w-]+\.[\w.-]+\b")
+ENGLISH_WEEKDAY_RE = re.compile(r"\b(monday|tuesday|wednesday|thursday|friday)\b", re.IGNORECASE)
+MONTH_NAME_RE = re.compile(
+    r"\b(enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|octubre|noviembre|diciembre)\b", re.IGNORECASE
+)
+# En mayúscula: "may" también es un verbo
+ENGLISH_MONTH_RE = re.compile(
+    r"\b(January|February|March|April|May|June|July|August|September|October|November|December)\b"
+)
+
+# (patrón, peso por aparición) de lo que se extrae según JSON_utilizar.json
+RELEVANT_PATTERNS = [
+    (TEXT_DATE_RE, 4), (RANGE_RE, 4), (NUMERIC_DATE_RE, 4), (ISO_DATE_RE, 4), (SHORT_DATE_RE, 3),
+    (TIME_RE, 2), (WEEKDAY_RE, 1), (ENGLISH_WEEKDAY_RE, 1),
+    (MONTH_NAME_RE, 1), (ENGLISH_MONTH_RE, 1), (PERCENT_RE, 1), (EMAIL_RE, 3),
+    (re.compile(
+        r"\b(ex[aá]men(es)?|parcial(es)?|convocatoria|entregas?|plazos?|evaluaci[oó]n|calificaci[oó]n|nota|aprobar|"
+        r"aprobado|puntos|recuperaci[oó]n|pr[aá]cticas?|horarios?|tutor[ií]as?|aulas?|clases?|grupos?|profesor(es|ado|a)?|"
+        r"coordinador(a)?|despacho|asignatura|grado|departamento|universidad|"
+        r"exams?|calls?|deadlines?|grades?|grading|points|evaluation|schedule|lectures?|lecturers?|office|room|staff|coordinator|degree)\b",
+        re.IGNORECASE,
+    ), 1),
+]
+# Títulos de secciones que no aportan nada a la extracción
+BOILERPLATE_RE = re.compile(
+    r"competencias|bibliograf|referencias|resultados de aprendizaje|objetivos|contenidos|temario|normativa|"
+    r"plagio|protecci[oó]n de datos|accesibilidad|competences|bibliography|references|goals|contents",
+    re.IGNORECASE,
+)
+BOILERPLATE_PENALTY = 6
+
+
+@dataclass
+class PrefilterResult:
+    text: str
+    # Offsets en bytes de cada página del texto filtrado (para el modo por fragmentos)
+    page_offsets: list = field(default_factory=list)
+    original_chars: int = 0
+    sections: int = 0
+    kept_sections: int = 0
+
+    @property
+    def kept_chars(self):
+        return len(self.text)
+
+    def stage_event(self):
+        return {
+            "stage": "prefilter", "status": "done", "original_chars": self.original_chars,
+            "kept_chars": self.kept_chars, "sections": self.sections, "kept_sections": self.kept_sections,
+        }
+
+
+def _line_key(line):
+    # Los números cambian de una página a otra ("Página 3 de 10")
+    return re.sub(r"\d+", "#", re.sub(r"\s+", " ", line.strip().lower()))
+
+
+def _edge_indexes(lines):
+    content = [i for i, line in enumerate(lines) if line.strip()]
+    return set(content[:EDGE_LINES] + content[-EDGE_LINES:])
+
+
+def strip_repeated_lines(pages):
+    """
+    Quita de cada página las cabeceras y pies: líneas del principio o del final
+    que se repiten (salvo los números) en buena parte de las páginas, y los
+    números de página sueltos.
+    """
+    page_lines = [page.split("\n") for page in pages]
+    counts = Counter()
+    for lines in page_lines:
+        counts.update({_line_key(lines[i]) for i in _edge_indexes(lines)})
+    min_pages = max(MIN_REPEATED_PAGES, REPEATED_RATIO * len(pages))
+    repeated = {key for key, count in counts.items() if count >= min_pages}
+
+    cleaned = []
+    for lines in page_lines:
+        edges = _edge_indexes(lines)
+        cleaned.append("\n".join(
+            line for i, line in enumerate(lines)
+            if i not in edges or (_line_key(line) not in repeated and not PAGE_NUMBER_RE.match(line.strip()))
+        ))
+    return cleaned
+
+
+def split_sections(page):
+    """Divide una página por títulos y etiquetas de apartado, uniendo las secciones demasiado cortas."""
+    sections = []
+    current = ""
+    for piece in (label for title in SECTION_RE.split(page) for label in LABEL_RE.split(title)):
+        if not piece.strip():
+            continue
+        # Un apartado largo empieza siempre sección, aunque la anterior sea corta
+        if current and (len(current) >= MIN_SECTION_CHARS or len(piece) >= MIN_SECTION_CHARS):
+            sections.append(current)
+            current = ""
+        current = f"{current}\n{piece}" if current else piece
+    if current.strip():
+        if sections and len(current) < MIN_SECTION_CHARS // 3:
+            sections[-1] = f"{sections[-1]}\n{current}"
+        else:
+            sections.append(current)
+    return sections
+
+
+def score_section(section):
+    """Puntuación de relevancia de una sección para la extracción."""
+    score = sum(weight * len(pattern.findall(section)) for pattern, weight in RELEVANT_PATTERNS)
+    title = section.strip().split("\n", 1)[0]
+    if BOILERPLATE_RE.search(title):
+        score -= BOILERPLATE_PENALTY
+    return score
+
+
+def _select(sections, budget):
+    """Índices de las secciones que se envían: las más densas en información relevante, hasta el presupuesto."""
+    # La primera sección suele tener el nombre de la asignatura, el grado y el departamento
+    selected = {0}
+    used = len(sections[0][1])
+    scores = [score_section(text) for _, text in sections]
+    ranked = sorted(
+        (i for i in range(1, len(sections)) if scores[i] >= settings.LLM_PREFILTER_MIN_SCORE),
+        key=lambda i: scores[i] / max(len(sections[i][1]), MIN_SECTION_CHARS), reverse=True,
+    )
+    for i in ranked:
+        if used + len(sections[i][1]) > budget:
+            continue
+        selected.add(i)
+        used += len(sections[i][1])
+    return selected
+
+
+def prefilter_text(text, page_offsets=None):
+    """
+    Devuelve un PrefilterResult con el texto que se envía al LLM: las secciones
+    más relevantes en su orden original, hasta LLM_PREFILTER_MAX_RATIO del
+    texto. Los textos de menos de LLM_PREFILTER_MIN_CHARS se envían tal cual.
+    """
+    if len(text) <= settings.LLM_PREFILTER_MIN_CHARS:
+        return PrefilterResult(text, list(page_offsets or []), len(text), 1, 1)
+    pages = split_pages(text, page_offsets)
+    if len(pages) > 1:
+        pages = strip_repeated_lines(pages)
+    # (página, texto) de cada sección; las repetidas (índices de diapositivas) una sola vez
+    sections = []
+    seen = set()
+    for number, page in enumerate(pages):
+        for section in split_sections(page):
+            key = re.sub(r"\s+", " ", section.strip())
+            if key not in seen:
+                seen.add(key)
+                sections.append((number, section))
+    if not sections:
+        return PrefilterResult("", [], len(text))
+    budget = max(settings.LLM_PREFILTER_MIN_CHARS, settings.LLM_PREFILTER_MAX_RATIO * len(text))
+    selected = _select(sections, budget)
+
+    kept_pages = {}
+    for i in sorted(selected):
+        number, section = sections[i]
+        kept_pages.setdefault(number, []).append(section)
+    parts = ["\n".join(page_sections) for _, page_sections in sorted(kept_pages.items())]
+    # Mismo separador entre páginas que al extraer el texto del PDF
+    offsets = []
+    position = 0
+    for part in parts:
+        offsets.append(position)
+        position += len(part.encode("utf-8")) + 1
+    return PrefilterResult("\n".join(parts), offsets, len(text), len(sections), len(selected))
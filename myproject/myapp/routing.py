@@ -0,0 +1,110 @@
+import math
+import os
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from django.conf import settings
+from .circuit import CircuitOpenError, get_breaker
+from .pipeline import BACKEND_GEMINI, BACKEND_OLLAMA, MODE_API, MODE_LOCAL, MODE_LOCAL_CHUNKED
+
+# Modo 'auto': elige en cada petición entre el LLM local y Gemini según la
+# longitud del documento, la cola del LLM local y la latencia reciente (p95) de
+# cada modo. El local no cuesta dinero, así que se usa siempre que su estimación
+# quepa en el presupuesto de latencia; si no, el más rápido de los disponibles.
+# Gemini solo se usa para documentos por debajo del límite de coste.
+
+# Mínimo de mediciones de un modo para fiarse de ellas en lugar del valor por defecto
+MIN_SAMPLES = 3
+LATENCY_PERCENTILE = 0.95
+
+
+@dataclass
+class RouteDecision:
+    mode: str
+    reason: str
+    # Segundos estimados para cada modo considerado
+    estimates: dict = field(default_factory=dict)
+
+
+class LatencyTracker:
+    """Duraciones recientes de la extracción por modo, en segundos por cada 1000 caracteres."""
+
+    def __init__(self, window=50):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, mode, chars, seconds):
+        with self._lock:
+            self._samples.setdefault(mode, deque(maxlen=self.window)).append(seconds * 1000 / max(chars, 1000))
+
+    def rate(self, mode, default):
+        with self._lock:
+            samples = sorted(self._samples.get(mode, ()))
+        if len(samples) < MIN_SAMPLES:
+            return default
+        return samples[min(len(samples) - 1, math.ceil(LATENCY_PERCENTILE * len(samples)) - 1)]
+
+    def estimate(self, mode, chars, default):
+        return self.rate(mode, default) * max(chars, 1000) / 1000
+
+    def status(self):
+        with self._lock:
+            modes = list(self._samples)
+        return {mode: {"p95_seconds_per_kchar": self.rate(mode, None)} for mode in modes}
+
+
+_tracker = LatencyTracker()
+
+
+def record_latency(mode, chars, seconds):
+    """Registra la duración de una extracción para las decisiones del modo 'auto'."""
+    _tracker.record(mode, chars, seconds)
+
+
+def latency_status():
+    return _tracker.status()
+
+
+def _available(backend):
+    try:
+        get_breaker(backend).check()
+    except CircuitOpenError:
+        return False
+    return True
+
+
+def _queue_wait(scheduler):
+    """Espera estimada en la cola del LLM local; None si la cola está llena."""
+    if scheduler is None:
+        return 0.0
+    stats = scheduler.stats()
+    if stats["waiting"] >= scheduler.max_queue:
+        return None
+    if not stats["waiting"] and stats["running"] < stats["max_concurrency"]:
+        return 0.0
+    return float(stats["estimated_wait_seconds"])
+
+
+def choose_mode(text_length, scheduler=None):
+    """Elige el modo concreto para una extracción en modo 'auto'."""
+    local_mode = MODE_LOCAL_CHUNKED if text_length > settings.LLM_CHUNK_MAX_CHARS else MODE_LOCAL
+    estimates = {}
+    if _available(BACKEND_OLLAMA):
+        wait = _queue_wait(scheduler)
+        if wait is not None:
+            estimates[local_mode] = wait + _tracker.estimate(
+                local_mode, text_length, settings.LLM_AUTO_LOCAL_SECONDS_PER_KCHAR
+            )
+    if (os.environ.get("GEMINI_API_KEY") and text_length <= settings.LLM_AUTO_API_MAX_CHARS
+            and _available(BACKEND_GEMINI)):
+        estimates[MODE_API] = _tracker.estimate(MODE_API, text_length, settings.LLM_AUTO_API_SECONDS_PER_KCHAR)
+
+    if not estimates:
+        # Sin alternativas se intenta en local; la vista responderá 503 o 429 si no es posible
+        return RouteDecision(local_mode, "ningún backend disponible")
+    if local_mode in estimates and estimates[local_mode] <= settings.LLM_AUTO_LATENCY_BUDGET:
+        return RouteDecision(local_mode, "local dentro del presupuesto de latencia", estimates)
+    mode = min(estimates, key=estimates.get)
+    reason = "el más rápido ahora mismo" if len(estimates) > 1 else "única opción disponible"
+    return RouteDecision(mode, reason, estimates)
@@ -0,0 +1,360 @@
+import math
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+from pathlib import Path
+from django.conf import settings
+
+# Control de admisión delante del LLM local: limita cuántas extracciones usan
+# Ollama a la vez (en todos los procesos) y reparte los huecos entre usuarios de
+# forma equitativa, de modo que quien lanza diez extracciones no deja sin turno
+# al resto. Entre usuarios igual de servidos se da el hueco a las extracciones
+# cuyo modelo ya está cargado en Ollama, para agrupar las que usan el mismo y
+# evitar cambios de modelo. Si la cola está llena se rechaza con un tiempo de
+# espera estimado. Las extracciones que lanzan varias peticiones a la vez
+# (fragmentos, secciones) piden varios huecos y reciben los que quedan libres
+# sin quitárselos a quien espera, así Ollama nunca atiende más de
+# max_concurrency peticiones en total.
+# El estado se guarda en un SQLite propio, como la caché de respuestas.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_ticket (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    models TEXT NOT NULL DEFAULT '',
+    slots INTEGER NOT NULL DEFAULT 1,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS llm_user_turn (
+    user_id TEXT PRIMARY KEY,
+    last_started REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS llm_model_turn (
+    model TEXT PRIMARY KEY,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS llm_scheduler_stats (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+STATE_WAITING = 'waiting'
+STATE_RUNNING = 'running'
+# Tiempo de servicio que se supone mientras no hay extracciones terminadas
+DEFAULT_SERVICE_SECONDS = 60.0
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after, message="Hay demasiadas extracciones en cola"):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.message = message
+
+
+def fair_order(waiting, running_per_user, last_started=None, resident=None):
+    """
+    Ordena los tickets en espera por turnos entre usuarios: cada vez pasa el
+    usuario con menos extracciones en curso (contando las ya asignadas); a
+    igualdad, el que tiene una extracción con un modelo ya cargado (los ids de
+    `resident`), después el que hace más tiempo que no empieza una
+    (`last_started`) y, si no, el que lleva más tiempo esperando. De cada
+    usuario pasan antes sus extracciones con modelo cargado. `waiting` es
+    [(id, usuario)] en orden de llegada.
+    """
+    last_started = last_started or {}
+    resident = resident or set()
+    queues = {}
+    for ticket_id, user_id in waiting:
+        queues.setdefault(user_id, []).append(ticket_id)
+    load = {user_id: running_per_user.get(user_id, 0) for user_id in queues}
+
+    def head(user):
+        return next((ticket_id for ticket_id in queues[user] if ticket_id in resident), queues[user][0])
+
+    order = []
+    while queues:
+        user_id = min(queues, key=lambda user: (
+            load[user], head(user) not in resident, last_started.get(user, 0), queues[user][0]
+        ))
+        ticket_id = head(user_id)
+        queues[user_id].remove(ticket_id)
+        order.append(ticket_id)
+        load[user_id] += 1
+        if not queues[user_id]:
+            del queues[user_id]
+    return order
+
+
+class LLMScheduler:
+    def __init__(self, path, max_concurrency=2, max_queue=20, max_queue_per_user=3,
+                 lease_seconds=1800, stale_seconds=30, resident_models=1):
+        self.path = str(path)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        # Una extracción en curso que no termina en este tiempo libera su hueco
+        self.lease_seconds = lease_seconds
+        # Un ticket en espera que deja de consultar su turno se da por abandonado
+        self.stale_seconds = stale_seconds
+        # Modelos que Ollama mantiene cargados a la vez (OLLAMA_MAX_LOADED_MODELS)
+        self.resident_models = resident_models
+        with closing(self._connect()) as conn, conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(llm_ticket)")]
+            if 'models' not in columns: # Archivos creados antes de agrupar por modelo
+                conn.execute("ALTER TABLE llm_ticket ADD COLUMN models TEXT NOT NULL DEFAULT ''")
+            if 'slots' not in columns: # Archivos creados antes de las peticiones en paralelo
+                conn.execute("ALTER TABLE llm_ticket ADD COLUMN slots INTEGER NOT NULL DEFAULT 1")
+
+    def _connect(self):
+        # Sin transacciones implícitas: se abren explícitamente en _transaction
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE: las decisiones de admisión se toman de una en una
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def _add_stat(self, conn, name, amount=1):
+        conn.execute(
+            "INSERT INTO llm_scheduler_stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+
+    def _purge(self, conn, now):
+        conn.execute("DELETE FROM llm_ticket WHERE state = ? AND heartbeat < ?", (STATE_WAITING, now - self.stale_seconds))
+        conn.execute("DELETE FROM llm_ticket WHERE state = ? AND heartbeat < ?", (STATE_RUNNING, now - self.lease_seconds))
+        conn.execute("DELETE FROM llm_user_turn WHERE last_started < ?", (now - self.lease_seconds,))
+
+    def _queue(self, conn):
+        waiting = conn.execute(
+            "SELECT id, user_id FROM llm_ticket WHERE state = ? ORDER BY id", (STATE_WAITING,)
+        ).fetchall()
+        running_per_user = dict(conn.execute(
+            "SELECT user_id, SUM(slots) FROM llm_ticket WHERE state = ? GROUP BY user_id", (STATE_RUNNING,)
+        ).fetchall())
+        last_started = dict(conn.execute("SELECT user_id, last_started FROM llm_user_turn").fetchall())
+        return waiting, running_per_user, last_started
+
+    def _resident_tickets(self, conn):
+        """Tickets en espera cuyo primer modelo está (previsiblemente) cargado en Ollama."""
+        resident = {model for (model,) in conn.execute(
+            "SELECT model FROM llm_model_turn ORDER BY last_used DESC LIMIT ?", (self.resident_models,)
+        )}
+        return {
+            ticket_id for ticket_id, models in conn.execute(
+                "SELECT id, models FROM llm_ticket WHERE state = ?", (STATE_WAITING,)
+            ) if models and models.split(',')[0] in resident
+        }
+
+    def _retry_after(self, conn, queued):
+        stats = dict(conn.execute("SELECT name, value FROM llm_scheduler_stats").fetchall())
+        completed = stats.get('completed', 0)
+        service = stats.get('service_seconds', 0) / completed if completed else DEFAULT_SERVICE_SECONDS
+        return max(1, math.ceil(service * (queued + 1) / max(self.max_concurrency, 1)))
+
+    def _rejection(self, conn, user_id, now):
+        """Segundos de espera estimados si la cola no admite al usuario; None si lo admite."""
+        self._purge(conn, now)
+        waiting, _, _ = self._queue(conn)
+        user_waiting = sum(1 for _, owner in waiting if owner == user_id)
+        if len(waiting) >= self.max_queue or user_waiting >= self.max_queue_per_user:
+            self._add_stat(conn, 'rejected')
+            return self._retry_after(conn, len(waiting))
+        return None
+
+    def check_capacity(self, user_id):
+        """Lanza QueueFull si ahora mismo no se aceptaría una extracción del usuario."""
+        with self._transaction() as conn:
+            retry_after = self._rejection(conn, str(user_id), time.time())
+        if retry_after is not None:
+            raise QueueFull(retry_after)
+
+    def enqueue(self, user_id, models=(), slots=1):
+        """
+        Pone en cola una extracción del usuario y devuelve el id del ticket.
+        `models` son los modelos que usará, en orden de carga, y `slots` cuántas
+        peticiones quiere enviar a la vez (recibe entre 1 y ese número).
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            retry_after = self._rejection(conn, str(user_id), now)
+            if retry_after is None:
+                ticket_id = conn.execute(
+                    "INSERT INTO llm_ticket (user_id, state, models, slots, enqueued_at, heartbeat) VALUES (?, ?, ?, ?, ?, ?)",
+                    (str(user_id), STATE_WAITING, ",".join(models), max(1, slots), now, now)
+                ).lastrowid
+        if retry_after is not None:
+            raise QueueFull(retry_after)
+        return ticket_id
+
+    def try_start(self, ticket_id):
+        """
+        Devuelve None si el ticket puede empezar (y lo marca en curso) o su
+        posición en la cola (1 = el siguiente). Lanza KeyError si el ticket ya
+        no existe (caducado por no consultar su turno).
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT state, enqueued_at, models, slots FROM llm_ticket WHERE id = ?", (ticket_id,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(ticket_id)
+            if row[0] == STATE_RUNNING:
+                return None
+            conn.execute("UPDATE llm_ticket SET heartbeat = ? WHERE id = ?", (now, ticket_id))
+            self._purge(conn, now)
+            waiting, running_per_user, last_started = self._queue(conn)
+            order = fair_order(waiting, running_per_user, last_started, self._resident_tickets(conn))
+            free = self.max_concurrency - sum(running_per_user.values())
+            position = order.index(ticket_id)
+            if position >= free:
+                return position - max(free, 0) + 1
+            # Los huecos libres que no hacen falta para los demás tickets en espera
+            granted = max(1, min(row[3], free - (len(waiting) - 1)))
+            conn.execute(
+                "UPDATE llm_ticket SET state = ?, slots = ?, started_at = ?, heartbeat = ? WHERE id = ?",
+                (STATE_RUNNING, granted, now, now, ticket_id)
+            )
+            conn.execute(
+                "INSERT INTO llm_user_turn (user_id, last_started) VALUES ((SELECT user_id FROM llm_ticket WHERE id = ?), ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET last_started = excluded.last_started",
+                (ticket_id, now)
+            )
+            self._touch_models(conn, row[2], now)
+            self._add_stat(conn, 'admitted')
+            self._add_stat(conn, 'wait_seconds', now - row[1])
+            return None
+
+    def _touch_models(self, conn, models, now):
+        # El último modelo de la extracción es el que queda cargado más recientemente
+        for index, model in enumerate(filter(None, models.split(','))):
+            conn.execute(
+                "INSERT INTO llm_model_turn (model, last_used) VALUES (?, ?) "
+                "ON CONFLICT(model) DO UPDATE SET last_used = excluded.last_used",
+                (model, now + index * 1e-6)
+            )
+
+    def granted_slots(self, ticket_id):
+        """Peticiones a la vez que puede enviar un ticket ya en curso."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT slots FROM llm_ticket WHERE id = ? AND state = ?", (ticket_id, STATE_RUNNING)
+            ).fetchone()
+        return row[0] if row else 1
+
+    def finish(self, ticket_id):
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT state, started_at, models FROM llm_ticket WHERE id = ?", (ticket_id,)).fetchone()
+            conn.execute("DELETE FROM llm_ticket WHERE id = ?", (ticket_id,))
+            if row is not None and row[0] == STATE_RUNNING:
+                self._touch_models(conn, row[2], now)
+                self._add_stat(conn, 'completed')
+                self._add_stat(conn, 'service_seconds', now - row[1])
+
+    def wait_iter(self, ticket_id, timeout=None, poll_interval=None):
+        """
+        Espera el turno del ticket generando su posición en la cola en cada
+        consulta. Si se agota el timeout, cancela el ticket y lanza QueueFull.
+        """
+        timeout = settings.LLM_QUEUE_TIMEOUT if timeout is None else timeout
+        poll_interval = settings.LLM_QUEUE_POLL_INTERVAL if poll_interval is None else poll_interval
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                position = self.try_start(ticket_id)
+            except KeyError:
+                position = 0 # Caducado: se trata como un tiempo de espera agotado
+            if position is None:
+                return
+            if not position or time.monotonic() >= deadline:
+                self.finish(ticket_id)
+                with self._transaction() as conn:
+                    self._add_stat(conn, 'timed_out')
+                    retry_after = self._retry_after(conn, position)
+                raise QueueFull(retry_after, "Se agotó el tiempo de espera en la cola")
+            yield position
+            time.sleep(poll_interval)
+
+    def stats(self):
+        now = time.time()
+        with self._transaction() as conn:
+            self._purge(conn, now)
+            waiting, running_per_user, _ = self._queue(conn)
+            counters = dict(conn.execute("SELECT name, value FROM llm_scheduler_stats").fetchall())
+            retry_after = self._retry_after(conn, len(waiting))
+        admitted = counters.get('admitted', 0)
+        waiting_per_user = {}
+        for _, user_id in waiting:
+            waiting_per_user[user_id] = waiting_per_user.get(user_id, 0) + 1
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": sum(running_per_user.values()),
+            "waiting": len(waiting),
+            "running_per_user": running_per_user,
+            "waiting_per_user": waiting_per_user,
+            "admitted": int(admitted),
+            "rejected": int(counters.get('rejected', 0)),
+            "timed_out": int(counters.get('timed_out', 0)),
+            "avg_wait_seconds": counters.get('wait_seconds', 0) / admitted if admitted else 0.0,
+            "estimated_wait_seconds": retry_after,
+        }
+
+
+@contextmanager
+def llm_slot(user_id, scheduler, models=(), slots=1):
+    """
+    Espera hasta `slots` huecos para usar el LLM, devuelve cuántos se han
+    concedido y los libera al terminar (o lanza QueueFull). Con scheduler=None
+    se ejecuta sin pasar por la cola y devuelve None.
+    """
+    if scheduler is None:
+        yield None
+        return
+    ticket_id = scheduler.enqueue(user_id, models, slots)
+    try:
+        for _ in scheduler.wait_iter(ticket_id):
+            pass
+        yield scheduler.granted_slots(ticket_id)
+    finally:
+        scheduler.finish(ticket_id)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Planificador compartido por el proceso; None si LLM_MAX_CONCURRENCY es 0."""
+    global _scheduler
+    if not settings.LLM_MAX_CONCURRENCY:
+        return None
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler(
+                    settings.LLM_SCHEDULER_PATH,
+                    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+                    max_queue=settings.LLM_QUEUE_MAX,
+                    max_queue_per_user=settings.LLM_QUEUE_MAX_PER_USER,
+                    lease_seconds=settings.LLM_SLOT_LEASE_SECONDS,
+                    resident_models=settings.LLM_RESIDENT_MODELS,
+                )
+    return _scheduler
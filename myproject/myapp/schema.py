@@ -0,0 +1,192 @@
+import json
+import threading
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Registro de los esquemas de los datos que se extraen de una guía docente. Cada
+# esquema se deriva de una plantilla JSON (JSON_utilizar.json) y se carga una vez
+# por proceso al arrancar la aplicación (MyappConfig.ready): guarda la estructura
+# ya serializada para los prompts, el JSON Schema para Ollama y un validador que
+# normaliza la salida del LLM antes de guardarla en UploadedFile.extracted_data.
+
+DEFAULT_SCHEMA = "guia_docente"
+SCHEMA_TEMPLATES = {
+    DEFAULT_SCHEMA: "myapp/files/json/JSON_utilizar.json",
+}
+# Campos de texto que también admiten un objeto con la estructura del primer
+# elemento de otra lista de la plantilla: el horario de tutorías de un profesor
+# puede venir como texto o como un horario (ProcessExtractedDataView acepta ambos)
+TEXT_OR_OBJECT_FIELDS = {
+    "profesores[].horario": "horarios",
+}
+
+
+class SchemaValidationError(Exception):
+    def __init__(self, errors):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+def schema_from_template(template):
+    """
+    Convierte una plantilla de ejemplo en un JSON Schema: los objetos exigen
+    todas sus claves, las listas toman el esquema de su primer elemento y los
+    valores de texto se declaran como cadenas.
+    """
+    if isinstance(template, dict):
+        return {
+            "type": "object",
+            "properties": {key: schema_from_template(value) for key, value in template.items()},
+            "required": list(template),
+            "additionalProperties": False,
+        }
+    if isinstance(template, list):
+        return {"type": "array", "items": schema_from_template(template[0]) if template else {}}
+    if isinstance(template, bool):
+        return {"type": "boolean"}
+    if isinstance(template, (int, float)):
+        return {"type": "number"}
+    return {"type": "string"}
+
+
+def _compile_object(template, path, alternatives):
+    fields = [
+        (key, _compile(value, f"{path}.{key}" if path else key, alternatives)) for key, value in template.items()
+    ]
+
+    def coerce(value, errors):
+        if value is None:
+            value = {}
+        if not isinstance(value, dict):
+            errors.append(f"{path or 'raíz'}: se esperaba un objeto")
+            return None
+        # Las claves que no están en la plantilla se descartan
+        return {key: coerce_field(value.get(key), errors) for key, coerce_field in fields}
+    return coerce
+
+
+def _compile_list(template, path, alternatives):
+    coerce_item = _compile(template[0], f"{path}[]", alternatives) if template else (lambda value, errors: value)
+
+    def coerce(value, errors):
+        if value is None:
+            return []
+        if isinstance(value, dict):
+            value = [value] # Un único elemento sin la lista alrededor
+        if not isinstance(value, list):
+            errors.append(f"{path}: se esperaba una lista")
+            return None
+        return [coerce_item(item, errors) for item in value]
+    return coerce
+
+
+def _compile_string(path):
+    def coerce(value, errors):
+        if value is None:
+            return ""
+        if isinstance(value, str):
+            return value.strip()
+        if isinstance(value, (int, float)):
+            return str(value)
+        errors.append(f"{path}: se esperaba un texto")
+        return None
+    return coerce
+
+
+def _compile_string_or_object(path, object_template, alternatives):
+    coerce_string = _compile_string(path)
+    coerce_object = _compile_object(object_template, path, alternatives)
+
+    def coerce(value, errors):
+        if isinstance(value, dict):
+            return coerce_object(value, errors)
+        return coerce_string(value, errors)
+    return coerce
+
+
+def _compile(template, path="", alternatives=None):
+    """
+    Compila la plantilla en una función coerce(valor, errores) -> valor normalizado.
+    `alternatives` asigna a algunas rutas de texto la plantilla de objeto que también admiten.
+    """
+    alternatives = alternatives or {}
+    if isinstance(template, dict):
+        return _compile_object(template, path, alternatives)
+    if isinstance(template, list):
+        return _compile_list(template, path, alternatives)
+    if path in alternatives:
+        return _compile_string_or_object(path, alternatives[path], alternatives)
+    return _compile_string(path)
+
+
+class ExtractionSchema:
+    def __init__(self, template):
+        self.template = template
+        # Estructura que se incluye en los prompts
+        self.structure = json.dumps(template, ensure_ascii=False)
+        self.json_schema = schema_from_template(template)
+        alternatives = {
+            path: template[key][0] for path, key in TEXT_OR_OBJECT_FIELDS.items()
+            if isinstance(template.get(key), list) and template[key] and isinstance(template[key][0], dict)
+        }
+        self._coerce = _compile(template, alternatives=alternatives)
+
+    def json_schema_without(self, *keys):
+        """JSON Schema sin algunos campos de primer nivel (los que se obtienen por otra vía)."""
+        return {
+            **self.json_schema,
+            "properties": {k: v for k, v in self.json_schema["properties"].items() if k not in keys},
+            "required": [k for k in self.json_schema["required"] if k not in keys],
+        }
+
+    def json_schema_only(self, *keys):
+        """JSON Schema con solo algunos campos de primer nivel (una sección del esquema)."""
+        return {
+            **self.json_schema,
+            "properties": {k: v for k, v in self.json_schema["properties"].items() if k in keys},
+            "required": [k for k in self.json_schema["required"] if k in keys],
+        }
+
+    def validate(self, data):
+        """
+        Normaliza los datos según la plantilla: rellena los campos que faltan,
+        descarta los que sobran y convierte los tipos compatibles. Acepta un
+        objeto o una lista de objetos; si algo no se puede convertir lanza
+        SchemaValidationError con la lista de errores.
+        """
+        errors = []
+        if isinstance(data, list):
+            normalized = [self._coerce(item, errors) for item in data]
+        else:
+            normalized = self._coerce(data, errors)
+        if errors:
+            raise SchemaValidationError(errors)
+        return normalized
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def load_schemas():
+    """Carga todas las plantillas de SCHEMA_TEMPLATES en el registro."""
+    schemas = {}
+    for name, path in SCHEMA_TEMPLATES.items():
+        try:
+            with open(settings.BASE_DIR / path, "r", encoding="utf-8") as archivo:
+                schemas[name] = ExtractionSchema(json.load(archivo))
+        except (OSError, ValueError) as e:
+            raise ImproperlyConfigured(f"No se pudo cargar el esquema '{name}' desde {path}: {e}")
+    with _registry_lock:
+        _registry.update(schemas)
+
+
+def get_schema(name=DEFAULT_SCHEMA):
+    if name not in _registry:
+        load_schemas()
+    return _registry[name]
+
+
+def extraction_schema():
+    """JSON Schema de JSON_utilizar.json, para el `format` de Ollama."""
+    return get_schema().json_schema
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError: # Windows: solo se coordinan los hilos del mismo proceso
+    fcntl = None
+
+# "Single-flight" de extracciones: si llegan varias peticiones para el mismo
+# archivo y configuración (doble clic, dos pestañas, varios workers de gunicorn),
+# solo la primera ejecuta el pipeline; el resto espera a que termine y reutiliza
+# su resultado de la caché. Se coordina entre procesos con un lock de archivo,
+# que se borra al liberarlo para no acumular uno por cada extracción.
+
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+class SingleFlight:
+    """Lock exclusivo por clave, no bloqueante: try_acquire() y release()."""
+
+    def __init__(self, key, lock_dir=None):
+        self.key = key
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        self.path = Path(lock_dir or settings.EXTRACTION_LOCK_DIR) / f"{digest}.lock"
+        self._fd = None
+        with _local_locks_guard:
+            # Lock por clave entre los hilos del proceso (el único disponible sin fcntl)
+            self._thread_lock = _local_locks.setdefault(digest, threading.Lock())
+        self.held = False
+
+    def try_acquire(self):
+        if self.held:
+            return True
+        if not self._thread_lock.acquire(blocking=False):
+            return False
+        if fcntl is not None:
+            try:
+                fd = self._lock_file()
+            except OSError:
+                self._thread_lock.release()
+                raise
+            if fd is None:
+                self._thread_lock.release()
+                return False
+            self._fd = fd
+        self.held = True
+        return True
+
+    def _lock_file(self):
+        """Abre y bloquea el archivo de la clave; None si lo tiene otro proceso."""
+        while True:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return None
+            # Si quien lo tenía lo borró al liberarlo, este archivo ya no es el lock: se abre de nuevo
+            try:
+                current = os.stat(self.path).st_ino == os.fstat(fd).st_ino
+            except FileNotFoundError:
+                current = False
+            if current:
+                return fd
+            os.close(fd)
+
+    def wait_iter(self, timeout=None, poll_interval=None):
+        """
+        Intenta tomar el lock hasta conseguirlo o agotar el timeout, generando un
+        valor en cada espera (para enviar keep-alives mientras tanto).
+        """
+        timeout = settings.EXTRACTION_LOCK_TIMEOUT if timeout is None else timeout
+        poll_interval = settings.EXTRACTION_LOCK_POLL_INTERVAL if poll_interval is None else poll_interval
+        deadline = time.monotonic() + timeout
+        while not self.try_acquire() and time.monotonic() < deadline:
+            yield
+            time.sleep(poll_interval)
+
+    def release(self):
+        if not self.held:
+            return
+        if self._fd is not None:
+            # Se borra antes de soltarlo: quien lo tenga abierto esperando verá que ya no es el lock
+            self.path.unlink(missing_ok=True)
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self.held = False
+        self._thread_lock.release()
+
+
+def extraction_key(file_obj, content_hash, variant):
+    # Por contenido: dos archivos idénticos comparten resultado en la caché
+    return f"{content_hash or f'file-{file_obj.id}'}:{variant}"
+
+
+@contextmanager
+def single_flight(key, timeout=None, poll_interval=None):
+    """
+    Espera a tener el lock de la clave y devuelve si ha tenido que esperar (es
+    decir, si otra petición ha hecho el trabajo mientras tanto). Pasado el
+    timeout se continúa sin el lock para no bloquear la petición indefinidamente.
+    """
+    lock = SingleFlight(key)
+    waited = False
+    for _ in lock.wait_iter(timeout, poll_interval):
+        waited = True
+    try:
+        yield waited
+    finally:
+        lock.release()
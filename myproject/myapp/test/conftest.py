@@ -0,0 +1,14 @@
+import pytest
+from myapp.routing import LatencyTracker
+
+
+@pytest.fixture(autouse=True)
+def isolated_ollama_client(settings, tmp_path, monkeypatch):
+    """Cada test crea su propio cliente de Ollama con una caché de respuestas vacía."""
+    settings.LLM_CACHE_PATH = tmp_path / "llm_cache.sqlite3"
+    settings.EXTRACTION_LOCK_DIR = tmp_path / "locks"
+    settings.LLM_SCHEDULER_PATH = tmp_path / "llm_scheduler.sqlite3"
+    monkeypatch.setattr('myapp.llm._client', None)
+    monkeypatch.setattr('myapp.scheduler._scheduler', None)
+    monkeypatch.setattr('myapp.circuit._breakers', {})
+    monkeypatch.setattr('myapp.routing._tracker', LatencyTracker())
@@ -0,0 +1,77 @@
+from django.conf import settings
+
+from archivos.extraction import extract_text_to_file
+from myapp.chunking import merge_partial_results, split_into_chunks, split_pages
+
+SAMPLE_PDF = settings.BASE_DIR / "myapp/files/pdf/ProyectoDocente-VC-24-25.pdf"
+
+
+def test_split_pages_uses_byte_offsets():
+    text = "Página uno\nPágina dos\n\nPágina cuatro"
+    data = text.encode('utf-8')
+    offsets = [0, data.index(b"P\xc3\xa1gina dos"), data.index(b"\n\n") + 1, data.index(b"\n\n") + 2]
+    assert split_pages(text, offsets) == ["Página uno\n", "Página dos\n", "Página cuatro"]
+
+
+def test_chunks_respect_size_and_keep_all_text(tmp_path):
+    """Con una guía real, ningún fragmento supera el máximo y no se pierde texto."""
+    text_path = tmp_path / "guia.txt"
+    offsets = extract_text_to_file(SAMPLE_PDF, '.pdf', text_path)
+    text = text_path.read_text(encoding='utf-8')
+
+    chunks = split_into_chunks(text, 2000, offsets)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 2000 for chunk in chunks)
+    assert "".join(text.split()) == "".join("".join(chunks).split())
+
+
+def test_oversized_page_is_split_on_sections():
+    page = "1. PRESENTACIÓN\n" + "a" * 50 + "\n2. EVALUACIÓN\n" + "b" * 50
+    assert split_into_chunks(page, 80) == ["1. PRESENTACIÓN\n" + "a" * 50, "2. EVALUACIÓN\n" + "b" * 50]
+
+
+def test_merge_partial_results():
+    partials = [
+        {
+            "asignatura": {"nombre": "Visión por Computador", "grado": "(nombre del grado al que pertenece)"},
+            "fechas": [{"titulo": "Examen parcial", "fecha": "2025-03-20"}],
+            "profesores": [{"nombre": "Ana Pérez", "despacho": "", "enlace": "", "horario": ""}],
+        },
+        {
+            "asignatura": {"nombre": "Otra", "grado": "Grado en Ingeniería Informática", "condiciones_aprobado": ""},
+            "fechas": [
+                {"titulo": "examen  parcial", "fecha": "2025-03-20"},
+                {"titulo": "Examen final", "fecha": "2025-06-20"},
+            ],
+            "horarios": [{"grupo": "", "tipo": "", "dia": "", "hora": "", "aula": ""}],
+            "profesores": [{"nombre": "ana pérez", "despacho": "F1.23", "enlace": "", "horario": ""}],
+        },
+        "no es un objeto",
+    ]
+    merged = merge_partial_results(partials)
+    assert merged["asignatura"] == {
+        "nombre": "Visión por Computador",
+        "grado": "Grado en Ingeniería Informática",
+        "departamento": "",
+        "universidad": "",
+        "condiciones_aprobado": "",
+    }
+    assert [f["titulo"] for f in merged["fechas"]] == ["Examen parcial", "Examen final"]
+    assert merged["horarios"] == []
+    assert merged["profesores"] == [{"nombre": "Ana Pérez", "despacho": "F1.23", "enlace": "", "horario": ""}]
+
+
+def test_merge_follows_the_schema_template():
+    """Las secciones y sus campos salen de la plantilla del esquema, no de una lista fija."""
+    template = {
+        "curso": {"codigo": "(código)", "creditos": "(créditos)"},
+        "examenes": [{"fecha": "(fecha)", "aula": "(aula)"}],
+    }
+    partials = [
+        {"curso": {"codigo": "2050"}, "examenes": [{"fecha": "2025-06-20", "aula": ""}]},
+        {"curso": {"codigo": "otro", "creditos": "6"}, "examenes": [{"fecha": "2025-06-20", "aula": "A1.10"}]},
+    ]
+    assert merge_partial_results(partials, template) == {
+        "curso": {"codigo": "2050", "creditos": "6"},
+        "examenes": [{"fecha": "2025-06-20", "aula": ""}, {"fecha": "2025-06-20", "aula": "A1.10"}],
+    }
@@ -0,0 +1,57 @@
+from myapp.dates import extract_dates, merge_dates
+
+
+def test_spanish_formats_are_normalized_to_iso():
+    text = (
+        "Fechas de exámenes:\n"
+        "Final (primera convocatoria): 13 de Junio de 2025.\n"
+        "Entrega de la práctica: 18/03/25\n"
+        "Control de teoría (2024-12-19)\n"
+    )
+    assert extract_dates(text) == [
+        {"titulo": "Final (primera convocatoria)", "fecha": "2025-06-13"},
+        {"titulo": "Entrega de la práctica", "fecha": "2025-03-18"},
+        {"titulo": "Control de teoría", "fecha": "2024-12-19"},
+    ]
+
+
+def test_ranges_and_years_from_the_academic_year():
+    text = (
+        "Curso 2024-25\n"
+        "Semana del 3 al 7 de marzo: presentaciones\n"
+        "Los exámenes parciales serán los días 15 de octubre y 2 de abril.\n"
+    )
+    assert extract_dates(text) == [
+        {"titulo": "presentaciones (inicio)", "fecha": "2025-03-03"},
+        {"titulo": "presentaciones (fin)", "fecha": "2025-03-07"},
+        {"titulo": "exámenes parciales", "fecha": "2024-10-15"},
+        {"titulo": "Examen parcial", "fecha": "2025-04-02"},
+    ]
+
+
+def test_ignores_invalid_dates_and_isbn_like_numbers():
+    assert extract_dates("ISBN: 978-1-78216-436-4, aula 10:40-12:30, 31 de febrero de 2025") == []
+
+
+def test_merge_keeps_llm_dates_for_missing_days():
+    rules = [{"titulo": "Final", "fecha": "2025-06-13"}]
+    llm = [{"titulo": "Examen final", "fecha": "2025-06-13"}, {"titulo": "Entrega", "fecha": "2025-05-01"}]
+    assert merge_dates(rules, llm) == rules + [llm[1]]
+
+
+def test_mar_abbreviation_needs_a_year():
+    text = (
+        "Curso 2024-2025\n"
+        "Grupo 3 mar y montaña\n"
+        "Entrega: 18 mar. 2025\n"
+    )
+    assert extract_dates(text) == [{"titulo": "Entrega", "fecha": "2025-03-18"}]
+
+
+def test_missing_year_comes_from_the_document():
+    # Sin curso académico ni años en el texto no se inventa el año actual
+    assert extract_dates("Examen parcial: 15 de octubre") == []
+    assert extract_dates("Guía docente 2023/24\nExamen parcial: 15 de octubre\nFinal: 4 de junio") == [
+        {"titulo": "Examen parcial", "fecha": "2023-10-15"},
+        {"titulo": "Final", "fecha": "2024-06-04"},
+    ]
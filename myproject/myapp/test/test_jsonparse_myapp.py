@@ -0,0 +1,45 @@
+import pytest
+
+from myapp.jsonparse import IncrementalJSONParser, JSONParseError, parse_json
+
+
+def test_tolerates_fences_trailing_commas_and_unquoted_keys():
+    text = '```json\n{asignatura: {"nombre": "Álgebra",}, "fechas": [{"fecha": "2025-06-20"},],}\n```'
+    assert parse_json(text) == {"asignatura": {"nombre": "Álgebra"}, "fechas": [{"fecha": "2025-06-20"}]}
+
+
+def test_single_quotes_keep_apostrophes_in_text():
+    text = "{'nombre': 'Història de l'Art', \"aula\": \"Aula d'Informàtica\", 'creditos': 6, 'optativa': True}"
+    assert parse_json(text) == {
+        "nombre": "Història de l'Art", "aula": "Aula d'Informàtica", "creditos": 6, "optativa": True
+    }
+
+
+def test_escapes_and_text_after_the_json():
+    assert parse_json('Aquí está: {"a": "l\\u00ednea\\n\\"b\\""} Espero que sirva.') == {"a": "línea\n\"b\""}
+
+
+def test_incremental_feed_and_snapshot():
+    text = '{"fechas": [{"titulo": "Examen final", "fecha": "2025-06-20"}, {"titulo": "Entrega"}]}'
+    parser = IncrementalJSONParser()
+    parser.feed(text[:53])
+    assert parser.snapshot() == {"fechas": [{"titulo": "Examen final", "fecha": "2025"}]}
+    for char in text[53:]:
+        parser.feed(char)
+    assert parser.done
+    assert parser.finish() == parse_json(text)
+
+
+def test_truncated_output_is_recovered_only_with_partial():
+    text = '{"asignatura": {"nombre": "Algebra"}, "fechas": [{"titulo": "Final", "fecha": "2025-06-2'
+    with pytest.raises(JSONParseError):
+        parse_json(text)
+    assert parse_json(text, partial=True) == {
+        "asignatura": {"nombre": "Algebra"}, "fechas": [{"titulo": "Final", "fecha": "2025-06-2"}]
+    }
+
+
+@pytest.mark.parametrize("text", ["sin json", '{"a" 1}', '{"a": 1]', '{"a": fecha}'])
+def test_invalid_output_raises(text):
+    with pytest.raises(JSONParseError):
+        parse_json(text)
@@ -0,0 +1,305 @@
+import pytest
+import requests
+from io import StringIO
+from unittest.mock import patch, MagicMock
+from django.core.management import call_command
+
+from myapp.circuit import CircuitBreaker, CircuitOpenError, guarded
+from myapp.llm import BackendPool, OllamaClient, OllamaError
+from myapp.llm_cache import LLMResponseCache
+
+
+def http_response(status_code, data=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = data or {}
+    if status_code >= 400:
+        response.raise_for_status.side_effect = requests.HTTPError(f"{status_code}")
+    else:
+        response.raise_for_status.return_value = None
+    return response
+
+
+@pytest.fixture
+def client():
+    return OllamaClient("http://ollama:11434/", connect_timeout=2, read_timeout=30, max_retries=2, retry_backoff=0.1)
+
+
+@patch('myapp.llm.time.sleep')
+def test_generate_retries_transient_errors(mock_sleep, client):
+    metrics = []
+    client.add_metrics_hook(metrics.append)
+    with patch.object(client.session, 'post') as mock_post:
+        mock_post.side_effect = [
+            requests.ConnectionError("reset"),
+            http_response(503),
+            http_response(200, {"response": "hola", "prompt_eval_count": 12, "eval_count": 3}),
+        ]
+        assert client.generate("gemma2:9b", "prompt") == "hola"
+
+    assert mock_post.call_count == 3
+    url = mock_post.call_args.args[0]
+    assert url == "http://ollama:11434/api/generate"
+    assert mock_post.call_args.kwargs["timeout"] == (2, 30)
+    assert mock_post.call_args.kwargs["json"] == {"model": "gemma2:9b", "prompt": "prompt", "stream": False}
+    assert mock_sleep.call_count == 2
+    assert all(0 <= call.args[0] <= 0.1 * 2 ** i for i, call in enumerate(mock_sleep.call_args_list))
+
+    [call_metrics] = metrics
+    assert call_metrics.ok and call_metrics.attempts == 3
+    assert call_metrics.model == "gemma2:9b"
+    assert (call_metrics.prompt_tokens, call_metrics.completion_tokens) == (12, 3)
+
+
+@patch('myapp.llm.time.sleep')
+def test_generate_gives_up_after_max_retries(mock_sleep, client):
+    metrics = []
+    client.add_metrics_hook(metrics.append)
+    with patch.object(client.session, 'post', side_effect=requests.Timeout("lento")) as mock_post:
+        with pytest.raises(OllamaError):
+            client.generate("gemma2:9b", "prompt")
+    assert mock_post.call_count == 3
+    assert metrics[0].ok is False and metrics[0].attempts == 3
+
+
+def test_client_errors_are_not_retried(client):
+    with patch.object(client.session, 'post', return_value=http_response(404)) as mock_post:
+        with pytest.raises(OllamaError):
+            client.generate("modelo-inexistente", "prompt")
+    assert mock_post.call_count == 1
+
+
+def test_failing_metrics_hook_does_not_break_call(client):
+    def broken_hook(metrics):
+        raise RuntimeError("hook roto")
+    client.add_metrics_hook(broken_hook)
+    with patch.object(client.session, 'post', return_value=http_response(200, {"response": "ok"})):
+        assert client.generate("gemma2:9b", "prompt") == "ok"
+
+
+@pytest.fixture
+def response_cache(tmp_path):
+    return LLMResponseCache(tmp_path / "llm_cache.sqlite3", max_entries=100, ttl_seconds=3600, seed=7)
+
+
+def test_cache_reuses_response_and_pins_generation(client, response_cache):
+    client.cache = response_cache
+    metrics = []
+    client.add_metrics_hook(metrics.append)
+    with patch.object(client.session, 'post', return_value=http_response(200, {"response": "resumen"})) as mock_post:
+        assert client.generate("gemma2:9b", "prompt", prompt_version=1) == "resumen"
+        assert client.generate("gemma2:9b", "prompt", prompt_version=1) == "resumen"
+        # Otra versión del prompt u otro modelo no comparten entrada
+        client.generate("gemma2:9b", "prompt", prompt_version=2)
+        client.generate("llama3.1:8b", "prompt", prompt_version=1)
+
+    assert mock_post.call_count == 3
+    assert mock_post.call_args_list[0].kwargs["json"]["options"] == {"temperature": 0, "seed": 7}
+    assert [m.cached for m in metrics] == [False, True, False, False]
+    assert response_cache.stats() == {"entries": 3, "hits": 1, "misses": 3, "hit_rate": 0.25}
+
+
+def test_cache_bypass_regenerates_and_updates_entry(client, response_cache):
+    client.cache = response_cache
+    with patch.object(client.session, 'post') as mock_post:
+        mock_post.side_effect = [http_response(200, {"response": "viejo"}), http_response(200, {"response": "nuevo"})]
+        client.generate("gemma2:9b", "prompt")
+        assert client.generate("gemma2:9b", "prompt", use_cache=False) == "nuevo"
+        assert client.generate("gemma2:9b", "prompt") == "nuevo"
+    assert mock_post.call_count == 2
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = LLMResponseCache(tmp_path / "lru.sqlite3", max_entries=2, ttl_seconds=None)
+    with patch('myapp.llm_cache.time.time', side_effect=[1, 2, 3, 4]):
+        cache.set("a", "m", 1, "A")
+        cache.set("b", "m", 1, "B")
+        assert cache.get("a") == "A" # "a" pasa a ser la más reciente
+        cache.set("c", "m", 1, "C")
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+
+
+def test_cache_entries_expire(tmp_path):
+    cache = LLMResponseCache(tmp_path / "ttl.sqlite3", ttl_seconds=60)
+    with patch('myapp.llm_cache.time.time', return_value=1000):
+        cache.set("a", "m", 1, "A")
+    with patch('myapp.llm_cache.time.time', return_value=1030):
+        assert cache.get("a") == "A"
+    with patch('myapp.llm_cache.time.time', return_value=1061):
+        assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.django_db
+def test_llm_cache_command_reports_and_clears(settings, tmp_path):
+    cache = LLMResponseCache(settings.LLM_CACHE_PATH)
+    cache.set("a", "m", 1, "A")
+    cache.get("a")
+    out = StringIO()
+    call_command('llm_cache', stdout=out)
+    assert "Entradas: 1, aciertos: 1, fallos: 0" in out.getvalue()
+    call_command('llm_cache', '--clear', stdout=StringIO())
+    assert cache.stats()["entries"] == 0
+
+
+def test_generate_stream_yields_tokens_and_caches_full_text(client, response_cache):
+    client.cache = response_cache
+    stream_response = http_response(200)
+    stream_response.iter_lines.return_value = iter([
+        b'{"response": "Ho", "done": false}',
+        b'',
+        b'{"response": "la", "done": false}',
+        b'{"response": "", "done": true, "eval_count": 2}',
+    ])
+    with patch.object(client.session, 'post', return_value=stream_response) as mock_post:
+        assert list(client.generate_stream("gemma2:9b", "prompt")) == ["Ho", "la"]
+        # La segunda vez sale de la caché en un único fragmento
+        assert list(client.generate_stream("gemma2:9b", "prompt")) == ["Hola"]
+    assert mock_post.call_count == 1
+    assert mock_post.call_args.kwargs["stream"] is True
+    assert mock_post.call_args.kwargs["json"]["stream"] is True
+    stream_response.close.assert_called()
+
+
+def test_generate_stream_reports_ollama_error(client):
+    stream_response = http_response(200)
+    stream_response.iter_lines.return_value = iter([b'{"error": "modelo no encontrado"}'])
+    with patch.object(client.session, 'post', return_value=stream_response):
+        with pytest.raises(OllamaError, match="modelo no encontrado"):
+            list(client.generate_stream("gemma2:9b", "prompt"))
+
+
+def test_keep_alive_is_sent_but_not_part_of_cache_key(client, response_cache):
+    client.cache = response_cache
+    client.keep_alive = "30m"
+    with patch.object(client.session, 'post', return_value=http_response(200, {"response": "hola"})) as mock_post:
+        client.generate("gemma2:9b", "prompt")
+        assert mock_post.call_args.kwargs["json"]["keep_alive"] == "30m"
+        client.keep_alive = -1
+        assert client.generate("gemma2:9b", "prompt") == "hola"
+    assert mock_post.call_count == 1
+
+
+def test_warm_up_loads_models_and_reports_failures(settings):
+    settings.OLLAMA_KEEP_ALIVE = -1
+    settings.OLLAMA_WARMUP_MODELS = ["gemma2:9b", "llama3.1:8b"]
+    ps_response = http_response(200, {"models": [{"name": "gemma2:9b"}]})
+    with patch('myapp.llm.requests.Session.post') as mock_post, \
+            patch('myapp.llm.requests.Session.get', return_value=ps_response):
+        mock_post.side_effect = [http_response(200, {"done": True}), http_response(404)]
+        out = StringIO()
+        call_command('llm_warmup', stdout=out)
+
+    assert [call.kwargs["json"] for call in mock_post.call_args_list] == [
+        {"model": "gemma2:9b", "keep_alive": -1}, {"model": "llama3.1:8b", "keep_alive": -1}
+    ]
+    assert "No se pudieron cargar: llama3.1:8b" in out.getvalue()
+    assert "Modelos cargados en Ollama: gemma2:9b" in out.getvalue()
+
+
+def test_pool_routes_to_least_loaded_backend_with_model_affinity():
+    pool = BackendPool(["http://a:11434", "http://b:11434", "http://c:11434"])
+    a, b, c = pool.backends
+    a.latency, b.latency, c.latency = 2.0, 1.0, 1.0
+    c.last_model = "llama3.1:8b"
+
+    assert pool.acquire("llama3.1:8b") is c
+    # Con una llamada en curso en c, b espera menos aunque a ya tenga el modelo
+    assert pool.acquire("gemma2:9b") is b
+    assert pool.acquire("gemma2:9b") is a
+    assert [backend.in_flight for backend in pool.backends] == [1, 1, 1]
+    pool.release(a, ok=True, duration=1.0, model="gemma2:9b")
+    assert a.in_flight == 0 and a.latency == pytest.approx(1.7)
+
+
+def test_client_fails_over_and_ejects_failing_backend():
+    client = OllamaClient(["http://a:11434", "http://b:11434"], max_retries=2, retry_backoff=0)
+    client.backends.failure_threshold = 1
+    metrics = []
+    client.add_metrics_hook(metrics.append)
+
+    def post(url, **kwargs):
+        if url.startswith("http://a"):
+            raise requests.ConnectionError("caído")
+        return http_response(200, {"response": "hola"})
+
+    with patch.object(client.session, 'post', side_effect=post) as mock_post:
+        assert client.generate("gemma2:9b", "prompt") == "hola"
+        assert client.generate("gemma2:9b", "otro") == "hola"
+    # El primer intento va a a, falla y se reintenta en b; después a queda expulsado
+    assert [call.args[0] for call in mock_post.call_args_list] == [
+        "http://a:11434/api/generate", "http://b:11434/api/generate", "http://b:11434/api/generate"
+    ]
+    assert metrics[0].backend == "http://b:11434" and metrics[0].attempts == 2
+    status = {backend["url"]: backend for backend in client.backends.status()}
+    assert not status["http://a:11434"]["healthy"] and status["http://b:11434"]["healthy"]
+    assert status["http://b:11434"]["in_flight"] == 0
+
+    # Cuando vuelve a responder a la comprobación de salud, a recibe llamadas otra vez
+    with patch.object(client.session, 'get', return_value=http_response(200, {"version": "0.5.0"})):
+        client.backends.check_health(client.session, timeout=1)
+    assert all(backend["healthy"] for backend in client.backends.status())
+
+
+def test_circuit_opens_after_failures_and_half_opens_to_probe():
+    breaker = CircuitBreaker("ollama", failure_threshold=2, reset_seconds=30)
+
+    def failing():
+        raise OllamaError("caído")
+        yield
+
+    for _ in range(2):
+        with pytest.raises(OllamaError):
+            list(guarded(breaker, failing()))
+    with pytest.raises(CircuitOpenError) as excinfo:
+        list(guarded(breaker, iter(["hola"])))
+    assert excinfo.value.retry_after == 30
+    assert breaker.status()["state"] == "open"
+
+    # Pasado el tiempo de espera solo se deja pasar una llamada de prueba
+    breaker.opened_at -= 30
+    probe = guarded(breaker, iter(["hola"]))
+    assert next(probe) == "hola"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert list(probe) == []
+    assert breaker.status()["state"] == "closed"
+
+
+def test_circuit_opens_on_high_latency_percentile():
+    breaker = CircuitBreaker("gemini", latency_seconds=10, latency_percentile=0.9, window=10)
+    for duration in [1] * 8 + [20]:
+        breaker.record_success(duration)
+    assert breaker.status()["state"] == "closed"
+    breaker.record_success(20)
+    assert breaker.status() == {"state": "open", "failures": 0, "reason": "latencia", "retry_after": 30}
+
+
+def test_request_errors_do_not_open_the_circuit():
+    breaker = CircuitBreaker("ollama", failure_threshold=1)
+
+    def not_found():
+        raise OllamaError("modelo no encontrado", status_code=404)
+        yield
+
+    with pytest.raises(OllamaError):
+        list(guarded(breaker, not_found(), lambda e: e.is_backend_failure))
+    assert breaker.status()["state"] == "closed"
+
+
+def test_warmup_only_starts_from_web_server_entrypoint(settings):
+    from django.apps import apps
+    from myapp.llm import start_warmup_thread
+    settings.OLLAMA_WARMUP_ON_STARTUP = True
+    settings.OLLAMA_WARMUP_MODELS = ["gemma2:9b"]
+    with patch('myapp.llm.warm_up_models') as mock_warm_up:
+        # Cargar las apps (migrate, el worker...) no precarga los modelos
+        apps.get_app_config('myapp').ready()
+        assert not mock_warm_up.called
+        start_warmup_thread().join()
+    mock_warm_up.assert_called_once_with()
+
+    settings.OLLAMA_WARMUP_ON_STARTUP = False
+    assert start_warmup_thread() is None
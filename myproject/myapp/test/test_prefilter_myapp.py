@@ -0,0 +1,47 @@
+import pytest
+from django.conf import settings
+
+from archivos.extraction import extract_text_to_file
+from myapp.chunking import split_pages
+from myapp.dates import extract_dates
+from myapp.prefilter import EMAIL_RE, SHORT_DATE_RE, prefilter_text, score_section, strip_repeated_lines
+
+SAMPLE_PDFS = sorted((settings.BASE_DIR / "myapp/files/pdf").glob("*.pdf"))
+
+
+@pytest.mark.parametrize("pdf", SAMPLE_PDFS, ids=lambda path: path.name)
+def test_sample_guides_keep_every_date_and_contact(pdf, tmp_path):
+    """Con las guías de ejemplo el texto se reduce sin perder fechas ni correos de profesores."""
+    text_path = tmp_path / "guia.txt"
+    offsets = extract_text_to_file(pdf, '.pdf', text_path)
+    text = text_path.read_text(encoding='utf-8')
+
+    result = prefilter_text(text, offsets)
+    assert result.kept_chars < result.original_chars
+    assert result.kept_chars <= max(settings.LLM_PREFILTER_MIN_CHARS, settings.LLM_PREFILTER_MAX_RATIO * len(text))
+    assert {d["fecha"] for d in extract_dates(result.text)} == {d["fecha"] for d in extract_dates(text)}
+    for pattern in (SHORT_DATE_RE, EMAIL_RE):
+        assert set(pattern.findall(result.text)) == set(pattern.findall(text))
+    # Los offsets del texto filtrado siguen separando sus páginas
+    assert "".join(split_pages(result.text, result.page_offsets)) == result.text
+
+
+def test_repeated_headers_and_page_numbers_are_removed():
+    contents = ["Presentación", "Temario", "Evaluación", "Calendario"]
+    pages = [
+        f"Universidad de Sevilla - Guía docente\n{content}\nPágina {n} de 4" for n, content in enumerate(contents, 1)
+    ]
+    assert strip_repeated_lines(pages) == contents
+
+
+def test_dates_and_schedules_outscore_boilerplate():
+    bibliografia = "BIBLIOGRAFÍA\nL.V. Ahlfors, Complex Analysis, McGraw-Hill, New York, 1979."
+    examenes = "FECHAS DE EXÁMENES\nPrimer parcial: 20 de marzo de 2025, aula A1.10, de 9:00 a 11:00"
+    assert score_section(examenes) > settings.LLM_PREFILTER_MIN_SCORE > score_section(bibliografia)
+
+
+def test_short_texts_are_sent_unchanged():
+    text = "Asignatura corta\nExamen final: 13 de junio de 2025"
+    result = prefilter_text(text, [0])
+    assert result.text == text
+    assert result.page_offsets == [0]
@@ -0,0 +1,57 @@
+import pytest
+
+from myapp.circuit import get_breaker
+from myapp.routing import choose_mode, record_latency
+from myapp.scheduler import LLMScheduler
+
+
+@pytest.fixture
+def routing_settings(settings, monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "clave")
+    settings.LLM_CHUNK_MAX_CHARS = 12000
+    settings.LLM_AUTO_LATENCY_BUDGET = 60
+    settings.LLM_AUTO_API_MAX_CHARS = 50000
+    settings.LLM_AUTO_LOCAL_SECONDS_PER_KCHAR = 5
+    settings.LLM_AUTO_API_SECONDS_PER_KCHAR = 1
+    return settings
+
+
+def test_local_is_preferred_within_latency_budget(routing_settings):
+    decision = choose_mode(4000)
+    assert decision.mode == "local"
+    assert decision.estimates == {"local": 20, "api": 4}
+    # Los documentos largos van por fragmentos
+    assert choose_mode(20000).mode == "api"
+    routing_settings.LLM_AUTO_API_MAX_CHARS = 10000
+    assert choose_mode(20000).mode == "local_chunked"
+
+
+def test_recent_latency_and_queue_depth_move_work_to_the_api(routing_settings, tmp_path):
+    for _ in range(3):
+        record_latency("local", 4000, 400) # p95 de 100 s por cada 1000 caracteres
+    assert choose_mode(4000).mode == "api"
+
+    # Cuando el local vuelve a ir rápido, las mediciones lentas salen de la ventana
+    for _ in range(50):
+        record_latency("local", 4000, 20)
+    assert choose_mode(4000).mode == "local"
+
+    scheduler = LLMScheduler(tmp_path / "scheduler.sqlite3", max_concurrency=1, max_queue=5)
+    scheduler.try_start(scheduler.enqueue("a"))
+    for user in "bcd":
+        scheduler.enqueue(user)
+    decision = choose_mode(4000, scheduler)
+    assert decision.mode == "api" and decision.estimates["local"] > 60
+
+
+def test_unavailable_backends_are_skipped(routing_settings, monkeypatch):
+    routing_settings.LLM_AUTO_LATENCY_BUDGET = 1
+    for _ in range(routing_settings.LLM_BREAKER_FAILURE_THRESHOLD):
+        get_breaker("gemini").record_failure()
+    assert choose_mode(4000).mode == "local"
+
+    monkeypatch.delenv("GEMINI_API_KEY")
+    for _ in range(routing_settings.LLM_BREAKER_FAILURE_THRESHOLD):
+        get_breaker("ollama").record_failure()
+    decision = choose_mode(4000)
+    assert decision.mode == "local" and decision.reason == "ningún backend disponible"
@@ -0,0 +1,104 @@
+import pytest
+
+from myapp.scheduler import LLMScheduler, QueueFull, fair_order
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    return LLMScheduler(tmp_path / "scheduler.sqlite3", max_concurrency=1, max_queue=4, max_queue_per_user=3)
+
+
+def test_fair_order_alternates_users():
+    waiting = [(1, "a"), (2, "a"), (3, "a"), (4, "b"), (5, "c")]
+    # "a" ya tiene una extracción en curso, así que "b" y "c" pasan antes
+    assert fair_order(waiting, {"a": 1}) == [4, 5, 1, 2, 3]
+    assert fair_order(waiting, {}) == [1, 4, 5, 2, 3]
+    # Sin nada en curso, pasa antes quien hace más tiempo que no tiene turno
+    assert fair_order(waiting, {}, {"a": 20.0, "b": 10.0}) == [5, 4, 1, 2, 3]
+
+
+def test_heavy_user_does_not_starve_others(scheduler):
+    heavy = [scheduler.enqueue("a") for _ in range(3)]
+    assert scheduler.try_start(heavy[0]) is None
+    light = scheduler.enqueue("b")
+
+    # Con el hueco ocupado, la petición de "b" es la siguiente aunque llegó la última
+    assert scheduler.try_start(light) == 1
+    assert scheduler.try_start(heavy[1]) == 2
+    scheduler.finish(heavy[0])
+    # Queda un hueco libre, pero es para "b": "a" acaba de tener su turno
+    assert scheduler.try_start(heavy[1]) == 1
+    assert scheduler.try_start(light) is None
+
+    stats = scheduler.stats()
+    assert stats["running"] == 1 and stats["waiting"] == 2
+    assert stats["waiting_per_user"] == {"a": 2}
+
+
+def test_full_queue_is_rejected_with_retry_after(scheduler):
+    for _ in range(3):
+        scheduler.enqueue("a")
+    with pytest.raises(QueueFull):
+        scheduler.enqueue("a") # Máximo por usuario
+    scheduler.enqueue("b")
+    with pytest.raises(QueueFull) as excinfo:
+        scheduler.check_capacity("c") # Máximo total
+    assert excinfo.value.retry_after >= 1
+    assert scheduler.stats()["rejected"] == 2
+
+
+def test_wait_iter_times_out_and_frees_the_ticket(scheduler):
+    running = scheduler.enqueue("a")
+    assert scheduler.try_start(running) is None
+    waiting = scheduler.enqueue("b")
+    with pytest.raises(QueueFull):
+        list(scheduler.wait_iter(waiting, timeout=0, poll_interval=0))
+    assert scheduler.stats()["waiting"] == 0
+
+
+def test_fair_order_prefers_loaded_models_between_equal_users():
+    waiting = [(1, "a"), (2, "a"), (3, "b")]
+    # "a" adelanta su extracción con el modelo cargado a la que llegó antes
+    assert fair_order(waiting, {}, resident={2, 3}) == [2, 3, 1]
+    assert fair_order(waiting, {}, resident={3}) == [3, 1, 2]
+    # La carga de cada usuario sigue mandando sobre el modelo
+    assert fair_order(waiting, {"b": 1}, resident={3}) == [1, 3, 2]
+
+
+def test_free_slot_goes_to_the_loaded_model(scheduler):
+    first = scheduler.enqueue("a", ["llama3.1:8b"])
+    assert scheduler.try_start(first) is None
+    gemma = scheduler.enqueue("b", ["gemma2:9b"])
+    llama = scheduler.enqueue("c", ["llama3.1:8b"])
+    scheduler.finish(first)
+
+    # "c" llegó después, pero su modelo sigue cargado y "b" obligaría a cambiarlo
+    assert scheduler.try_start(gemma) == 1
+    assert scheduler.try_start(llama) is None
+
+
+def test_parallel_extraction_only_gets_the_free_slots(tmp_path):
+    scheduler = LLMScheduler(tmp_path / "scheduler.sqlite3", max_concurrency=3)
+    other = scheduler.enqueue("a")
+    assert scheduler.try_start(other) is None
+    chunked = scheduler.enqueue("b", slots=4)
+    assert scheduler.try_start(chunked) is None
+    # Pide 4 peticiones a la vez pero solo quedaban 2 huecos
+    assert scheduler.granted_slots(chunked) == 2
+    assert scheduler.stats()["running"] == 3
+
+    # Con la cola llena de huecos, una extracción más espera su turno
+    waiting = scheduler.enqueue("c")
+    assert scheduler.try_start(waiting) == 1
+    scheduler.finish(other)
+    assert scheduler.try_start(waiting) is None
+    assert scheduler.stats()["running"] == 3
+
+
+def test_parallel_extraction_leaves_slots_for_waiting_tickets(tmp_path):
+    scheduler = LLMScheduler(tmp_path / "scheduler.sqlite3", max_concurrency=4)
+    chunked = scheduler.enqueue("a", slots=4)
+    other = scheduler.enqueue("b")
+    assert scheduler.try_start(chunked) is None
+    assert scheduler.granted_slots(chunked) == 3
+    assert scheduler.try_start(other) is None
@@ -0,0 +1,50 @@
+import pytest
+
+from myapp.schema import SchemaValidationError, extraction_schema, get_schema, schema_from_template
+
+
+def test_schema_from_template_requires_every_key():
+    schema = schema_from_template({"asignatura": {"nombre": "(nombre)"}, "fechas": [{"fecha": "(fecha)"}]})
+    assert schema["required"] == ["asignatura", "fechas"]
+    assert schema["properties"]["asignatura"]["properties"]["nombre"] == {"type": "string"}
+    assert schema["properties"]["fechas"]["type"] == "array"
+    assert schema["properties"]["fechas"]["items"]["required"] == ["fecha"]
+
+
+def test_extraction_schema_matches_json_utilizar():
+    schema = extraction_schema()
+    assert schema["required"] == ["asignatura", "fechas", "horarios", "profesores"]
+    assert schema["properties"]["profesores"]["items"]["required"] == ["nombre", "despacho", "enlace", "horario"]
+
+
+def test_validate_accepts_list_of_objects_and_reports_every_error():
+    schema = get_schema()
+    normalized = schema.validate([{"asignatura": {"nombre": "A"}}, {"fechas": [{"titulo": 1}]}])
+    assert normalized[0]["asignatura"]["nombre"] == "A"
+    assert normalized[1]["fechas"] == [{"titulo": "1", "fecha": ""}]
+
+    with pytest.raises(SchemaValidationError) as excinfo:
+        schema.validate({"asignatura": [], "horarios": [{"dia": {}}], "profesores": ["Ana"]})
+    assert excinfo.value.errors == [
+        "asignatura: se esperaba un objeto",
+        "horarios[].dia: se esperaba un texto",
+        "profesores[]: se esperaba un objeto",
+    ]
+
+
+def test_professor_horario_accepts_text_or_schedule_object():
+    """El horario de tutorías puede ser un texto o un objeto con la forma de un horario."""
+    schema = get_schema()
+    horario = {"grupo": "", "tipo": "tutoria", "hora": "16-17", "aula": "D1", "dia": "Martes", "extra": "x"}
+    normalized = schema.validate({"profesores": [
+        {"nombre": "Prof. Gauss", "horario": horario},
+        {"nombre": "Prof. Euler", "horario": " Lunes 10-12 "},
+    ]})
+    assert normalized["profesores"][0]["horario"] == {
+        "grupo": "", "tipo": "tutoria", "dia": "Martes", "hora": "16-17", "aula": "D1"
+    }
+    assert normalized["profesores"][1]["horario"] == "Lunes 10-12"
+
+    with pytest.raises(SchemaValidationError) as excinfo:
+        schema.validate({"profesores": [{"horario": {"dia": []}}]})
+    assert excinfo.value.errors == ["profesores[].horario.dia: se esperaba un texto"]
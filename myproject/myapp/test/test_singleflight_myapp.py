@@ -0,0 +1,69 @@
+import multiprocessing
+import os
+from unittest.mock import patch
+
+from myapp.singleflight import SingleFlight
+
+
+def _try_lock_in_child(lock_dir, queue):
+    lock = SingleFlight("guia:local", lock_dir=lock_dir)
+    queue.put(lock.try_acquire())
+    lock.release()
+
+
+def test_lock_excludes_other_holders_until_released(tmp_path):
+    first = SingleFlight("guia:local", lock_dir=tmp_path)
+    second = SingleFlight("guia:local", lock_dir=tmp_path)
+    other_key = SingleFlight("guia:api", lock_dir=tmp_path)
+
+    assert first.try_acquire()
+    assert not second.try_acquire()
+    assert other_key.try_acquire()
+    first.release()
+    assert second.try_acquire()
+    second.release()
+    other_key.release()
+
+
+def test_lock_is_shared_between_processes(tmp_path):
+    holder = SingleFlight("guia:local", lock_dir=tmp_path)
+    assert holder.try_acquire()
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    child = context.Process(target=_try_lock_in_child, args=(str(tmp_path), queue))
+    child.start()
+    child.join(10)
+    assert queue.get(timeout=5) is False
+    holder.release()
+
+
+def test_lock_file_is_removed_on_release(tmp_path):
+    first = SingleFlight("guia:local", lock_dir=tmp_path)
+    waiting = SingleFlight("guia:local", lock_dir=tmp_path)
+    assert first.try_acquire()
+    assert not waiting.try_acquire()
+    first.release()
+    assert list(tmp_path.iterdir()) == []
+
+    # El lock se puede volver a tomar y se vuelve a borrar
+    assert waiting.try_acquire()
+    assert [path.name for path in tmp_path.iterdir()] == [waiting.path.name]
+    waiting.release()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_waiter_holding_a_removed_lock_file_opens_it_again(tmp_path):
+    """Quien abrió el archivo antes de que se borrara no se queda con un lock que ya no excluye a nadie."""
+    holder = SingleFlight("guia:local", lock_dir=tmp_path)
+    assert holder.try_acquire()
+    stale_fd = os.open(holder.path, os.O_RDWR)
+    holder.release()
+
+    opened = [stale_fd]
+    real_open = os.open
+    waiting = SingleFlight("guia:local", lock_dir=tmp_path)
+    with patch('myapp.singleflight.os.open', side_effect=lambda *args: opened.pop() if opened else real_open(*args)):
+        assert waiting.try_acquire()
+    assert os.fstat(waiting._fd).st_ino == os.stat(waiting.path).st_ino
+    assert not SingleFlight("guia:local", lock_dir=tmp_path).try_acquire()
+    waiting.release()
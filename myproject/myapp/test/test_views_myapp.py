@@ -1,11 +1,15 @@
 import pytest
 import json
+import requests
+import threading
+import time
 from unittest.mock import patch, MagicMock, mock_open as mock_open_lib
 from datetime import date, datetime, timedelta
 
 from django.urls import reverse
 from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.base import ContentFile
 from django.conf import settings
 from rest_framework.test import APIClient
 from rest_framework import status
@@ -13,7 +17,12 @@ from rest_framework import status
 
 # Tus modelos y los necesarios
 from myapp.models import Asignatura, Horario, Profesores, Fechas
-from archivos.models import UploadedFile # Ajusta la ruta si es necesario
+from archivos.models import UploadedFile, CachedExtraction # Ajusta la ruta si es necesario
+from archivos.content_cache import ensure_content_hash, store_cached_data
+from myapp.pipeline import iter_pipeline_events
+from myapp.routing import latency_status
+from myapp.scheduler import get_scheduler
+from myapp.singleflight import SingleFlight, extraction_key
 from allauth.socialaccount.models import SocialToken, SocialApp
 
 
@@ -197,6 +206,616 @@ class TestGetUserCalendarDataView:
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
 
 
+# -----------------------------------
+# Tests para ExtractDatesView
+# -----------------------------------
+def ollama_response(text):
+    """Respuesta simulada de la API /api/generate de Ollama."""
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = {"response": text}
+    mock_response.raise_for_status.return_value = None
+    return mock_response
+
+
+@pytest.fixture
+def file_with_text_in_media(db, test_user, settings, tmp_path):
+    """UploadedFile con su .txt guardado de verdad en un MEDIA_ROOT temporal."""
+    settings.MEDIA_ROOT = str(tmp_path)
+    uploaded_obj = UploadedFile.objects.create(
+        user=test_user,
+        file=SimpleUploadedFile("original.pdf", b"pdfcontent")
+    )
+    uploaded_obj.text_file.save("original.txt", ContentFile("Contenido de prueba para la asignatura X.".encode('utf-8')))
+    return uploaded_obj
+
+
+@pytest.mark.django_db
+class TestExtractDatesView:
+
+    @patch('myapp.llm.requests.Session.post')
+    def test_local_pipeline_stores_result_in_shared_cache(self, mock_post, authenticated_client, file_with_text_in_media):
+        """El resultado se guarda en el archivo y en la caché por contenido."""
+        mock_post.side_effect = [
+            ollama_response("Resumen de la asignatura"),
+            ollama_response('{"asignatura": {"nombre": "Algebra"}, "fechas": []}'),
+        ]
+        url = reverse('api_extract_dates', kwargs={'file_id': file_with_text_in_media.id})
+        response = authenticated_client.post(url, {}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["asignatura"]["nombre"] == "Algebra"
+        assert mock_post.call_count == 2
+        file_with_text_in_media.refresh_from_db()
+        assert file_with_text_in_media.content_hash is not None
+        assert CachedExtraction.objects.filter(content_hash=file_with_text_in_media.content_hash).count() == 1
+
+    @patch('myapp.llm.requests.Session.post')
+    def test_identical_file_reuses_cached_result(self, mock_post, authenticated_client, file_with_text_in_media, test_user):
+        """Otro archivo con el mismo contenido no vuelve a llamar al LLM."""
+        twin = UploadedFile.objects.create(
+            user=test_user,
+            file=SimpleUploadedFile("copia.pdf", b"pdfcontent"),
+        )
+        twin.text_file.name = file_with_text_in_media.text_file.name
+        twin.save()
+        cached = {"asignatura": {"nombre": "Cacheada"}}
+        CachedExtraction.objects.create(
+            content_hash=ensure_content_hash(file_with_text_in_media),
+            variant="local:gemma2:9b:gemma2:9b:v1:prefiltro_v1",
+            data=cached,
+        )
+
+        url = reverse('api_extract_dates', kwargs={'file_id': twin.id})
+        response = authenticated_client.post(url, {}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == cached
+        mock_post.assert_not_called()
+        twin.refresh_from_db()
+        assert twin.extracted_data == cached
+
+    @patch('myapp.llm.requests.Session.post')
+    def test_force_refresh_skips_cache(self, mock_post, authenticated_client, file_with_text_in_media):
+        CachedExtraction.objects.create(
+            content_hash=ensure_content_hash(file_with_text_in_media),
+            variant="local:gemma2:9b:gemma2:9b:v1:prefiltro_v1",
+            data={"viejo": True},
+        )
+        mock_post.side_effect = [
+            ollama_response("Resumen"),
+            ollama_response('{"asignatura": {"nombre": "Nueva"}}'),
+        ]
+        url = reverse('api_extract_dates', kwargs={'file_id': file_with_text_in_media.id})
+        response = authenticated_client.post(url, {"force_refresh": True}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["asignatura"]["nombre"] == "Nueva"
+        assert CachedExtraction.objects.get().data == response.data
+
+    @patch('myapp.llm.requests.Session.post')
+    def test_local_chunked_merges_partial_results(self, mock_post, authenticated_client, file_with_text_in_media, settings):
+        """Cada página va en su propio fragmento; los JSON parciales se fusionan."""
+        settings.LLM_CHUNK_MAX_CHARS = 60
+        pages = [
+            "Guía docente de Algebra Lineal. Grado en Matemáticas.\n",
+            "Examen parcial el 20 de marzo de 2025.\n",
+            "Examen final el 20 de junio de 2025.\n",
+        ]
+        text = "".join(pages).encode('utf-8')
+        offsets = [0, len(pages[0].encode('utf-8')), len((pages[0] + pages[1]).encode('utf-8'))]
+        file_with_text_in_media.text_file.save("largo.txt", ContentFile(text))
+        file_with_text_in_media.text_page_offsets = offsets
+        file_with_text_in_media.save()
+
+        def fake_ollama(url, json, **kwargs):
+            prompt = json["prompt"]
+            if "Algebra" in prompt:
+                return ollama_response('{"asignatura": {"nombre": "Algebra Lineal", "grado": "Matemáticas"}, "fechas": []}')
+            if "parcial" in prompt:
+                return ollama_response('{"asignatura": {"nombre": ""}, "fechas": [{"titulo": "Examen parcial", "fecha": "2025-03-20"}]}')
+            return ollama_response('{"fechas": [{"titulo": "Examen final", "fecha": "2025-06-20"}]}')
+        mock_post.side_effect = fake_ollama
+
+        url = reverse('api_extract_dates', kwargs={'file_id': file_with_text_in_media.id})
+        response = authenticated_client.post(url, {"model_mode": "local_chunked"}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert mock_post.call_count == 3
+        assert response.data["asignatura"]["nombre"] == "Algebra Lineal"
+        assert [f["fecha"] for f in response.data["fechas"]] == ["2025-03-20", "2025-06-20"]
+        assert CachedExtraction.objects.get().variant == "local_chunked:gemma2:9b:60:v1:prefiltro_v1"
+        assert 'X-Extraction-Incomplete' not in response
+
+    @patch('myapp.llm.requests.Session.post')
+    def test_local_chunked_sends_at_most_the_granted_slots(self, mock_post, authenticated_client, file_with_text_in_media, settings):
+        """Los fragmentos en paralelo no superan LLM_MAX_CONCURRENCY peticiones a Ollama."""
+        settings.LLM_MAX_CONCURRENCY = 2
+        settings.LLM_CHUNK_CONCURRENCY = 4
+        settings.LLM_CHUNK_MAX_CHARS = 60
+        pages = [f"Examen parcial {n} el {n} de marzo de 2025.\n" for n in range(1, 9)]
+        file_with_text_in_media.text_file.save("largo.txt", ContentFile("".join(pages).encode('utf-8')))
+        file_with_text_in_media.text_page_offsets = [len("".join(pages[:n]).encode('utf-8')) for n in range(len(pages))]
+        file_with_text_in_media.save()
+
+        active = []
+        peak = []
+        guard = threading.Lock()
+
+        def fake_ollama(url, json, **kwargs):
+            with guard:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with guard:
+                active.pop()
+            return ollama_response('{"fechas": []}')
+        mock_post.side_effect = fake_ollama
+
+        url = reverse('api_extract_dates', kwargs={'file_id': file_with_text_in_media.id})
+        response = authenticated_client.post(url, {"model_mode": "local_chunked"}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert mock_post.call_count == len(pages)
+        assert max(peak) == settings.LLM_MAX_CONCURRENCY
+
+    @patch('myapp.llm.requests.Session.post')
+    def test_local_chunked_with_failed_chunk_is_not_cached(self, mock_post, authenticated_client, file_with_text_in_media, settings):
+        """Si falla un fragmento el resultado parcial se devuelve marcado como incompleto y no se cachea."""
+        settings.LLM_CHUNK_MAX_CHARS = 60
+        pages = ["Guía docente de Algebra Lineal.\n", "Examen final el 20 de junio de 2025.\n"]
+        file_with_text_in_media.text_file.save("largo.txt", ContentFile("".join(pages).encode('utf-8')))
+        file_with_text_in_media.text_page_offsets = [0, len(pages[0].encode('utf-8'))]
+        file_with_text_in_media.save()
+
+        def fake_ollama(url, json, **kwargs):
+            if "Algebra" in json["prompt"]:
+                return ollama_response('{"asignatura": {"nombre": "Algebra Lineal"}}')
+            return ollama_response('{"fechas": [{"titulo": "Examen final"')
+        mock_post.side_effect = fake_ollama
+
+        url = reverse('api_extract_dates', kwargs={'file_id': file_with_text_in_media.id})
+        response = authenticated_client.post(url, {"model_mode": "local_chunked"}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['X-Extraction-Incomplete'] == "1"
+        assert response.data["asignatura"]["nombre"] == "Algebra Lineal"
+        assert CachedExtraction.objects.count() == 0
+        file_with_text_in_media.refresh_from_db()
+        assert file_with_text_in_media.extracted_data == response.data
+
+    @patch('myapp.llm.requests.Session.post')
+    def test_local_structured_makes_single_schema_constrained_call(self, mock_post, authenticated_client, file_with_text_in_media):
+        """Una sola llamada con el esquema como `format`; la salida no se repara."""
+        extracted = {
+            "asignatura": {
+                "nombre": "Historia de l'Art", "grado": "", "departamento": "", "universidad": "", "condiciones_aprobado": ""
+            },
+            "fechas": [], "horarios": [], "profesores": [],
+        }
+        mock_post.return_value = ollama_response(json.dumps(extracted, ensure_ascii=False))
+
+        url = reverse('api_extract_dates', kwargs={'file_id': file_with_text_in_media.id})
+        response = authenticated_client.post(url, {"model_mode": "local_structured"}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == extracted
+        assert mock_post.call_count == 1
+        payload = mock_post.call_args.kwargs["json"]
+        assert payload["format"]["required"] == ["asignatura", "fechas", "horarios", "profesores"]
+        assert CachedExtraction.objects.get().variant == "local_structured:gemma2:9b:v1:prefiltro_v1"
+
+    @patch('myapp.llm.requests.Session.post')
+    def test_retry_reuses_cached_summary(self, mock_post, authenticated_client, file_with_text_in_media):
+        """Si falla la etapa JSON, el reintento no vuelve a generar el resumen."""
+        mock_post.side_effect = [
+            ollama_response("Resumen de la asignatura"),
+            ollama_response("esto no es JSON"),
+            ollama_response('{"asignatura": {"nombre": "Algebra"}}'),
+        ]
+        url = reverse('api_extract_dates', kwargs={'file_id': file_with_text_in_media.id})
+        first = authenticated_client.post(url, {}, format='json')
+        assert first.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+
+        second = authenticated_client.post(url, {}, format='json')
+        assert second.status_code == status.HTTP_200_OK
+        assert second.data["asignatura"]["nombre"] == "Algebra"
+        assert mock_post.call_count == 3
+        assert mock_post.call_args.kwargs["json"]["options"]["temperature"] == 0
+
+    @patch('myapp.llm.requests.Session.post')
+    def test_concurrent_request_waits_and_reuses_result(self, mock_post, authenticated_client, file_with_text_in_media):
+        """Mientras otra petición extrae el mismo archivo, se espera y se usa su resultado."""
+        content_hash = ensure_content_hash(file_with_text_in_media)
+        variant = "local:gemma2:9b:gemma2:9b:v1:prefiltro_v1"
+        holder = SingleFlight(extraction_key(file_with_text_in_media, content_hash, variant))
+        assert holder.try_acquire()
+        other_result = {"asignatura": {"nombre": "De la otra petición"}}
+
+        def other_request_finishes(seconds):
+            store_cached_data(content_hash, variant, other_result)
+            holder.release()
+
+        url = reverse('api_extract_dates', kwargs={'file_id': file_with_text_in_media.id})
+        with patch('myapp.singleflight.time.sleep', side_effect=other_request_finishes):
+            response = authenticated_client.post(url, {"force_refresh": True}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == other_result
+        mock_post.assert_not_called()
+        file_with_text_in_media.refresh_from_db()
+        assert file_with_text_in_media.extracted_data == other_result
+
+    @patch('myapp.llm.requests.Session.post')
+    def test_auto_mode_routes_and_reports_the_chosen_mode(self, mock_post, authenticated_client, file_with_text_in_media, monkeypatch):
+        monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+        mock_post.return_value = ollama_response(json.dumps({"fechas": []}))
+        url = reverse('api_extract_dates', kwargs={'file_id': file_with_text_in_media.id})
+        response = authenticated_client.post(url, {"model_mode": "auto"}, format='json')
+
+        # Sin clave de Gemini solo queda el modelo local
+        assert response.status_code == status.HTTP_200_OK
+        assert response['X-Model-Mode'] == "local"
+        assert CachedExtraction.objects.get().variant == "local:gemma2:9b:gemma2:9b:v1:prefiltro_v1"
+        assert latency_status()["local"]["p95_seconds_per_kchar"] is None # Aún no hay mediciones suficientes
+
+        url = reverse('api_extract_dates_stream', kwargs={'file_id': file_with_text_in_media.id})
+        response = authenticated_client.post(url, {"model_mode": "auto"}, format='json')
+        events = parse_sse(response)
+        assert events[0] == ("stage", {"stage": "route", "status": "done", "mode": "local", "reason": "local dentro del presupuesto de latencia"})
+
+    @patch('myapp.llm.time.sleep')
+    @patch('myapp.llm.requests.Session.post')
+    def test_open_circuit_fails_fast_with_503(self, mock_post, mock_sleep, authenticated_client, file_with_text_in_media, settings):
+        settings.LLM_BREAKER_FAILURE_THRESHOLD = 1
+        mock_post.side_effect = requests.ConnectionError("Ollama caído")
+        url = reverse('api_extract_dates', kwargs={'file_id': file_with_text_in_media.id})
+        response = authenticated_client.post(url, {}, format='json')
+        assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+        calls = mock_post.call_count
+
+        # Con el circuito abierto ya no se llama a Ollama: 503 al momento
+        for name in ('api_extract_dates', 'api_extract_dates_stream'):
+            url = reverse(name, kwargs={'file_id': file_with_text_in_media.id})
+            response = authenticated_client.post(url, {}, format='json')
+            assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+            assert int(response['Retry-After']) >= 1
+        assert mock_post.call_count == calls
+
+    @patch('myapp.llm.requests.Session.post')
+    def test_full_llm_queue_returns_429_with_retry_after(self, mock_post, authenticated_client, file_with_text_in_media, test_user, settings):
+        settings.LLM_QUEUE_MAX_PER_USER = 1
+        scheduler = get_scheduler()
+        scheduler.try_start(scheduler.enqueue("otro"))
+        scheduler.enqueue(test_user.id)
+
+        for name in ('api_extract_dates', 'api_extract_dates_stream'):
+            url = reverse(name, kwargs={'file_id': file_with_text_in_media.id})
+            response = authenticated_client.post(url, {}, format='json')
+            assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+            assert int(response['Retry-After']) >= 1
+        mock_post.assert_not_called()
+
+        # Las fechas por reglas no usan el LLM y no pasan por la cola
+        url = reverse('api_extract_dates', kwargs={'file_id': file_with_text_in_media.id})
+        assert authenticated_client.post(url, {"model_mode": "rules"}, format='json').status_code == status.HTTP_200_OK
+
+        queue = authenticated_client.get(reverse('api_llm_queue')).data
+        assert queue["running"] == 1 and queue["waiting"] == 1 and queue["user_waiting"] == 1
+        assert queue["rejected"] == 2
+        assert "waiting_per_user" not in queue
+
+    @patch('myapp.llm.requests.Session.post')
+    def test_rules_mode_extracts_dates_without_llm(self, mock_post, authenticated_client, file_with_text_in_media):
+        file_with_text_in_media.text_file.save("fechas.txt", ContentFile("Examen final: 13 de junio de 2025\n".encode('utf-8')))
+        url = reverse('api_extract_dates', kwargs={'file_id': file_with_text_in_media.id})
+        response = authenticated_client.post(url, {"model_mode": "rules"}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["fechas"] == [{"titulo": "Examen final", "fecha": "2025-06-13"}]
+        assert response.data["asignatura"]["nombre"] == ""
+        mock_post.assert_not_called()
+        assert CachedExtraction.objects.get().variant == "rules:v2"
+
+    def test_rules_mode_keeps_previously_extracted_fields(self, authenticated_client, file_with_text_in_media):
+        file_with_text_in_media.text_file.save("fechas.txt", ContentFile("Examen final: 13 de junio de 2025\n".encode('utf-8')))
+        file_with_text_in_media.extracted_data = {
+            "asignatura": {"nombre": "Algebra"}, "profesores": [{"nombre": "Ana"}],
+            "fechas": [{"titulo": "Antigua", "fecha": "2025-01-10"}],
+        }
+        file_with_text_in_media.save()
+        url = reverse('api_extract_dates', kwargs={'file_id': file_with_text_in_media.id})
+        response = authenticated_client.post(url, {"model_mode": "rules"}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        file_with_text_in_media.refresh_from_db()
+        assert file_with_text_in_media.extracted_data == response.data == {
+            "asignatura": {"nombre": "Algebra"}, "profesores": [{"nombre": "Ana"}],
+            "fechas": [{"titulo": "Examen final", "fecha": "2025-06-13"}],
+        }
+        # En la caché compartida solo están las fechas extraídas de este texto
+        assert CachedExtraction.objects.get().data["asignatura"]["nombre"] == ""
+
+    @patch('myapp.llm.requests.Session.post')
+    def test_prefill_dates_leaves_only_other_fields_to_the_llm(self, mock_post, authenticated_client, file_with_text_in_media):
+        """En local_structured el esquema enviado ya no incluye las fechas."""
+        file_with_text_in_media.text_file.save("fechas.txt", ContentFile("Examen final: 13 de junio de 2025\n".encode('utf-8')))
+        mock_post.return_value = ollama_response('{"asignatura": {"nombre": "Algebra"}, "horarios": [], "profesores": []}')
+        url = reverse('api_extract_dates', kwargs={'file_id': file_with_text_in_media.id})
+        response = authenticated_client.post(
+            url, {"model_mode": "local_structured", "prefill_dates": True}, format='json'
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["asignatura"]["nombre"] == "Algebra"
+        assert response.data["fechas"] == [{"titulo": "Examen final", "fecha": "2025-06-13"}]
+        schema = mock_post.call_args.kwargs["json"]["format"]
+        assert "fechas" not in schema["properties"] and "fechas" not in schema["required"]
+        assert CachedExtraction.objects.get().variant == "local_structured:gemma2:9b:v1:prefiltro_v1:fechas_reglas_v2"
+
+    @patch('myapp.llm.requests.Session.post')
+    def test_output_is_normalized_with_schema(self, mock_post, authenticated_client, file_with_text_in_media):
+        """Faltan campos, sobran otros y hay tipos convertibles: se guarda normalizado."""
+        mock_post.side_effect = [
+            ollama_response("Resumen"),
+            ollama_response(
+                '{"asignatura": {"nombre": " Algebra ", "creditos": 6}, '
+                '"fechas": {"titulo": "Final", "fecha": "2025-06-20"}, "profesores": null}'
+            ),
+        ]
+        url = reverse('api_extract_dates', kwargs={'file_id': file_with_text_in_media.id})
+        response = authenticated_client.post(url, {}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {
+            "asignatura": {
+                "nombre": "Algebra", "grado": "", "departamento": "", "universidad": "", "condiciones_aprobado": ""
+            },
+            "fechas": [{"titulo": "Final", "fecha": "2025-06-20"}],
+            "horarios": [],
+            "profesores": [],
+        }
+        file_with_text_in_media.refresh_from_db()
+        assert file_with_text_in_media.extracted_data == response.data
+
+    @patch('myapp.llm.requests.Session.post')
+    def test_output_with_apostrophes_is_repaired(self, mock_post, authenticated_client, file_with_text_in_media):
+        """Comillas simples y comas sobrantes se reparan sin otra llamada y sin estropear los apóstrofos."""
+        mock_post.side_effect = [
+            ollama_response("Resumen"),
+            ollama_response("```json\n{'asignatura': {'nombre': 'Història de l'Art',}, 'fechas': [{'titulo': 'Final'}]}"),
+        ]
+        url = reverse('api_extract_dates', kwargs={'file_id': file_with_text_in_media.id})
+        response = authenticated_client.post(url, {}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert mock_post.call_count == 2
+        assert response.data["asignatura"]["nombre"] == "Història de l'Art"
+        assert response.data["fechas"] == [{"titulo": "Final", "fecha": ""}]
+
+    @patch('myapp.llm.requests.Session.post')
+    def test_truncated_output_is_an_error(self, mock_post, authenticated_client, file_with_text_in_media):
+        """Una salida cortada no se da por buena: ni se guarda ni se cachea para otros usuarios."""
+        mock_post.side_effect = [
+            ollama_response("Resumen"),
+            ollama_response("{'asignatura': {'nombre': 'Algebra'}, 'fechas': [{'titulo': 'Final'"),
+        ]
+        url = reverse('api_extract_dates', kwargs={'file_id': file_with_text_in_media.id})
+        response = authenticated_client.post(url, {}, format='json')
+
+        assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+        assert "JSON incompleto" in response.data["error"]
+        assert CachedExtraction.objects.count() == 0
+        file_with_text_in_media.refresh_from_db()
+        assert not file_with_text_in_media.extracted_data
+
+    @patch('myapp.llm.requests.Session.post')
+    def test_output_not_matching_schema_is_rejected(self, mock_post, authenticated_client, file_with_text_in_media):
+        mock_post.side_effect = [
+            ollama_response("Resumen"),
+            ollama_response('{"asignatura": "Algebra", "fechas": "20 de junio"}'),
+        ]
+        url = reverse('api_extract_dates', kwargs={'file_id': file_with_text_in_media.id})
+        response = authenticated_client.post(url, {}, format='json')
+
+        assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+        assert "asignatura: se esperaba un objeto" in response.data["error"]
+        assert "fechas: se esperaba una lista" in response.data["error"]
+        file_with_text_in_media.refresh_from_db()
+        assert not file_with_text_in_media.extracted_data
+
+    @patch('myapp.llm.time.sleep')
+    @patch('myapp.llm.requests.Session.post')
+    def test_ollama_unreachable_returns_error(self, mock_post, mock_sleep, authenticated_client, file_with_text_in_media):
+        """Sin Ollama se reintenta un número acotado de veces y se responde con error."""
+        mock_post.side_effect = requests.ConnectionError("conexión rechazada")
+        url = reverse('api_extract_dates', kwargs={'file_id': file_with_text_in_media.id})
+        response = authenticated_client.post(url, {}, format='json')
+
+        assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+        assert response.data["error"].startswith("Error al conectar con Ollama")
+        assert mock_post.call_count == settings.OLLAMA_MAX_RETRIES + 1
+
+
+def ollama_stream_response(*tokens):
+    """Respuesta simulada de /api/generate con "stream": true (una línea JSON por token)."""
+    lines = [json.dumps({"response": token, "done": False}).encode() for token in tokens]
+    lines.append(json.dumps({"response": "", "done": True, "eval_count": len(tokens)}).encode())
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.raise_for_status.return_value = None
+    mock_response.iter_lines.return_value = iter(lines)
+    return mock_response
+
+
+def parse_sse(response):
+    """Convierte el cuerpo de una respuesta SSE en una lista de (evento, datos)."""
+    body = b"".join(response.streaming_content).decode('utf-8')
+    events = []
+    for block in body.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.mark.django_db
+class TestExtractDatesStreamView:
+
+    @patch('myapp.llm.requests.Session.post')
+    def test_divided_mode_streams_each_section_when_ready(self, mock_post, authenticated_client, file_with_text_in_media):
+        sections = {
+            "asignatura": {"nombre": "Algebra"},
+            "fechas": [{"titulo": "Examen", "fecha": "2025-06-10"}],
+            "horarios": [],
+            "profesores": "no es una lista",
+        }
+
+        def generate(url, **kwargs):
+            schema = kwargs["json"]["format"]
+            # Cada petición lleva solo su sección del esquema
+            [section] = schema["required"]
+            assert list(schema["properties"]) == [section]
+            return ollama_response(json.dumps({section: sections[section]}))
+
+        mock_post.side_effect = generate
+        url = reverse('api_extract_dates_stream', kwargs={'file_id': file_with_text_in_media.id})
+        events = parse_sse(authenticated_client.post(url, {"model_mode": "local_divided"}, format='json'))
+
+        assert mock_post.call_count == 4
+        section_events = {data["section"]: data for event, data in events if data.get("stage") == "section"}
+        assert section_events["fechas"]["data"] == [{"titulo": "Examen", "fecha": "2025-06-10"}]
+        assert section_events["asignatura"]["data"]["nombre"] == "Algebra"
+        assert "error" in section_events["profesores"] and "data" not in section_events["profesores"]
+        assert ("stage", {"stage": "sections", "status": "done", "total": 4, "failed": 1}) in events
+
+        # La sección que falló marca el resultado como incompleto y no se cachea
+        assert events[-2][0] == "incomplete" and events[-2][1]["errors"][0].startswith("profesores:")
+        event, result = events[-1]
+        assert event == "result"
+        assert result["fechas"] == [{"titulo": "Examen", "fecha": "2025-06-10"}]
+        assert result["profesores"] == [] and result["asignatura"]["grado"] == ""
+        assert CachedExtraction.objects.count() == 0
+
+    @patch('myapp.llm.requests.Session.post')
+    def test_prefilter_sends_only_relevant_sections(self, mock_post, authenticated_client, file_with_text_in_media):
+        """En una guía larga la bibliografía no llega al modelo; las fechas por reglas usan el texto completo."""
+        text = (
+            "ÁLGEBRA LINEAL\nGrado en Matemáticas\n"
+            + "BIBLIOGRAFÍA\n" + "Un libro de álgebra, Editorial, Madrid.\n" * 150
+            + "EVALUACIÓN\nExamen final: 13 de junio de 2025, aula A1.10, de 9:00 a 11:00\n"
+        )
+        file_with_text_in_media.text_file.save("larga.txt", ContentFile(text.encode('utf-8')))
+        mock_post.return_value = ollama_stream_response('{"asignatura": {"nombre": "Algebra"}}')
+        url = reverse('api_extract_dates_stream', kwargs={'file_id': file_with_text_in_media.id})
+        events = parse_sse(authenticated_client.post(
+            url, {"model_mode": "local_structured", "prefill_dates": True}, format='json'
+        ))
+
+        [prefilter] = [data for event, data in events if data.get("stage") == "prefilter"]
+        assert prefilter["original_chars"] == len(text) and prefilter["kept_chars"] < len(text) / 2
+        prompt = mock_post.call_args.kwargs["json"]["prompt"]
+        assert "13 de junio de 2025" in prompt and "Editorial" not in prompt
+        assert events[-1][1]["fechas"] == [{"titulo": "Examen final", "fecha": "2025-06-13"}]
+
+    @patch('myapp.llm.requests.Session.post')
+    def test_streams_stages_tokens_and_result(self, mock_post, authenticated_client, file_with_text_in_media):
+        mock_post.side_effect = [
+            ollama_stream_response("Resumen ", "de Algebra"),
+            ollama_stream_response('{"asignatura": ', '{"nombre": "Algebra"}}'),
+        ]
+        url = reverse('api_extract_dates_stream', kwargs={'file_id': file_with_text_in_media.id})
+        response = authenticated_client.post(url, {}, format='json', HTTP_ACCEPT='text/event-stream')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'text/event-stream'
+        events = parse_sse(response)
+        assert events[:4] == [
+            ("stage", {"stage": "summary", "status": "started"}),
+            ("token", {"stage": "summary", "text": "Resumen "}),
+            ("token", {"stage": "summary", "text": "de Algebra"}),
+            ("stage", {"stage": "summary", "status": "done"}),
+        ]
+        assert events[-1][0] == "result"
+        assert events[-1][1]["asignatura"]["nombre"] == "Algebra"
+        # La segunda etapa recibe el resumen completo y ambas piden streaming a Ollama
+        assert "[Resumen de Algebra]" in mock_post.call_args_list[1].kwargs["json"]["prompt"]
+        assert all(call.kwargs["stream"] for call in mock_post.call_args_list)
+
+        file_with_text_in_media.refresh_from_db()
+        assert file_with_text_in_media.extracted_data == events[-1][1]
+        assert CachedExtraction.objects.count() == 1
+
+    @patch('myapp.llm.requests.Session.post')
+    def test_stream_waits_for_concurrent_extraction(self, mock_post, authenticated_client, file_with_text_in_media):
+        content_hash = ensure_content_hash(file_with_text_in_media)
+        variant = "local:gemma2:9b:gemma2:9b:v1:prefiltro_v1"
+        holder = SingleFlight(extraction_key(file_with_text_in_media, content_hash, variant))
+        assert holder.try_acquire()
+        other_result = {"asignatura": {"nombre": "De la otra petición"}}
+
+        def other_request_finishes(seconds):
+            store_cached_data(content_hash, variant, other_result)
+            holder.release()
+
+        url = reverse('api_extract_dates_stream', kwargs={'file_id': file_with_text_in_media.id})
+        with patch('myapp.singleflight.time.sleep', side_effect=other_request_finishes):
+            response = authenticated_client.post(url, {}, format='json', HTTP_ACCEPT='text/event-stream')
+            events = parse_sse(response)
+
+        assert events == [
+            ("stage", {"stage": "waiting", "status": "started"}),
+            ("result", other_result),
+        ]
+        mock_post.assert_not_called()
+
+    @patch('myapp.llm.time.sleep')
+    @patch('myapp.llm.requests.Session.post')
+    def test_streams_error_event(self, mock_post, mock_sleep, authenticated_client, file_with_text_in_media):
+        mock_post.side_effect = requests.ConnectionError("conexión rechazada")
+        url = reverse('api_extract_dates_stream', kwargs={'file_id': file_with_text_in_media.id})
+        response = authenticated_client.post(url, {}, format='json')
+
+        event, data = parse_sse(response)[-1]
+        assert event == "error"
+        assert data["error"].startswith("Error al conectar con Ollama")
+        file_with_text_in_media.refresh_from_db()
+        assert not file_with_text_in_media.extracted_data
+
+    @patch('myapp.llm.requests.Session.post')
+    def test_cached_result_is_sent_immediately(self, mock_post, authenticated_client, file_with_text_in_media):
+        CachedExtraction.objects.create(
+            content_hash=ensure_content_hash(file_with_text_in_media),
+            variant="local:gemma2:9b:gemma2:9b:v1:prefiltro_v1",
+            data={"cacheado": True},
+        )
+        url = reverse('api_extract_dates_stream', kwargs={'file_id': file_with_text_in_media.id})
+        response = authenticated_client.post(url, {}, format='json')
+
+        assert parse_sse(response) == [("result", {"cacheado": True})]
+        mock_post.assert_not_called()
+
+    def test_invalid_model_is_rejected_before_streaming(self, authenticated_client, file_with_text_in_media):
+        url = reverse('api_extract_dates_stream', kwargs={'file_id': file_with_text_in_media.id})
+        response = authenticated_client.post(url, {"summary_model": "otro"}, format='json', HTTP_ACCEPT='text/event-stream')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.content.decode('utf-8').startswith("event: error")
+
+    @patch('myapp.llm.requests.Session.post')
+    def test_unknown_mode_is_rejected(self, mock_post, authenticated_client, file_with_text_in_media):
+        """Un modo desconocido no llega a Ollama saltándose la validación de modelos, la cola y el circuito."""
+        url = reverse('api_extract_dates_stream', kwargs={'file_id': file_with_text_in_media.id})
+        response = authenticated_client.post(
+            url, {"model_mode": "xyz", "summary_model": "evil:70b"}, format='json', HTTP_ACCEPT='text/event-stream'
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        mock_post.assert_not_called()
+        with pytest.raises(ValueError):
+            next(iter_pipeline_events("texto", model_mode="xyz"))
+
+
 # -----------------------------------
 # Tests para AsignaturaUpdateView
 # -----------------------------------
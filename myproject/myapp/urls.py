@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import ExtractDatesView, ProcessExtractedDataView, GetUserCalendarDataView, AsignaturaUpdateView, AsignaturaDeleteView, SendDateRemindersView, ExportToGoogleCalendarView
+from .views import ExtractDatesView, ExtractDatesStreamView, LLMQueueView, ProcessExtractedDataView, GetUserCalendarDataView, AsignaturaUpdateView, AsignaturaDeleteView, SendDateRemindersView, ExportToGoogleCalendarView
 
 urlpatterns = [
     path('<int:file_id>/dates/', ExtractDatesView.as_view(), name='api_extract_dates'),  
+    path('<int:file_id>/dates/stream/', ExtractDatesStreamView.as_view(), name='api_extract_dates_stream'),
+    path('queue/', LLMQueueView.as_view(), name='api_llm_queue'),
     path('<int:file_id>/process-extracted-data/', ProcessExtractedDataView.as_view(), name='process_extracted_data'),
     path('calendar/data/', GetUserCalendarDataView.as_view(), name='get_user_calendar_data'),
     path('asignaturas/<str:nombre>/', AsignaturaUpdateView.as_view(), name='asignatura-update'),
@@ -2,200 +2,330 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-import requests
 import json
 from django.conf import settings
 from archivos.models import UploadedFile
-import re
+from archivos.content_cache import ensure_content_hash, get_cached_data, store_cached_data
+from archivos.textstore import read_text
+from .circuit import CircuitOpenError, breakers_status, get_breaker
+from .llm import get_ollama_client
+from .pipeline import (
+    EVENT_ERROR, EVENT_INCOMPLETE, EVENT_RESULT, EVENT_STAGE, LOCAL_MODES, MODE_AUTO, MODE_RULES,
+    BackendUnavailable, PipelineError, cache_variant, iter_pipeline_events, parse_pipeline_params, pipeline_backend,
+    pipeline_concurrency, pipeline_models, run_pipeline
+)
+from .routing import choose_mode, latency_status, record_latency
+from .scheduler import QueueFull, get_scheduler, llm_slot
+from .singleflight import SingleFlight, extraction_key, single_flight
 from .models import Asignatura, Fechas, Horario, Profesores
 from .serializers import AsignaturaSerializer
 from django.core.mail import send_mail
 from datetime import datetime, timedelta
+import time
 from allauth.socialaccount.models import SocialToken, SocialApp
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-import os
 from rest_framework.exceptions import ValidationError
 from django.core.exceptions import ObjectDoesNotExist
-from google import genai
-from google.genai import types
 
 
 
-# URL del servidor de Ollama
+class EventStreamRenderer(BaseRenderer):
+    """Permite negociar 'text/event-stream'; los errores se envían como evento SSE."""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
 
-OLLAMA_API_URL = os.environ.get('OLLAMA_API_URL') + "/api/generate"
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return sse_event(EVENT_ERROR, data)
 
-class ExtractDatesView(APIView):
+
+def sse_event(event, data):
+    payload = json.dumps(data, ensure_ascii=False, cls=DjangoJSONEncoder)
+    return f"event: {event}\ndata: {payload}\n\n".encode('utf-8')
+
+
+class BaseExtractDatesView(APIView):
     permission_classes = [IsAuthenticated]
 
-    def post(self, request, file_id):
+    def prepare(self, request, file_id):
+        """
+        Validaciones comunes de las vistas de extracción de fechas. Devuelve
+        (contexto, None) o (None, Response con el error).
+        """
         file_obj = get_object_or_404(UploadedFile, id=file_id, user=request.user)
         if not file_obj.text_file:
-            return Response({"message": "No hay texto extraído para procesar"}, status=status.HTTP_400_BAD_REQUEST)
+            return None, Response({"message": "No hay texto extraído para procesar"}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            with open(file_obj.text_file.path, 'r', encoding='utf-8') as f:
-                text_content = f.read()
+            text_content = read_text(file_obj.text_file)
         except Exception as e:
-            return Response({"message": f"Error al leer el archivo de texto: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return None, Response({"message": f"Error al leer el archivo de texto: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        # Obtener parámetros desde el request
-        model_mode = request.data.get("model_mode", "local")
-        summary_model = request.data.get("summary_model", "gemma2:9b")
-        json_model = request.data.get("json_model", "gemma2:9b")
+        # Obtener y validar los parámetros desde el request
+        params, error = parse_pipeline_params(request.data)
+        if error:
+            return None, Response({"message": error}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Validar los modelos si el modo es local
-        if model_mode == "local":
-            valid_models = ["gemma2:9b", "llama3.1:8b"]
-            if summary_model not in valid_models or json_model not in valid_models:
-                return Response({"message": "Uno o ambos modelos no son válidos"}, status=status.HTTP_400_BAD_REQUEST)
+        route = None
+        if params["model_mode"] == MODE_AUTO:
+            # El modo concreto se decide ya: de él dependen la caché, la cola y el circuito
+            route = choose_mode(len(text_content), get_scheduler())
+            params["model_mode"] = route.mode
 
-        def generate_gemini_response(text):
-            try:
-                client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
-                model = "gemini-2.5-flash-preview-04-17"
-                contents = [
-                    types.Content(
-                        role="user",
-                        parts=[types.Part.from_text(text=text)],
-                    ),
-                ]
-                generate_content_config = types.GenerateContentConfig(
-                    response_mime_type="application/json",  # Cambiado a JSON para forzar formato correcto
-                    system_instruction=[
-                        types.Part.from_text(text=f"""Actúa como un experto en extracción y estructuración de información a partir de documentos académicos (guías docentes, syllabus, etc.). Tu tarea es analizar el texto proporcionado y generar un único objeto JSON que contenga la información relevante sobre la asignatura, siguiendo estrictamente la estructura especificada.
-                                             **Estructura JSON Requerida:**
-                                             {get_json_structure()}
-                                             Asegúrate de que el JSON sea sintácticamente correcto, sin comas adicionales ni errores de formato."""),
-                    ],
-                )
-
-                response_text = ""
-                for chunk in client.models.generate_content_stream(
-                    model=model,
-                    contents=contents,
-                    config=generate_content_config,
-                ):
-                    response_text += chunk.text
-
-                return response_text
-            except Exception as e:
-                return f"Error al conectar con Gemini API: {str(e)}"
+        try:
+            content_hash = ensure_content_hash(file_obj)
+        except OSError:
+            content_hash = None
+        return {
+            "user_id": request.user.id,
+            "file_obj": file_obj,
+            "text_content": text_content,
+            "params": params,
+            "route": route,
+            "content_hash": content_hash,
+            "cache_variant": cache_variant(
+                params["model_mode"], params["summary_model"], params["json_model"], params["prefill_dates"]
+            ),
+        }, None
+
+    def cached_result(self, context, waited=False):
+        # Reutilizar el resultado si ya se procesó un archivo idéntico con la misma configuración.
+        # Tras esperar a otra petición igual, su resultado vale aunque se pidiera force_refresh.
+        if context["params"]["force_refresh"] and not waited:
+            return None
+        cached_data = get_cached_data(context["content_hash"], context["cache_variant"])
+        if cached_data is not None:
+            cached_data = self.save_result(context, cached_data, store=False)
+        return cached_data
+
+    def scheduler(self, context):
+        # Solo pasan por la cola los modos que usan el Ollama compartido
+        return get_scheduler() if context["params"]["model_mode"] in LOCAL_MODES else None
+
+    def queue_full_response(self, error):
+        return self.retry_later_response(error.message, error.retry_after, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def retry_later_response(self, message, retry_after, status_code=status.HTTP_503_SERVICE_UNAVAILABLE):
+        response = Response({"message": message, "retry_after": retry_after}, status=status_code)
+        response['Retry-After'] = str(retry_after)
+        return response
+
+    def check_backend(self, context):
+        """Si el circuito del backend de IA está abierto devuelve ya un 503, sin esperar a que falle."""
+        backend = pipeline_backend(context["params"]["model_mode"])
+        if backend is None:
+            return None
+        try:
+            get_breaker(backend).check()
+        except CircuitOpenError as e:
+            return self.retry_later_response(str(e), e.retry_after)
+        return None
+
+    def result_response(self, context, json_data, errors=()):
+        response = Response(json_data, status=status.HTTP_200_OK)
+        if context["route"] is not None:
+            response['X-Model-Mode'] = context["route"].mode
+        if errors:
+            # Partes del documento que fallaron: el cliente puede reintentar
+            response['X-Extraction-Incomplete'] = str(len(errors))
+        return response
+
+    def record_latency(self, context, start):
+        # Duración de la extracción sin la espera en la cola, para el modo 'auto'
+        if context["params"]["model_mode"] != MODE_RULES:
+            record_latency(context["params"]["model_mode"], len(context["text_content"]), time.monotonic() - start)
+
+    def flight_key(self, context):
+        return extraction_key(context["file_obj"], context["content_hash"], context["cache_variant"])
+
+    def save_result(self, context, json_data, store=True):
+        """Guarda el resultado en el archivo y devuelve lo guardado."""
+        file_obj = context["file_obj"]
+        if store:
+            store_cached_data(context["content_hash"], context["cache_variant"], json_data)
+        # El modo 'rules' solo extrae fechas: no borra la asignatura, horarios y profesores ya extraídos
+        if context["params"]["model_mode"] == MODE_RULES and isinstance(file_obj.extracted_data, dict) \
+                and file_obj.extracted_data:
+            json_data = {**file_obj.extracted_data, "fechas": json_data["fechas"]}
+        file_obj.extracted_data = json_data
+        file_obj.save()
+        return json_data
+
+
+class ExtractDatesView(BaseExtractDatesView):
 
-        def get_json_structure():
+    def post(self, request, file_id):
+        context, error_response = self.prepare(request, file_id)
+        if error_response:
+            return error_response
+
+        cached_data = self.cached_result(context)
+        if cached_data is not None:
+            return self.result_response(context, cached_data)
+        error_response = self.check_backend(context)
+        if error_response:
+            return error_response
+
+        # Si otra petición ya está extrayendo lo mismo, se espera y se reutiliza su resultado
+        with single_flight(self.flight_key(context)) as waited:
+            cached_data = self.cached_result(context, waited=True) if waited else None
+            if cached_data is not None:
+                return self.result_response(context, cached_data)
             try:
-                with open(settings.BASE_DIR / "myapp/files/json/JSON_utilizar.json", "r", encoding="utf-8") as archivo:
-                    datos_json = json.load(archivo)
-                return json.dumps(datos_json, ensure_ascii=False)
-            except FileNotFoundError:
-                return "{}"
-
-        def generate_response_summary(text):
-            prompt = f"""Eres un asistente de IA avanzado diseñado para resumir textos relacionados con asignaturas universitarias, extrayendo solo la información relevante. A continuación, te proporcionaré un texto que describe una asignatura. Tu tarea es:
-
-            1. Analizar el texto y resumirlo, incluyendo únicamente los siguientes tipos de información:
-               - Nombre de la asignatura.
-               - Nombre del grado al que pertenece.
-               - Nombre del departamento responsable.
-               - Nombre de la universidad.
-               - Condiciones para aprobar (si se mencionan).
-               - Fechas relevantes (como exámenes, inicio de prácticas, etc.) con su propósito o descripción.
-               - Detalles de horarios (grupos, tipo de sesión, horas y aulas, si se especifican).
-               - Nombre, despacho, enlace y horario de tutorías de los profesores (si se mencionan).
+                with llm_slot(
+                    context["user_id"], self.scheduler(context), pipeline_models(**context["params"]),
+                    pipeline_concurrency(**context["params"])
+                ) as slots:
+                    start = time.monotonic()
+                    json_data, errors = run_pipeline(
+                        context["text_content"], page_offsets=context["file_obj"].text_page_offsets,
+                        concurrency=slots, **context["params"]
+                    )
+                    self.record_latency(context, start)
+            except QueueFull as e:
+                return self.queue_full_response(e)
+            except BackendUnavailable as e:
+                return self.retry_later_response(e.message, e.retry_after)
+            except PipelineError as e:
+                return Response({"error": e.message}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            # Un resultado incompleto se guarda para el usuario pero no en la caché compartida
+            json_data = self.save_result(context, json_data, store=not errors)
+        return self.result_response(context, json_data, errors)
+
+
+class ExtractDatesStreamView(BaseExtractDatesView):
+    """
+    Variante en streaming de ExtractDatesView: envía como Server-Sent Events el
+    progreso de cada etapa ('stage'), los tokens generados ('token') y al final
+    el JSON guardado ('result') o el error ('error'). Si parte del documento
+    falló, antes del resultado llega 'incomplete' y el resultado no se cachea.
+    """
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
 
-            2. Descartar cualquier información no relevante para estos campos.
+    def post(self, request, file_id):
+        context, error_response = self.prepare(request, file_id)
+        if error_response:
+            return error_response
+
+        cached_data = self.cached_result(context)
+        if cached_data is None:
+            error_response = self.check_backend(context)
+            if error_response:
+                return error_response
+        scheduler = self.scheduler(context)
+        if cached_data is None and scheduler is not None:
+            # Con la cola llena se responde 429 antes de empezar el stream
+            try:
+                scheduler.check_capacity(context["user_id"])
+            except QueueFull as e:
+                return self.queue_full_response(e)
 
-            3. Proporciona el resumen como un texto plano, incluyendo solo los datos extraídos y omitiendo explicaciones adicionales.
+        response = StreamingHttpResponse(self.iter_events(context, cached_data), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no' # Que nginx no acumule la respuesta
+        return response
 
-            Ahora, por favor, procesa el siguiente texto:
+    def iter_events(self, context, cached_data):
+        # Un primer comentario SSE para que el cliente reciba bytes de inmediato
+        yield b": procesando\n\n"
 
-            [{text}]"""
+        route = context["route"]
+        if route is not None:
+            yield sse_event(EVENT_STAGE, {"stage": "route", "status": "done", "mode": route.mode, "reason": route.reason})
 
-            payload = {
-                "model": summary_model,
-                "prompt": prompt,
-                "stream": False
-            }
+        if cached_data is not None:
+            yield sse_event(EVENT_RESULT, cached_data)
+            return
 
-            try:
-                response = requests.post(OLLAMA_API_URL, json=payload)
-                response.raise_for_status()
-                return response.json()["response"]
-            except Exception as e:
-                return f"Error al conectar con Ollama: {str(e)}"
-
-        def clean_json_string(json_string):
-            # Eliminar bloques de código Markdown
-            json_string = re.sub(r'^```json\s*|\s*```$', '', json_string, flags=re.MULTILINE).strip()
-            # Eliminar comas finales antes de corchetes o llaves
-            json_string = re.sub(r',\s*([\]\}])', r'\1', json_string)
-            # Reemplazar comillas simples por dobles (si el modelo las usa)
-            json_string = json_string.replace("'", '"')
-            # Asegurar que el string sea UTF-8 válido
-            json_string = json_string.encode('utf-8').decode('utf-8')
-            # Asegurar que el string termine correctamente
-            json_string = json_string.strip()
-            return json_string
-
-        def generate_response_json(summary):
-            prompt = f"""Eres un asistente de IA avanzado diseñado para transformar un texto resumido sobre una asignatura universitaria en un JSON estructurado. A continuación, te proporcionaré un texto resumido que contiene solo la información relevante para rellenar una estructura JSON. Tu tarea es:
-
-            1. Convertir el texto resumido en un JSON con la siguiente estructura:
-               {get_json_structure()}
-
-            2. Si alguna información no está presente en el texto resumido, deja el campo correspondiente con la información más probable, pero mantén la estructura JSON intacta.
-            3. Asegúrate de que las fechas estén en formato "YYYY-MM-DD" si se proporcionan, y convierte cualquier formato de texto (como "18 de marzo de 2023") a este estándar.
-            4. Proporciona solo el JSON como salida, sin explicaciones adicionales, y asegúrate de que sea sintácticamente correcto, sin comas adicionales ni errores de formato.
-
-            Ahora, por favor, procesa el siguiente texto resumido:
-
-            [{summary}]"""
-
-            payload = {
-                "model": json_model,
-                "prompt": prompt,
-                "stream": False
-            }
+        lock = SingleFlight(self.flight_key(context))
+        waited = False
+        try:
+            for _ in lock.wait_iter():
+                # Otra petición está extrayendo lo mismo: se avisa y se mantiene viva la conexión
+                yield sse_event(EVENT_STAGE, {"stage": "waiting", "status": "started"}) if not waited else b": esperando\n\n"
+                waited = True
+            cached_data = self.cached_result(context, waited=True) if waited else None
+            if cached_data is not None:
+                yield sse_event(EVENT_RESULT, cached_data)
+                return
+            yield from self.iter_scheduled_events(context)
+        finally:
+            lock.release()
+
+    def iter_scheduled_events(self, context):
+        """Espera turno en la cola del LLM informando de la posición y ejecuta el pipeline."""
+        scheduler = self.scheduler(context)
+        ticket_id = None
+        slots = None
+        try:
+            if scheduler is not None:
+                try:
+                    ticket_id = scheduler.enqueue(
+                        context["user_id"], pipeline_models(**context["params"]), pipeline_concurrency(**context["params"])
+                    )
+                    last_position = None
+                    for position in scheduler.wait_iter(ticket_id):
+                        if position != last_position:
+                            yield sse_event(EVENT_STAGE, {"stage": "queued", "status": "started", "position": position})
+                            last_position = position
+                        else:
+                            yield b": en cola\n\n"
+                except QueueFull as e:
+                    ticket_id = None
+                    yield sse_event(EVENT_ERROR, {"error": e.message, "retry_after": e.retry_after})
+                    return
+                slots = scheduler.granted_slots(ticket_id)
+
+            start = time.monotonic()
+            events = iter_pipeline_events(
+                context["text_content"], stream=True, page_offsets=context["file_obj"].text_page_offsets,
+                concurrency=slots, **context["params"]
+            )
+            incomplete = False
+            for event, payload in events:
+                if event == EVENT_INCOMPLETE:
+                    incomplete = True
+                if event == EVENT_RESULT:
+                    self.record_latency(context, start)
+                    payload = self.save_result(context, payload, store=not incomplete)
+                yield sse_event(event, payload)
+        finally:
+            if ticket_id is not None:
+                scheduler.finish(ticket_id)
+
+
+class LLMQueueView(APIView):
+    """Estado de la cola del LLM local: extracciones en curso, en espera y tiempos."""
+    permission_classes = [IsAuthenticated]
 
-            try:
-                response = requests.post(OLLAMA_API_URL, json=payload)
-                response.raise_for_status()
-                raw_response = response.json()["response"]
-                cleaned_response = clean_json_string(raw_response)
-                # Validar el JSON antes de devolverlo
-                json.loads(cleaned_response)  # Esto lanzará un error si el JSON es inválido
-                return cleaned_response
-            except json.JSONDecodeError as e:
-                return f"Error: JSON inválido generado: {cleaned_response}"
-            except Exception as e:
-                return f"Error al conectar con Ollama: {str(e)}"
-
-        # Procesar según el modo
-        if model_mode == "api":
-            json_response = generate_gemini_response(text_content)
-            json_data = json.loads(clean_json_string(json_response))
-            file_obj.extracted_data = json_data
-            file_obj.save()
-            return Response(json_data, status=status.HTTP_200_OK)
+    def get(self, request):
+        scheduler = get_scheduler()
+        if scheduler is None:
+            return Response({"enabled": False}, status=status.HTTP_200_OK)
+        stats = scheduler.stats()
+        user_id = str(request.user.id)
+        data = {
+            "enabled": True,
+            "user_running": stats["running_per_user"].get(user_id, 0),
+            "user_waiting": stats["waiting_per_user"].get(user_id, 0),
+            **stats,
+        }
+        if request.user.is_staff:
+            # Estado de cada servidor de Ollama visto desde este proceso
+            data["backends"] = get_ollama_client().backends.status()
+            data["circuits"] = breakers_status()
+            data["latency"] = latency_status()
         else:
-            summary = generate_response_summary(text_content)
-            if summary.startswith("Error"):
-                return Response({"error": summary}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-            json_response = generate_response_json(summary)
-            if json_response.startswith("Error"):
-                return Response({"error": json_response}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-            try:
-                json_data = json.loads(json_response)
-                file_obj.extracted_data = json_data
-                file_obj.save()
-                return Response(json_data, status=status.HTTP_200_OK)
-            except json.JSONDecodeError as e:
-                return Response({"error": f"Formato JSON inválido: {json_response}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            # El reparto por usuario solo lo ven los administradores
+            del data["running_per_user"]
+            del data["waiting_per_user"]
+        return Response(data, status=status.HTTP_200_OK)
 
 
 class ProcessExtractedDataView(APIView):
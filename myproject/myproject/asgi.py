@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
 
 application = get_asgi_application()
+
+# Precarga de los modelos de Ollama solo en el servidor web, no en cada comando de manage.py
+from myapp.llm import start_warmup_thread  # noqa: E402
+
+start_warmup_thread()
@@ -79,6 +79,8 @@ MIDDLEWARE = [
 
 cors_allowed_origins_str = os.environ.get('DJANGO_CORS_ALLOWED_ORIGINS', 'http://localhost:3000')
 CORS_ALLOWED_ORIGINS = [origin.strip() for origin in cors_allowed_origins_str.split(',') if origin.strip()]
+# El frontend lee Retry-After (cola del LLM y backends caídos) y el modo elegido por 'auto'
+CORS_EXPOSE_HEADERS = ['Retry-After', 'X-Model-Mode', 'X-Extraction-Incomplete']
 
 ROOT_URLCONF = 'myproject.urls'
 
@@ -142,6 +144,127 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Estado de ejecución (caché del LLM, cola, locks), fuera del código fuente y de git.
+# Las rutas relativas de DJANGO_LLM_CACHE_PATH y DJANGO_LLM_SCHEDULER_PATH son respecto a este directorio.
+DATA_DIR = Path(os.environ.get('DJANGO_DATA_DIR', BASE_DIR / 'var'))
+
+# Tamaño máximo de los archivos subidos. La extracción escribe el texto en streaming,
+# así que el consumo de memoria no depende del tamaño del documento.
+UPLOAD_MAX_FILE_SIZE_MB = int(os.environ.get('DJANGO_UPLOAD_MAX_FILE_SIZE_MB', '5'))
+
+# --- Cola de extracción de texto (python manage.py process_extraction_jobs) ---
+EXTRACTION_WORKERS = int(os.environ.get('DJANGO_EXTRACTION_WORKERS', os.cpu_count() or 1))
+EXTRACTION_POLL_INTERVAL = float(os.environ.get('DJANGO_EXTRACTION_POLL_INTERVAL', '1.0'))
+# Procesos por documento para extraer las páginas de un PDF en paralelo (1 = secuencial)
+PDF_EXTRACTION_WORKERS = int(os.environ.get('DJANGO_PDF_EXTRACTION_WORKERS', '1'))
+
+# Límites de la extracción de cada documento (segundos de CPU, segundos reales y MB
+# de memoria). Con PDF_EXTRACTION_WORKERS = N > 1 la CPU y la memoria se reparten a
+# partes iguales entre el proceso de extracción y sus N procesos de páginas: cada
+# uno tiene 1/(N+1) del límite y entre todos no pasan del total.
+EXTRACTION_CPU_SECONDS = int(os.environ.get('DJANGO_EXTRACTION_CPU_SECONDS', '120'))
+EXTRACTION_WALL_SECONDS = int(os.environ.get('DJANGO_EXTRACTION_WALL_SECONDS', '300'))
+EXTRACTION_MEMORY_MB = int(os.environ.get('DJANGO_EXTRACTION_MEMORY_MB', '2048'))
+# Un trabajo 'running' más antiguo que esto quedó huérfano (el worker murió o se
+# reinició) y vuelve a la cola. Debe superar EXTRACTION_WALL_SECONDS.
+EXTRACTION_JOB_LEASE_SECONDS = int(os.environ.get(
+    'DJANGO_EXTRACTION_JOB_LEASE_SECONDS', str(2 * EXTRACTION_WALL_SECONDS)
+))
+
+# Compresión de los .txt extraídos: '' (sin comprimir), 'gzip' o 'zstd' (requiere zstandard).
+# Los archivos existentes se convierten con: python manage.py compress_text_files
+TEXT_COMPRESSION = os.environ.get('DJANGO_TEXT_COMPRESSION', '')
+
+# --- Cliente de Ollama (myapp/llm.py) ---
+# Uno o varios servidores separados por comas: las llamadas se reparten entre los
+# que responden según las llamadas en curso y la latencia de cada uno
+OLLAMA_API_URL = os.environ.get('OLLAMA_API_URL', 'http://localhost:11434')
+OLLAMA_API_URLS = [url.strip() for url in OLLAMA_API_URL.split(',') if url.strip()]
+# Con varios servidores: comprobación periódica de salud (segundos, 0 la desactiva)
+# y fallos seguidos tras los que un servidor deja de recibir llamadas un tiempo
+OLLAMA_HEALTH_CHECK_INTERVAL = float(os.environ.get('OLLAMA_HEALTH_CHECK_INTERVAL', '10'))
+OLLAMA_FAILURE_THRESHOLD = int(os.environ.get('OLLAMA_FAILURE_THRESHOLD', '3'))
+OLLAMA_EJECT_SECONDS = float(os.environ.get('OLLAMA_EJECT_SECONDS', '30'))
+
+# Modo 'auto' (myapp/routing.py): el LLM local se usa si su tiempo estimado (cola +
+# extracción) cabe en el presupuesto; si no, el modo más rápido. Gemini solo para
+# documentos de hasta LLM_AUTO_API_MAX_CHARS caracteres (límite de coste por extracción).
+# Mientras no hay mediciones se estiman los segundos por cada 1000 caracteres.
+LLM_AUTO_LATENCY_BUDGET = float(os.environ.get('DJANGO_LLM_AUTO_LATENCY_BUDGET', '120'))
+LLM_AUTO_API_MAX_CHARS = int(os.environ.get('DJANGO_LLM_AUTO_API_MAX_CHARS', '200000'))
+LLM_AUTO_LOCAL_SECONDS_PER_KCHAR = float(os.environ.get('DJANGO_LLM_AUTO_LOCAL_SECONDS_PER_KCHAR', '8'))
+LLM_AUTO_API_SECONDS_PER_KCHAR = float(os.environ.get('DJANGO_LLM_AUTO_API_SECONDS_PER_KCHAR', '1.5'))
+
+# Circuit breakers de Ollama y Gemini (myapp/circuit.py): se abren tras varios fallos
+# seguidos o si el percentil de latencia de las últimas llamadas supera el límite
+# (0 lo desactiva), y durante LLM_BREAKER_RESET_SECONDS se responde 503 al momento
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('DJANGO_LLM_BREAKER_FAILURE_THRESHOLD', '5'))
+LLM_BREAKER_RESET_SECONDS = float(os.environ.get('DJANGO_LLM_BREAKER_RESET_SECONDS', '30'))
+LLM_BREAKER_LATENCY_SECONDS = float(os.environ.get('DJANGO_LLM_BREAKER_LATENCY_SECONDS', '240'))
+LLM_BREAKER_LATENCY_PERCENTILE = float(os.environ.get('DJANGO_LLM_BREAKER_LATENCY_PERCENTILE', '0.9'))
+LLM_BREAKER_WINDOW = int(os.environ.get('DJANGO_LLM_BREAKER_WINDOW', '20'))
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get('OLLAMA_CONNECT_TIMEOUT', '5'))
+# Generar con un modelo local puede tardar minutos en documentos largos
+OLLAMA_READ_TIMEOUT = float(os.environ.get('OLLAMA_READ_TIMEOUT', '300'))
+OLLAMA_MAX_RETRIES = int(os.environ.get('OLLAMA_MAX_RETRIES', '2'))
+OLLAMA_RETRY_BACKOFF = float(os.environ.get('OLLAMA_RETRY_BACKOFF', '0.5'))
+OLLAMA_POOL_SIZE = int(os.environ.get('OLLAMA_POOL_SIZE', '10'))
+# Cambiar de modelo obliga a Ollama a descargar uno y cargar el otro (segundos en CPU):
+# los modelos se mantienen cargados OLLAMA_KEEP_ALIVE tras cada uso y los de
+# OLLAMA_WARMUP_MODELS se cargan al arrancar el servidor web.
+OLLAMA_KEEP_ALIVE = os.environ.get('OLLAMA_KEEP_ALIVE', '30m') or None
+if OLLAMA_KEEP_ALIVE and OLLAMA_KEEP_ALIVE.lstrip('-').isdigit():
+    OLLAMA_KEEP_ALIVE = int(OLLAMA_KEEP_ALIVE) # Segundos; -1 = no descargarlo nunca
+OLLAMA_WARMUP_MODELS = [m.strip() for m in os.environ.get('OLLAMA_WARMUP_MODELS', 'gemma2:9b').split(',') if m.strip()]
+# Solo lo lanzan wsgi.py y asgi.py: ni migrate, ni el worker de extracción ni los tests
+OLLAMA_WARMUP_ON_STARTUP = os.environ.get('OLLAMA_WARMUP_ON_STARTUP', 'True') == 'True'
+
+# Caché de respuestas del LLM (SQLite compartido entre procesos). Con ella activa la
+# generación es determinista (temperature 0 y semilla fija) para poder reutilizarlas.
+LLM_CACHE_ENABLED = os.environ.get('DJANGO_LLM_CACHE_ENABLED', 'True') == 'True'
+LLM_CACHE_PATH = DATA_DIR / os.environ.get('DJANGO_LLM_CACHE_PATH', 'llm_cache.sqlite3')
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get('DJANGO_LLM_CACHE_MAX_ENTRIES', '5000'))
+LLM_CACHE_TTL_SECONDS = int(os.environ.get('DJANGO_LLM_CACHE_TTL_SECONDS', str(30 * 24 * 3600)))
+LLM_CACHE_SEED = int(os.environ.get('DJANGO_LLM_CACHE_SEED', '42'))
+
+# Modo 'local_chunked': tamaño máximo de cada fragmento (caracteres) y fragmentos
+# procesados a la vez. Conviene igualarlo a OLLAMA_NUM_PARALLEL del servidor.
+LLM_CHUNK_MAX_CHARS = int(os.environ.get('DJANGO_LLM_CHUNK_MAX_CHARS', '12000'))
+LLM_CHUNK_CONCURRENCY = int(os.environ.get('DJANGO_LLM_CHUNK_CONCURRENCY', '4'))
+# Modo 'local_divided': secciones del esquema (asignatura, fechas...) extraídas a la vez
+LLM_SECTION_CONCURRENCY = int(os.environ.get('DJANGO_LLM_SECTION_CONCURRENCY', '4'))
+
+# Prefiltro de relevancia (myapp/prefilter.py): a los modos con LLM solo se envían
+# las secciones del texto con fechas, horarios, profesores o evaluación, hasta
+# LLM_PREFILTER_MAX_RATIO del documento. Los textos más cortos que
+# LLM_PREFILTER_MIN_CHARS se envían completos.
+LLM_PREFILTER_ENABLED = os.environ.get('DJANGO_LLM_PREFILTER_ENABLED', 'True') == 'True'
+LLM_PREFILTER_MIN_CHARS = int(os.environ.get('DJANGO_LLM_PREFILTER_MIN_CHARS', '3000'))
+LLM_PREFILTER_MAX_RATIO = float(os.environ.get('DJANGO_LLM_PREFILTER_MAX_RATIO', '0.6'))
+# Puntuación mínima para que una sección se considere relevante
+LLM_PREFILTER_MIN_SCORE = int(os.environ.get('DJANGO_LLM_PREFILTER_MIN_SCORE', '2'))
+
+# Extracciones simultáneas del mismo archivo (myapp/singleflight.py): la primera
+# ejecuta el pipeline y las demás esperan su resultado. Los locks son archivos en
+# este directorio, compartido por todos los procesos del servidor.
+EXTRACTION_LOCK_DIR = Path(os.environ.get('DJANGO_EXTRACTION_LOCK_DIR', DATA_DIR / 'locks'))
+EXTRACTION_LOCK_TIMEOUT = float(os.environ.get('DJANGO_EXTRACTION_LOCK_TIMEOUT', '900'))
+EXTRACTION_LOCK_POLL_INTERVAL = float(os.environ.get('DJANGO_EXTRACTION_LOCK_POLL_INTERVAL', '0.5'))
+
+# Cola de extracciones con el LLM local (myapp/scheduler.py): peticiones a Ollama a
+# la vez en todo el servidor, contando cada fragmento o sección en paralelo de los
+# modos local_chunked y local_divided (0 desactiva la cola), tamaño máximo de la cola, total y por
+# usuario, y espera máxima antes de responder 429 con Retry-After.
+LLM_MAX_CONCURRENCY = int(os.environ.get('DJANGO_LLM_MAX_CONCURRENCY', '2'))
+LLM_QUEUE_MAX = int(os.environ.get('DJANGO_LLM_QUEUE_MAX', '20'))
+LLM_QUEUE_MAX_PER_USER = int(os.environ.get('DJANGO_LLM_QUEUE_MAX_PER_USER', '3'))
+LLM_QUEUE_TIMEOUT = float(os.environ.get('DJANGO_LLM_QUEUE_TIMEOUT', '600'))
+LLM_QUEUE_POLL_INTERVAL = float(os.environ.get('DJANGO_LLM_QUEUE_POLL_INTERVAL', '0.5'))
+LLM_SLOT_LEASE_SECONDS = int(os.environ.get('DJANGO_LLM_SLOT_LEASE_SECONDS', '1800'))
+# Modelos que caben cargados a la vez en Ollama: la cola da prioridad a las
+# extracciones con uno de ellos para no forzar cambios de modelo
+LLM_RESIDENT_MODELS = int(os.environ.get('DJANGO_LLM_RESIDENT_MODELS', '1'))
+LLM_SCHEDULER_PATH = DATA_DIR / os.environ.get('DJANGO_LLM_SCHEDULER_PATH', 'llm_scheduler.sqlite3')
 
 ANYMAIL = {
     "MAILERSEND_API_TOKEN": os.environ.get('MAILERSEND_API_TOKEN'),
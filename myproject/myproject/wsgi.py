@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
 
 application = get_wsgi_application()
+
+# Precarga de los modelos de Ollama solo en el servidor web, no en cada comando de manage.py
+from myapp.llm import start_warmup_thread  # noqa: E402
+
+start_warmup_thread()